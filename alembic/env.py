@@ -33,6 +33,12 @@ fileConfig(config.config_file_name)
 # [Need to add our models]
 target_metadata = models.Base.metadata
 
+
+# [Tables that are not in our models]
+# `backfill_checkpoints` is created on demand by `backfill.py`; autogenerate must not drop it
+def include_object(object, name, type_, reflected, compare_to):
+    return not (type_ == "table" and name == "backfill_checkpoints")
+
 # other values from the config, defined by the needs of env.py,
 # can be acquired:
 # my_important_option = config.get_main_option("my_important_option")
@@ -57,6 +63,7 @@ def run_migrations_offline() -> None:
         target_metadata=target_metadata,
         literal_binds=True,
         dialect_opts={"paramstyle": "named"},
+        include_object=include_object,
     )
 
     with context.begin_transaction():
@@ -78,7 +85,7 @@ def run_migrations_online() -> None:
 
     with connectable.connect() as connection:
         context.configure(
-            connection=connection, target_metadata=target_metadata
+            connection=connection, target_metadata=target_metadata, include_object=include_object
         )
 
         with context.begin_transaction():
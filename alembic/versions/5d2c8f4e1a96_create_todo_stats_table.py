@@ -0,0 +1,42 @@
+"""Create todo_stats summary table
+
+Revision ID: 5d2c8f4e1a96
+Revises: 3b9e51c0d7a2
+Create Date: 2026-10-19 10:03:17.864205
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5d2c8f4e1a96'
+down_revision: Union[str, None] = '3b9e51c0d7a2'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_index('ix_todos_owner_id_complete_priority', 'todos', ['owner_id', 'complete', 'priority'])
+
+    op.create_table(
+        'todo_stats',
+        sa.Column('complete', sa.Boolean(), primary_key=True),
+        sa.Column('priority', sa.Integer(), primary_key=True),
+        sa.Column('count', sa.Integer(), nullable=False, server_default='0'),
+    )
+
+    # Backfill once from the existing rows; the app keeps it up to date from now on
+    op.execute(
+        "INSERT INTO todo_stats (complete, priority, count) "
+        "SELECT complete, priority, COUNT(id) FROM todos "
+        "WHERE complete IS NOT NULL AND priority IS NOT NULL "
+        "GROUP BY complete, priority"
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('todo_stats')
+    op.drop_index('ix_todos_owner_id_complete_priority', table_name='todos')
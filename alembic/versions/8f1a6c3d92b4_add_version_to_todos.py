@@ -0,0 +1,27 @@
+"""Add version column to todos
+
+Revision ID: 8f1a6c3d92b4
+Revises: 5d2c8f4e1a96
+Create Date: 2026-10-19 11:26:52.190334
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8f1a6c3d92b4'
+down_revision: Union[str, None] = '5d2c8f4e1a96'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # server_default fills existing rows with 1 without rewriting them one by one
+    op.add_column('todos', sa.Column('version', sa.Integer(), nullable=False, server_default='1'))
+
+
+def downgrade() -> None:
+    op.drop_column('todos', 'version')
@@ -0,0 +1,42 @@
+"""Make the todo change sequence per owner
+
+Revision ID: a94d2e6b7c31
+Revises: e7d3a9b15c20
+Create Date: 2026-10-19 18:21:47.530962
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a94d2e6b7c31'
+down_revision: Union[str, None] = 'e7d3a9b15c20'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.alter_column('todo_change_seq', 'id', new_column_name='owner_id')
+    # The shard-wide row becomes the floor of owner 0: cursors handed out so far stay valid, and every
+    # owner's counter starts above it
+    op.execute("UPDATE todo_change_seq SET owner_id = 0 WHERE owner_id = 1")
+
+
+def downgrade() -> None:
+    # Back to one counter above every owner's
+    op.execute(
+        "INSERT INTO todo_change_seq (owner_id, value, compacted_seq) SELECT 0, 0, 0 "
+        "WHERE NOT EXISTS (SELECT 1 FROM todo_change_seq WHERE owner_id = 0)"
+    )
+    op.execute(
+        "UPDATE todo_change_seq SET "
+        "value = (SELECT MAX(value) FROM todo_change_seq), "
+        "compacted_seq = (SELECT MAX(compacted_seq) FROM todo_change_seq) "
+        "WHERE owner_id = 0"
+    )
+    op.execute("DELETE FROM todo_change_seq WHERE owner_id <> 0")
+    op.execute("UPDATE todo_change_seq SET owner_id = 1")
+    op.alter_column('todo_change_seq', 'owner_id', new_column_name='id')
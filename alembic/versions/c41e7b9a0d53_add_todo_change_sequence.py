@@ -0,0 +1,52 @@
+"""Add change sequence and tombstones for todo delta sync
+
+Revision ID: c41e7b9a0d53
+Revises: 8f1a6c3d92b4
+Create Date: 2026-10-19 14:08:31.402817
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c41e7b9a0d53'
+down_revision: Union[str, None] = '8f1a6c3d92b4'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Existing rows get 0: they are only returned by a full sync, which every client starts with
+    op.add_column('todos', sa.Column('updated_seq', sa.BigInteger(), nullable=False, server_default='0'))
+    op.create_index('ix_todos_owner_id_updated_seq', 'todos', ['owner_id', 'updated_seq'])
+
+    op.create_table(
+        'todo_tombstones',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('todo_id', sa.Integer(), nullable=False),
+        sa.Column('owner_id', sa.Integer(), nullable=False),
+        sa.Column('deleted_seq', sa.BigInteger(), nullable=False),
+        sa.Column('deleted_at', sa.DateTime(timezone=True), nullable=False),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.create_index('ix_todo_tombstones_owner_id_deleted_seq', 'todo_tombstones', ['owner_id', 'deleted_seq'])
+
+    op.create_table(
+        'todo_change_seq',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('value', sa.BigInteger(), nullable=False),
+        sa.Column('compacted_seq', sa.BigInteger(), nullable=False),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.execute("INSERT INTO todo_change_seq (id, value, compacted_seq) VALUES (1, 0, 0)")
+
+
+def downgrade() -> None:
+    op.drop_table('todo_change_seq')
+    op.drop_index('ix_todo_tombstones_owner_id_deleted_seq', table_name='todo_tombstones')
+    op.drop_table('todo_tombstones')
+    op.drop_index('ix_todos_owner_id_updated_seq', table_name='todos')
+    op.drop_column('todos', 'updated_seq')
@@ -0,0 +1,48 @@
+"""Add updated_at to todos and create todos_archive
+
+Revision ID: e7d3a9b15c20
+Revises: c41e7b9a0d53
+Create Date: 2026-10-19 16:42:05.118394
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e7d3a9b15c20'
+down_revision: Union[str, None] = 'c41e7b9a0d53'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Existing rows count as updated now: they become archivable only after a full `ARCHIVE_AFTER`
+    op.add_column('todos', sa.Column('updated_at', sa.DateTime(timezone=True), nullable=False,
+                                     server_default=sa.func.now()))
+    op.create_index('ix_todos_complete_updated_at', 'todos', ['complete', 'updated_at'])
+
+    op.create_table(
+        'todos_archive',
+        sa.Column('id', sa.Integer(), autoincrement=False, nullable=False),
+        sa.Column('title', sa.String(length=100), nullable=True),
+        sa.Column('description', sa.String(length=255), nullable=True),
+        sa.Column('priority', sa.Integer(), nullable=True),
+        sa.Column('complete', sa.Boolean(), nullable=True),
+        sa.Column('owner_id', sa.Integer(), nullable=True),
+        sa.Column('version', sa.Integer(), nullable=False),
+        sa.Column('updated_seq', sa.BigInteger(), nullable=False),
+        sa.Column('updated_at', sa.DateTime(timezone=True), nullable=False),
+        sa.Column('archived_at', sa.DateTime(timezone=True), nullable=False),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.create_index(op.f('ix_todos_archive_owner_id'), 'todos_archive', ['owner_id'])
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_todos_archive_owner_id'), table_name='todos_archive')
+    op.drop_table('todos_archive')
+    op.drop_index('ix_todos_complete_updated_at', table_name='todos')
+    op.drop_column('todos', 'updated_at')
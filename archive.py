@@ -0,0 +1,156 @@
+import logging
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import delete, insert, select
+from sqlalchemy.orm import Session, sessionmaker
+
+from .database import shard_router
+from .events import todo_events
+from .models import Todos, TodosArchive, TodoTombstones
+from .todo_changes import next_change_seqs
+from .todo_stats import bump_todo_stats_many
+
+
+logger = logging.getLogger(__name__)
+
+# Completed todos not modified for this long are moved to `todos_archive`
+ARCHIVE_AFTER = timedelta(days=30)
+# Rows moved per transaction: each batch holds its row locks only for a moment
+ARCHIVE_BATCH_SIZE = 500
+# Breathing room for other writers between two batches
+ARCHIVE_BATCH_PAUSE_SECONDS = 0.1
+ARCHIVE_INTERVAL_SECONDS = 600
+
+todos = Todos.__table__
+archive = TodosArchive.__table__
+
+ARCHIVED_COLUMNS = ("id", "title", "description", "priority", "complete", "owner_id", "version",
+                    "updated_seq", "updated_at")
+
+
+def archive_batch(db: Session, cutoff: datetime, batch_size: int = ARCHIVE_BATCH_SIZE) -> int:
+    """
+        Moves up to `batch_size` completed todos last updated before `cutoff` in one transaction.
+        Returns the number moved; 0 means there is nothing left to archive.
+
+        Locks are taken in the same order as the request handlers (stats rows sorted by
+        `(complete, priority)`, change counters sorted by owner, todo rows), so the archiver never
+        deadlocks with them.
+        A row updated between the candidate read and the DELETE no longer matches and is left alone.
+    """
+    candidates = db.execute(
+        select(todos.c.id, todos.c.priority, todos.c.owner_id)
+        .where(todos.c.complete.is_(True), todos.c.updated_at < cutoff)
+        .order_by(todos.c.id)
+        .limit(batch_size)
+    ).all()
+
+    if not candidates:
+        return 0
+
+    expected = Counter(row.priority for row in candidates)
+    bump_todo_stats_many(db, {(True, priority): -count for priority, count in expected.items()})
+
+    deleted_seqs = next_change_seqs(db, [row.owner_id for row in candidates])
+
+    moved = db.execute(
+        delete(todos)
+        .where(todos.c.id.in_([row.id for row in candidates]),
+               todos.c.complete.is_(True),
+               todos.c.updated_at < cutoff)
+        .returning(*(todos.c[column] for column in ARCHIVED_COLUMNS))
+    ).all()
+
+    if not moved:
+        db.rollback()
+        return 0
+
+    now = datetime.now(timezone.utc)
+    db.execute(insert(archive), [{**row._asdict(), "archived_at": now} for row in moved])
+
+    # Live rows leave the hot view: delta-sync clients drop them like deletes
+    db.execute(insert(TodoTombstones), [
+        {"todo_id": row.id, "owner_id": row.owner_id, "deleted_seq": deleted_seqs[row.owner_id], "deleted_at": now}
+        for row in moved
+    ])
+
+    # Rows that changed since the candidate read were counted out above but stay in `todos`. Their
+    # counters are among the ones bumped above, so this takes no new lock after the change counters.
+    expected.subtract(row.priority for row in moved)
+    bump_todo_stats_many(db, {(True, priority): count for priority, count in expected.items()})
+
+    db.commit()
+
+    for owner_id, count in Counter(row.owner_id for row in moved).items():
+        todo_events.publish("archived", owner_id, count=count)
+
+    return len(moved)
+
+
+def archive_completed_todos(db: Session, archive_after: timedelta = ARCHIVE_AFTER,
+                            batch_size: int = ARCHIVE_BATCH_SIZE, pause: float = 0.0) -> int:
+    """
+        Runs batches until none is left. Every batch commits on its own, so an interrupted run
+        just continues where it stopped the next time.
+    """
+    cutoff = datetime.now(timezone.utc) - archive_after
+    total = 0
+
+    while True:
+        moved = archive_batch(db, cutoff, batch_size)
+        total += moved
+
+        if moved < batch_size:
+            return total
+
+        time.sleep(pause)
+
+
+class TodoArchiver:
+    """
+        Background thread running `archive_completed_todos` every `interval` seconds, on every shard
+        unless a `session_factory` is given.
+    """
+
+    def __init__(self, session_factory: sessionmaker | None = None,
+                 interval: float = ARCHIVE_INTERVAL_SECONDS,
+                 archive_after: timedelta = ARCHIVE_AFTER):
+        self.session_factory = session_factory
+        self.interval = interval
+        self.archive_after = archive_after
+        self._stopped = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    def start(self):
+        self._stopped.clear()
+        self._thread = threading.Thread(target=self._run, name="todo-archiver", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        if self._thread is None:
+            return
+
+        self._stopped.set()
+        self._thread.join()
+        self._thread = None
+
+    def _run(self):
+        while not self._stopped.wait(self.interval):
+            session_factories = [self.session_factory] if self.session_factory else shard_router.session_factories
+
+            for session_factory in session_factories:
+                try:
+                    with session_factory() as db:
+                        moved = archive_completed_todos(db, self.archive_after,
+                                                        pause=ARCHIVE_BATCH_PAUSE_SECONDS)
+
+                    if moved:
+                        logger.info("Archived %d completed todos", moved)
+                except Exception:
+                    logger.warning("Todo archiving failed", exc_info=True)
+
+
+todo_archiver = TodoArchiver()
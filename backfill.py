@@ -0,0 +1,139 @@
+"""
+    Online data backfills for migrations: fills a column in small keyset-ordered chunks instead of one
+    table-locking `UPDATE`.
+
+    Each chunk is its own short transaction that also saves a checkpoint, so production writes keep going
+    between chunks and an interrupted backfill resumes after the last committed chunk.
+
+    In a migration, commit the schema change first, then backfill:
+
+        from backfill import backfill
+
+        def upgrade() -> None:
+            op.add_column('users', sa.Column('phone_number', sa.String(), nullable=True))
+
+            users = sa.table('users', sa.column('id'), sa.column('phone_number'))
+            with op.get_context().autocommit_block():
+                backfill(op.get_bind(), users, {'phone_number': ''}, where=users.c.phone_number.is_(None))
+"""
+import logging
+import time
+from datetime import datetime, timezone
+
+from sqlalchemy import (BigInteger, Column, Connection, DateTime, Engine, MetaData, String, Table, delete, insert,
+                        select, update)
+
+
+logger = logging.getLogger(__name__)
+
+# Rows per chunk: each chunk locks only these rows, and only for one short transaction
+BACKFILL_BATCH_SIZE = 1000
+# Sleep between chunks, leaving room for replication and for the application's own writes
+BACKFILL_PAUSE_SECONDS = 0.05
+# Seconds between two progress lines in the log
+BACKFILL_REPORT_SECONDS = 10
+
+# Not part of `models.Base.metadata`: it is bookkeeping of the migrations, not of the app
+checkpoint_metadata = MetaData()
+
+backfill_checkpoints = Table(
+    "backfill_checkpoints",
+    checkpoint_metadata,
+    Column("name", String(200), primary_key=True),
+    # Largest key already backfilled
+    Column("last_key", BigInteger, nullable=False),
+    Column("rows_done", BigInteger, nullable=False),
+    Column("updated_at", DateTime(timezone=True), nullable=False),
+)
+
+
+def backfill(bind: Engine | Connection, table: Table, values: dict, where=None, name: str | None = None,
+             key: str = "id", batch_size: int = BACKFILL_BATCH_SIZE,
+             pause: float = BACKFILL_PAUSE_SECONDS) -> int:
+    """
+        Runs `UPDATE table SET values WHERE where` chunk by chunk in `key` order and returns the number
+        of rows updated by this run.
+
+        `key` must be a unique integer column, normally the primary key. `name` identifies the checkpoint
+        (default: table and columns); the checkpoint is removed once the backfill completes.
+
+        Chunks run on a connection of their own. Called from a migration, wrap the call in
+        `op.get_context().autocommit_block()` so the schema change it depends on is committed first.
+    """
+    engine = bind.engine if isinstance(bind, Connection) else bind
+    name = name or f"{table.name}:{','.join(sorted(values))}"
+    key_column = table.c[key]
+
+    checkpoint_metadata.create_all(engine, checkfirst=True)
+
+    with engine.connect() as connection:
+        checkpoint = connection.execute(
+            select(backfill_checkpoints.c.last_key, backfill_checkpoints.c.rows_done)
+            .where(backfill_checkpoints.c.name == name)
+        ).first()
+
+    if checkpoint is None:
+        last_key, rows_done = None, 0
+    else:
+        last_key, rows_done = checkpoint
+        logger.info("Backfill %s: resuming after %s=%s (%d rows done)", name, key, last_key, rows_done)
+
+    started_at = reported_at = time.monotonic()
+    updated = 0
+
+    while True:
+        with engine.begin() as connection:
+            chunk = select(key_column).order_by(key_column).limit(batch_size)
+            if last_key is not None:
+                chunk = chunk.where(key_column > last_key)
+            if where is not None:
+                chunk = chunk.where(where)
+
+            keys = connection.execute(chunk).scalars().all()
+            if not keys:
+                break
+
+            statement = update(table).values(values).where(key_column <= keys[-1])
+            if last_key is not None:
+                statement = statement.where(key_column > last_key)
+            if where is not None:
+                statement = statement.where(where)
+
+            updated += connection.execute(statement).rowcount
+            last_key = keys[-1]
+
+            _save_checkpoint(connection, name, last_key, rows_done + updated)
+
+        now = time.monotonic()
+        if now - reported_at >= BACKFILL_REPORT_SECONDS:
+            logger.info("Backfill %s: %d rows, %.0f rows/s", name, updated, updated / (now - started_at))
+            reported_at = now
+
+        if len(keys) < batch_size:
+            break
+
+        time.sleep(pause)
+
+    # Done: a later run of the same backfill (after a downgrade, say) starts from the beginning again
+    with engine.begin() as connection:
+        connection.execute(delete(backfill_checkpoints).where(backfill_checkpoints.c.name == name))
+
+    elapsed = time.monotonic() - started_at
+    logger.info("Backfill %s: done, %d rows in %.1fs (%.0f rows/s)",
+                name, updated, elapsed, updated / elapsed if elapsed else 0)
+
+    return updated
+
+
+def _save_checkpoint(connection: Connection, name: str, last_key: int, rows_done: int):
+    now = datetime.now(timezone.utc)
+    saved = connection.execute(
+        update(backfill_checkpoints)
+        .where(backfill_checkpoints.c.name == name)
+        .values(last_key=last_key, rows_done=rows_done, updated_at=now)
+    ).rowcount
+
+    if not saved:
+        connection.execute(insert(backfill_checkpoints).values(
+            name=name, last_key=last_key, rows_done=rows_done, updated_at=now
+        ))
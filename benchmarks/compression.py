@@ -0,0 +1,75 @@
+"""
+    CPU cost versus bytes saved for every encoding and level of `CompressionMiddleware`.
+
+    Run from the directory that contains this package:
+        python -m package.benchmarks.compression [--rows 1000]
+
+    The payload is a `find_all`-shaped JSON list. brotli and zstd rows appear only when installed.
+"""
+import argparse
+import json
+import time
+import zlib
+
+from ..compression import brotli, zstandard
+
+
+def make_payload(rows: int) -> bytes:
+    return json.dumps([
+        {
+            "id": index,
+            "title": f"Todo number {index}",
+            "description": "Need to watch and practice codes everyday",
+            "priority": index % 5 + 1,
+            "complete": bool(index % 3),
+            "owner_id": 1,
+            "version": 1,
+        }
+        for index in range(rows)
+    ]).encode()
+
+
+def encoders():
+    for level in range(1, 10):
+        yield "gzip", level, lambda body, level=level: zlib.compress(body, level, wbits=31)
+
+    if brotli is not None:
+        for quality in range(0, 12):
+            yield "br", quality, lambda body, quality=quality: brotli.compress(body, quality=quality)
+
+    if zstandard is not None:
+        for level in (1, 3, 6, 9, 12, 15, 19):
+            compressor = zstandard.ZstdCompressor(level=level)
+            yield "zstd", level, compressor.compress
+
+
+def cpu_per_call(fn, body: bytes, min_seconds: float = 0.2) -> float:
+    rounds = 0
+    start = time.process_time()
+
+    while True:
+        fn(body)
+        rounds += 1
+        elapsed = time.process_time() - start
+        if elapsed >= min_seconds:
+            return elapsed / rounds
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=1000)
+    args = parser.parse_args()
+
+    body = make_payload(args.rows)
+    print(f"payload: {args.rows} todos, {len(body):,} bytes\n")
+    print(f"{'encoding':<8} {'level':>5} {'bytes':>10} {'ratio':>7} {'cpu ms':>8} {'MB/s':>8}")
+
+    for name, level, compress in encoders():
+        size = len(compress(body))
+        cpu = cpu_per_call(compress, body)
+        print(f"{name:<8} {level:>5} {size:>10,} {len(body) / size:>7.1f} {cpu * 1000:>8.2f} "
+              f"{len(body) / cpu / 1e6:>8.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+"""
+    Payload size and latency per 10k rows of the todo listing: every column versus `fields=title,complete`.
+
+    Run from the directory that contains this package:
+        python -m package.benchmarks.fields [--rows 10000] [--url postgresql://...]
+
+    Both include the JSON encoding `find_all` does, so the time covers the query and the serialization.
+"""
+import argparse
+import os
+import tempfile
+import time
+
+from sqlalchemy import create_engine, insert
+from sqlalchemy.orm import sessionmaker
+
+from ..database import Base
+from ..models import Todos, Users
+from ..reads import TODO_FIELDS, parse_fields, read_todos_of_owner
+from ..single_flight import json_body
+
+ROUNDS = 10
+
+SELECTIONS = (
+    ("all", None),
+    ("title,complete", "title,complete"),
+    ("id,title,complete", "id,title,complete"),
+)
+
+
+def listing(db, fields) -> bytes:
+    return json_body([row._asdict() for row in read_todos_of_owner(db, 1, fields=fields)])
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=10_000)
+    parser.add_argument("--url", default=None)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        url = args.url or f"sqlite:///{os.path.join(directory, 'bench.db')}"
+        engine = create_engine(url)
+        Base.metadata.drop_all(bind=engine)
+        Base.metadata.create_all(bind=engine)
+        session_factory = sessionmaker(bind=engine)
+
+        with session_factory() as db:
+            db.add(Users(username="bench", email="bench@example.com", is_active=True, role="admin"))
+            db.commit()
+            db.execute(insert(Todos), [
+                {"title": f"todo {index}", "description": f"a longer description of benchmark row {index}",
+                 "priority": index % 5 + 1, "complete": bool(index % 2), "owner_id": 1}
+                for index in range(args.rows)
+            ])
+            db.commit()
+
+        print(f"{engine.dialect.name}, {args.rows} rows, scaled to 10k rows")
+        print(f"{'fields':<20} {'ms':>8} {'KB':>9}")
+
+        scale = 10_000 / args.rows
+        for name, fields in SELECTIONS:
+            selected = parse_fields(fields, TODO_FIELDS)
+            best = float("inf")
+
+            for _ in range(ROUNDS):
+                with session_factory() as db:
+                    start = time.perf_counter()
+                    body = listing(db, selected)
+                    best = min(best, time.perf_counter() - start)
+
+            print(f"{name:<20} {best * 1000 * scale:>8.1f} {len(body) / 1000 * scale:>9.1f}")
+
+        engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+"""
+    Time and memory per 10k rows: ORM `db.query(Todos)` versus the Core read path of `reads.py`.
+
+    Run from the directory that contains this package:
+        python -m package.benchmarks.read_path [--rows 10000] [--url postgresql://...]
+
+    Both paths include the JSON encoding FastAPI does on the result, since that is what an endpoint pays.
+"""
+import argparse
+import os
+import tempfile
+import time
+import tracemalloc
+
+from fastapi.encoders import jsonable_encoder
+from sqlalchemy import create_engine, insert
+from sqlalchemy.orm import sessionmaker
+
+from ..database import Base
+from ..models import Todos, Users
+from ..reads import read_todos_of_owner
+
+ROUNDS = 10
+
+
+def orm_path(db):
+    return jsonable_encoder(db.query(Todos).filter(Todos.owner_id == 1).all())
+
+
+def core_path(db):
+    return jsonable_encoder([row._asdict() for row in read_todos_of_owner(db, 1)])
+
+
+def measure(session_factory, fn) -> tuple[float, int, int]:
+    """
+        Best wall time of `ROUNDS` calls, then peak traced memory and blocks still allocated after one call.
+    """
+    best = float("inf")
+
+    for _ in range(ROUNDS):
+        with session_factory() as db:
+            start = time.perf_counter()
+            fn(db)
+            best = min(best, time.perf_counter() - start)
+
+    with session_factory() as db:
+        tracemalloc.start()
+        before = tracemalloc.take_snapshot()
+        result = fn(db)
+        after = tracemalloc.take_snapshot()
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+    blocks = sum(stat.count_diff for stat in after.compare_to(before, "filename") if stat.count_diff > 0)
+    del result
+
+    return best, peak, blocks
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=10_000)
+    parser.add_argument("--url", default=None)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        url = args.url or f"sqlite:///{os.path.join(directory, 'bench.db')}"
+        engine = create_engine(url)
+        Base.metadata.drop_all(bind=engine)
+        Base.metadata.create_all(bind=engine)
+        session_factory = sessionmaker(bind=engine)
+
+        with session_factory() as db:
+            db.add(Users(username="bench", email="bench@example.com", is_active=True, role="admin"))
+            db.commit()
+            db.execute(insert(Todos), [
+                {"title": f"todo {index}", "description": f"benchmark row {index}",
+                 "priority": index % 5 + 1, "complete": bool(index % 2), "owner_id": 1}
+                for index in range(args.rows)
+            ])
+            db.commit()
+
+        print(f"{engine.dialect.name}, {args.rows} rows, scaled to 10k rows")
+        print(f"{'path':<6} {'ms':>8} {'peak MB':>9} {'live blocks':>12}")
+
+        scale = 10_000 / args.rows
+        for name, fn in (("orm", orm_path), ("core", core_path)):
+            seconds, peak, blocks = measure(session_factory, fn)
+            print(f"{name:<6} {seconds * 1000 * scale:>8.1f} {peak / 1e6 * scale:>9.1f} {blocks * scale:>12,.0f}")
+
+        engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+"""
+    CPU cost of one session-hour: password re-login vs. refresh-token flow.
+
+    Run from the directory that contains this package:
+        python -m package.benchmarks.refresh_tokens
+"""
+import secrets
+import time
+
+from ..routers.auth import (
+    bcrypt_context,
+    create_access_token,
+    hash_refresh_token,
+    ACCESS_TOKEN_EXPIRES,
+    REFRESH_TOKEN_EXPIRES,
+)
+
+ROUNDS = 20
+PASSWORD = "benchmark-password"
+
+
+def cpu_per_call(fn, rounds: int = ROUNDS) -> float:
+    start = time.process_time()
+    for _ in range(rounds):
+        fn()
+
+    return (time.process_time() - start) / rounds
+
+
+def main():
+    hashed_password = bcrypt_context.hash(PASSWORD)
+    refresh_token = secrets.token_urlsafe(32)
+
+    bcrypt_verify = cpu_per_call(lambda: bcrypt_context.verify(PASSWORD, hashed_password))
+    access_token = cpu_per_call(lambda: create_access_token("john", 1, "admin", ACCESS_TOKEN_EXPIRES), 1000)
+    refresh_hash = cpu_per_call(lambda: hash_refresh_token(refresh_token), 1000)
+    # Every refresh also writes one new token, so its hash is paid twice
+    refresh_cost = 2 * refresh_hash + access_token
+    login_cost = bcrypt_verify + access_token + refresh_hash
+
+    tokens_per_hour = 3600 / ACCESS_TOKEN_EXPIRES.total_seconds()
+    session_hours = REFRESH_TOKEN_EXPIRES.total_seconds() / 3600
+
+    relogin_per_hour = tokens_per_hour * (bcrypt_verify + access_token)
+    # One password login per refresh-token lifetime, refreshes for everything else
+    refresh_per_hour = login_cost / session_hours + tokens_per_hour * refresh_cost
+
+    print(f"bcrypt verify:          {bcrypt_verify * 1e3:10.3f} ms CPU")
+    print(f"access token (JWT):     {access_token * 1e3:10.3f} ms CPU")
+    print(f"refresh token hash:     {refresh_hash * 1e3:10.3f} ms CPU")
+    print()
+    print(f"re-login every {ACCESS_TOKEN_EXPIRES}: {relogin_per_hour * 1e3:10.3f} ms CPU per session-hour")
+    print(f"refresh-token flow:     {refresh_per_hour * 1e3:10.3f} ms CPU per session-hour")
+    print(f"speed-up:               {relogin_per_hour / refresh_per_hour:10.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,290 @@
+"""
+    Replays traffic recorded by `RecordingMiddleware` (see `recording.py`) against the app, in-process,
+    on a freshly seeded database, and compares latency distributions of two runs.
+
+    Run from the directory that contains this package:
+        python -m package.benchmarks.replay traffic.ndjson [--speed 1] [--out before.json] [--url postgresql://...]
+        python -m package.benchmarks.replay --compare before.json after.json
+
+    To compare two code versions: replay on the first with `--out before.json`, check out the second,
+    replay with `--out after.json`, then `--compare`. `--speed 2` replays twice as fast as recorded,
+    `--speed 0` sends every request as soon as a worker thread is free.
+
+    Every recorded caller becomes a seeded user with `--todos` todos, logged in before the run.
+    `{todo_id}` is filled with one of the caller's todos. Recorded strings are replayed as "x" padding,
+    so writes that depend on real values (a password check, a unique username) fail the same way every run.
+    Do not replay against the database of a running server: the replay drops and re-seeds every table.
+    The run uses a private user profile cache, so a server on the same host keeps its own.
+"""
+import argparse
+import json
+import os
+import random
+import tempfile
+import threading
+import time
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, insert, select
+from sqlalchemy.orm import sessionmaker
+
+from ..cache import user_cache
+from ..database import Base, shard_router
+from ..main import app
+from ..models import Todos, Users
+from ..routers import admin, auth, batch, user
+from ..routers.auth import ACCESS_TOKEN_EXPIRES, bcrypt_context
+
+REPLAY_PASSWORD = "replay-password"
+PERCENTILES = (50, 90, 99)
+
+
+def load(path: str) -> list[dict]:
+    with open(path) as file:
+        entries = [json.loads(line) for line in file if line.strip()]
+
+    return sorted(entries, key=lambda entry: entry["t"])
+
+
+def percentile(values: list[float], rank: int) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * rank / 100))]
+
+
+def summarize(latencies: dict[str, list[float]]) -> dict[str, dict]:
+    return {
+        route: {"count": len(values), **{f"p{rank}": round(percentile(values, rank), 2) for rank in PERCENTILES}}
+        for route, values in sorted(latencies.items())
+    }
+
+
+def seed(session_factory, entries: list[dict], todos_per_user: int) -> dict[str, tuple[str, list[int]]]:
+    """
+        Creates one user per recorded caller. Returns pseudonym -> (username, todo ids).
+    """
+    roles = {}
+    for entry in entries:
+        if entry.get("user") is not None and roles.get(entry["user"]) != "admin":
+            roles[entry["user"]] = entry.get("role") or "user"
+
+    hashed_password = bcrypt_context.hash(REPLAY_PASSWORD)
+    users = {}
+
+    with session_factory() as db:
+        for index, (name, role) in enumerate(sorted(roles.items())):
+            model = Users(username=f"replay{index}", email=f"replay{index}@example.com", first_name="Replay",
+                          last_name="User", hashed_password=hashed_password, is_active=True, role=role)
+            db.add(model)
+            db.flush()
+            users[name] = model
+
+        db.commit()
+
+        for index, model in enumerate(users.values()):
+            db.execute(insert(Todos), [
+                {"title": f"todo {number}", "description": f"replayed todo {number} of user {index}",
+                 "priority": number % 5 + 1, "complete": bool(number % 3 == 0), "owner_id": model.id}
+                for number in range(todos_per_user)
+            ])
+        db.commit()
+
+        return {
+            name: (model.username, list(db.scalars(select(Todos.id).where(Todos.owner_id == model.id))))
+            for name, model in users.items()
+        }
+
+
+class Replayer:
+    def __init__(self, client: TestClient, users: dict[str, tuple[str, list[int]]]):
+        self.client = client
+        self.users = users
+        self.latencies: dict[str, list[float]] = defaultdict(list)
+        self.statuses: dict[str, Counter] = defaultdict(Counter)
+        self._tokens: dict[str, tuple[str, float]] = {}
+        self._lock = threading.Lock()
+
+    def token_for(self, name: str) -> str:
+        with self._lock:
+            token, issued_at = self._tokens.get(name, (None, 0.0))
+
+            # Access tokens expire; a long replay logs in again halfway through their lifetime
+            if token is None or time.monotonic() - issued_at > ACCESS_TOKEN_EXPIRES.total_seconds() / 2:
+                username = self.users[name][0]
+                response = self.client.post("/auth/token", data={"username": username, "password": REPLAY_PASSWORD})
+                token = response.json()["access_token"]
+                self._tokens[name] = (token, time.monotonic())
+
+            return token
+
+    def build(self, index: int, entry: dict) -> dict:
+        rng = random.Random(index)
+        name = entry.get("user")
+        username, todo_ids = self.users.get(name, (None, []))
+        request = {"method": entry["method"], "url": entry["route"], "params": entry.get("query") or {},
+                   "headers": {}}
+
+        if "{todo_id}" in request["url"]:
+            request["url"] = request["url"].replace("{todo_id}", str(rng.choice(todo_ids) if todo_ids else 1))
+
+        if entry["route"] == "/auth/token":
+            request["data"] = {"username": username or "unknown", "password": REPLAY_PASSWORD}
+        elif name in self.users:
+            request["headers"]["Authorization"] = f"Bearer {self.token_for(name)}"
+
+        if entry.get("body") is not None:
+            request["json"] = entry["body"]
+
+        return request
+
+    def send(self, index: int, entry: dict):
+        request = self.build(index, entry)
+        started = time.perf_counter()
+        response = self.client.request(**request)
+        elapsed_ms = (time.perf_counter() - started) * 1000
+
+        key = f"{entry['method']} {entry['route']}"
+        with self._lock:
+            self.latencies[key].append(elapsed_ms)
+            self.statuses[key][str(response.status_code)] += 1
+
+    def run(self, entries: list[dict], speed: float, concurrency: int):
+        """
+            Sends each request at its recorded offset from the first one, divided by `speed`.
+        """
+        if not entries:
+            return
+
+        first = entries[0]["t"]
+        started = time.monotonic()
+
+        with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="replay") as pool:
+            futures = []
+
+            for index, entry in enumerate(entries):
+                if speed > 0:
+                    delay = started + (entry["t"] - first) / speed - time.monotonic()
+                    if delay > 0:
+                        time.sleep(delay)
+
+                futures.append(pool.submit(self.send, index, entry))
+
+            for future in futures:
+                future.result()
+
+
+def replay(entries: list[dict], url: str, speed: float = 1.0, concurrency: int = 16,
+           todos_per_user: int = 100) -> dict:
+    """
+        Points the app at a new database at `url`, replays `entries` and puts everything back.
+        Returns the latency summary and status counts per route.
+    """
+    engine = create_engine(url)
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+    session_factory = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+    def get_db():
+        db = session_factory()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    original_shards = (shard_router.engines, shard_router.directory, shard_router.session_factories)
+    overrides = dict(app.dependency_overrides)
+
+    original_cache = user_cache.backend
+
+    shard_router.set_shards([engine])
+    for dependency in (auth.get_db, user.get_db, admin.get_db, batch.get_user_db):
+        app.dependency_overrides[dependency] = get_db
+    # Seeded users reuse ids of real ones: they must never reach the shared segment of a live server
+    user_cache.configure("local")
+
+    try:
+        users = seed(session_factory, entries, todos_per_user)
+        replayer = Replayer(TestClient(app, raise_server_exceptions=False), users)
+        # Log everyone in first, so the run measures the recorded logins only
+        for name in users:
+            replayer.token_for(name)
+
+        started = time.perf_counter()
+        replayer.run(entries, speed, concurrency)
+        seconds = time.perf_counter() - started
+    finally:
+        user_cache.backend = original_cache
+        app.dependency_overrides.clear()
+        app.dependency_overrides.update(overrides)
+        shard_router.set_shards(*original_shards)
+        engine.dispose()
+
+    return {
+        "database": engine.dialect.name,
+        "requests": len(entries),
+        "seconds": round(seconds, 3),
+        "routes": summarize(replayer.latencies),
+        "statuses": {route: dict(counts) for route, counts in sorted(replayer.statuses.items())},
+    }
+
+
+def print_run(result: dict):
+    print(f"{result['database']}, {result['requests']} requests in {result['seconds']} s")
+    print(f"{'route':<36} {'count':>6} " + " ".join(f"{f'p{rank} ms':>9}" for rank in PERCENTILES) + "  statuses")
+
+    for route, summary in result["routes"].items():
+        statuses = ",".join(f"{code}:{count}" for code, count in sorted(result["statuses"][route].items()))
+        print(f"{route:<36} {summary['count']:>6} "
+              + " ".join(f"{summary[f'p{rank}']:>9.1f}" for rank in PERCENTILES) + f"  {statuses}")
+
+
+def print_comparison(before: dict, after: dict):
+    print(f"{'route':<36} " + " ".join(f"{f'p{rank} before':>10} {'after':>8} {'change':>7}" for rank in PERCENTILES))
+
+    for route in sorted(set(before["routes"]) | set(after["routes"])):
+        if route not in before["routes"] or route not in after["routes"]:
+            print(f"{route:<36} only in {'after' if route in after['routes'] else 'before'}")
+            continue
+
+        columns = []
+        for rank in PERCENTILES:
+            old, new = before["routes"][route][f"p{rank}"], after["routes"][route][f"p{rank}"]
+            change = (new - old) / old * 100 if old else 0.0
+            columns.append(f"{old:>10.1f} {new:>8.1f} {change:>+6.0f}%")
+
+        print(f"{route:<36} " + " ".join(columns))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("log", nargs="?")
+    parser.add_argument("--speed", type=float, default=1.0)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--todos", type=int, default=100)
+    parser.add_argument("--url", default=None)
+    parser.add_argument("--out", default=None)
+    parser.add_argument("--compare", nargs=2, metavar=("BEFORE", "AFTER"))
+    args = parser.parse_args()
+
+    if args.compare:
+        with open(args.compare[0]) as before, open(args.compare[1]) as after:
+            print_comparison(json.load(before), json.load(after))
+        return
+
+    if not args.log:
+        parser.error("a recorded traffic file or --compare is required")
+
+    with tempfile.TemporaryDirectory() as directory:
+        url = args.url or f"sqlite:///{os.path.join(directory, 'replay.db')}"
+        result = replay(load(args.log), url, args.speed, args.concurrency, args.todos)
+
+    print_run(result)
+
+    if args.out:
+        with open(args.out, "w") as file:
+            json.dump(result, file, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+"""
+    Throughput of the todo export/import endpoints in rows per second.
+
+    Run from the directory that contains this package:
+        python -m package.benchmarks.todo_transfer [--rows 100000] [--url postgresql://...]
+
+    Defaults to a throwaway SQLite file; pass a PostgreSQL URL to measure the COPY export path.
+"""
+import argparse
+import json
+import os
+import resource
+import tempfile
+import time
+
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, text
+from sqlalchemy.orm import sessionmaker
+
+from ..database import Base
+from ..main import app
+from ..models import Users
+from ..routers import todos
+
+
+def make_body(rows: int, file_format: str):
+    """
+        Yields the upload in chunks so the client never builds the whole file either.
+    """
+    if file_format == "csv":
+        yield b"title,description,priority,complete\n"
+
+    chunk = []
+    for index in range(rows):
+        if file_format == "csv":
+            chunk.append(f"todo {index},benchmark row {index},{index % 5 + 1},{'true' if index % 2 else 'false'}\n")
+        else:
+            chunk.append(json.dumps({
+                "title": f"todo {index}",
+                "description": f"benchmark row {index}",
+                "priority": index % 5 + 1,
+                "complete": bool(index % 2),
+            }) + "\n")
+
+        if len(chunk) == 1000:
+            yield "".join(chunk).encode()
+            chunk = []
+
+    if chunk:
+        yield "".join(chunk).encode()
+
+
+def max_rss_mb() -> float:
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--url", default=None)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        url = args.url or f"sqlite:///{os.path.join(directory, 'bench.db')}"
+        engine = create_engine(url)
+        Base.metadata.drop_all(bind=engine)
+        Base.metadata.create_all(bind=engine)
+        session_factory = sessionmaker(bind=engine)
+
+        with session_factory() as db:
+            db.add(Users(username="bench", email="bench@example.com", is_active=True, role="admin"))
+            db.commit()
+
+        def override_get_db():
+            db = session_factory()
+            try:
+                yield db
+            finally:
+                db.close()
+
+        app.dependency_overrides[todos.get_db] = override_get_db
+        app.dependency_overrides[todos.get_current_user] = lambda: {"username": "bench", "id": 1, "role": "admin"}
+        client = TestClient(app)
+
+        print(f"{engine.dialect.name}, {args.rows} rows")
+
+        for file_format in ("csv", "ndjson"):
+            with engine.begin() as connection:
+                connection.execute(text("DELETE FROM todos"))
+                connection.execute(text("DELETE FROM todo_stats"))
+
+            start = time.perf_counter()
+            response = client.post("/todo/import", params={"format": file_format},
+                                   content=make_body(args.rows, file_format))
+            elapsed = time.perf_counter() - start
+            assert response.status_code == 201, response.text
+            print(f"import {file_format:6}: {args.rows / elapsed:12,.0f} rows/s")
+
+            start = time.perf_counter()
+            exported_bytes = 0
+            with client.stream("GET", "/todo/export", params={"format": file_format}) as response:
+                for chunk in response.iter_bytes():
+                    exported_bytes += len(chunk)
+            elapsed = time.perf_counter() - start
+            print(f"export {file_format:6}: {args.rows / elapsed:12,.0f} rows/s ({exported_bytes / 1e6:.1f} MB)")
+
+        print(f"max RSS: {max_rss_mb():.0f} MB")
+        app.dependency_overrides.clear()
+        engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,146 @@
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from sqlalchemy.orm import Session
+
+from .database import engine
+from .reads import read_user
+
+
+# How long a cached user profile is trusted before it is reloaded from the DB
+USER_CACHE_TTL_SECONDS = 60
+USER_CACHE_MAX_SIZE = 10_000
+# "shared": one cache for every worker on the host (see `shared_cache.py`), "local": one per process
+USER_CACHE_BACKEND = "shared"
+
+
+class TTLCache:
+    """
+        Thread-safe LRU cache whose entries expire `ttl` seconds after they are set.
+
+        Sync endpoints run in FastAPI's thread pool, so every access goes through a lock.
+        `generation` counts invalidations; `set` drops a value loaded before one of them (see `SharedCache`).
+    """
+
+    def __init__(self, ttl: float, maxsize: int = 1024):
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self._data: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+        # One counter for all keys: an invalidation also drops concurrent sets of other keys, a rare miss
+        self._generation = 0
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._data.get(key)
+
+            if entry is None:
+                return default
+
+            expires_at, value = entry
+            if expires_at <= time.monotonic():
+                del self._data[key]
+                return default
+
+            self._data.move_to_end(key)
+            return value
+
+    def generation(self, key) -> int:
+        return self._generation
+
+    def set(self, key, value, generation: int | None = None):
+        with self._lock:
+            if generation is not None and generation != self._generation:
+                return
+
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def invalidate(self, key):
+        with self._lock:
+            self._generation += 1
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._generation += 1
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+class UserCache:
+    """
+        The user profile cache every router imports. `configure` picks what is behind it, so tests and
+        tools can swap in a cache of their own without re-importing the routers that hold this object.
+    """
+
+    def __init__(self):
+        # A `TTLCache` or a `SharedCache`
+        self.backend = None
+
+    def configure(self, backend: str = USER_CACHE_BACKEND, database_url: str | None = None):
+        """
+            "local": a private `TTLCache`. "shared": the host-wide segment of `database_url`, the database
+            users are read from (the primary by default). Profiles of different databases never share a segment.
+        """
+        if backend == "shared":
+            from .shared_cache import SharedCache
+
+            url = database_url or engine.url.render_as_string(hide_password=False)
+            database = hashlib.blake2b(url.encode(), digest_size=4).hexdigest()
+            self.backend = SharedCache(f"todos-user-cache-{os.getuid()}-{database}", ttl=USER_CACHE_TTL_SECONDS,
+                                       slots=USER_CACHE_MAX_SIZE)
+        else:
+            self.backend = TTLCache(ttl=USER_CACHE_TTL_SECONDS, maxsize=USER_CACHE_MAX_SIZE)
+
+        return self
+
+    def get(self, key, default=None):
+        return self.backend.get(key, default)
+
+    def generation(self, key) -> int:
+        return self.backend.generation(key)
+
+    def set(self, key, value, generation: int | None = None):
+        self.backend.set(key, value, generation)
+
+    def invalidate(self, key):
+        self.backend.invalidate(key)
+
+    def clear(self):
+        self.backend.clear()
+
+    def __len__(self):
+        return len(self.backend)
+
+
+user_cache = UserCache().configure()
+
+
+def get_user_profile(db: Session, user_id: int) -> dict | None:
+    profile = user_cache.get(user_id)
+
+    if profile is not None:
+        return profile
+
+    # An invalidation during the read below means it may return the row as it was before that write
+    generation = user_cache.generation(user_id)
+
+    # Public columns only (see `reads.USER_COLUMNS`): no ORM instance and no password hash
+    row = read_user(db, user_id)
+
+    if row is None:
+        return None
+
+    profile = row._asdict()
+    user_cache.set(user_id, profile, generation)
+
+    return profile
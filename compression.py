@@ -0,0 +1,268 @@
+import hashlib
+import zlib
+
+from starlette.responses import Response
+
+from .cache import TTLCache
+
+# Optional encoders: brotli and zstd are offered only when their package is installed
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+
+# Bodies smaller than this are sent as they are: the headers would eat most of the saving
+COMPRESSION_MINIMUM_SIZE = 1024
+# Levels picked from `benchmarks/compression.py`: most of the size win for a fraction of the CPU of the max levels
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 4
+ZSTD_LEVEL = 3
+
+COMPRESSIBLE_TYPES = ("application/json", "application/x-ndjson", "text/csv", "text/plain", "text/html")
+
+# Compressed bodies of responses with an ETag, keyed by (encoding, content ETag or body digest)
+COMPRESSED_CACHE_TTL_SECONDS = 300
+COMPRESSED_CACHE_MAX_ENTRIES = 256
+# Larger compressed bodies (e.g. unpaged admin listings) are not cached, so the cache holds at most
+# COMPRESSED_CACHE_MAX_ENTRIES * COMPRESSED_CACHE_MAX_ENTRY_BYTES (16 MB) per worker
+COMPRESSED_CACHE_MAX_ENTRY_BYTES = 64 * 1024
+compressed_cache = TTLCache(ttl=COMPRESSED_CACHE_TTL_SECONDS, maxsize=COMPRESSED_CACHE_MAX_ENTRIES)
+
+# Marks ETags that are a digest of the body (see `content_etag`)
+_CONTENT_ETAG_PREFIX = b'"c-'
+
+
+class _GzipEncoder:
+    def __init__(self, level: int = GZIP_LEVEL):
+        # wbits=31: gzip header and trailer
+        self._compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+
+    def compress(self, data: bytes) -> bytes:
+        # Sync flush: the client gets every chunk as soon as it is produced
+        return self._compressor.compress(data) + self._compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self) -> bytes:
+        return self._compressor.flush()
+
+
+class _BrotliEncoder:
+    def __init__(self, quality: int = BROTLI_QUALITY):
+        self._compressor = brotli.Compressor(quality=quality)
+
+    def compress(self, data: bytes) -> bytes:
+        return self._compressor.process(data) + self._compressor.flush()
+
+    def finish(self) -> bytes:
+        return self._compressor.finish()
+
+
+class _ZstdEncoder:
+    def __init__(self, level: int = ZSTD_LEVEL):
+        self._compressor = zstandard.ZstdCompressor(level=level).compressobj()
+
+    def compress(self, data: bytes) -> bytes:
+        return self._compressor.compress(data) + self._compressor.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK)
+
+    def finish(self) -> bytes:
+        return self._compressor.flush()
+
+
+# Server preference when the client accepts several encodings with the same q-value
+ENCODERS = {"gzip": _GzipEncoder}
+if brotli is not None:
+    ENCODERS = {"br": _BrotliEncoder, **ENCODERS}
+if zstandard is not None:
+    ENCODERS = {"zstd": _ZstdEncoder, **ENCODERS}
+
+
+def choose_encoding(accept_encoding: str) -> str | None:
+    """
+        `gzip, br;q=0.9` -> "gzip". Highest q-value wins, ties go to the first entry of `ENCODERS`.
+    """
+    accepted = {}
+
+    for part in accept_encoding.split(","):
+        name, _, params = part.strip().partition(";")
+        quality = 1.0
+
+        if params.strip().startswith("q="):
+            try:
+                quality = float(params.strip()[2:])
+            except ValueError:
+                continue
+
+        accepted[name.strip().lower()] = quality
+
+    candidates = [
+        (accepted.get(name, accepted.get("*", 0)), -rank, name)
+        for rank, name in enumerate(ENCODERS)
+    ]
+    quality, _, name = max(candidates)
+
+    return name if quality > 0 else None
+
+
+def compress_body(encoding: str, body: bytes) -> bytes:
+    encoder = ENCODERS[encoding]()
+    return encoder.compress(body) + encoder.finish()
+
+
+def content_etag(body: bytes) -> str:
+    """
+        Strong ETag of a rendered body. Unlike per-row version ETags it is unique to the content,
+        so the compressed body cache keys on it without hashing the body again.
+    """
+    return f'"c-{hashlib.blake2b(body, digest_size=16).hexdigest()}"'
+
+
+def etag_response(body: bytes, if_none_match: str | None, headers=None,
+                  media_type: str = "application/json") -> Response:
+    """
+        Sends `body` with its `content_etag`, or an empty 304 when the client already has it.
+    """
+    etag = content_etag(body)
+    headers = {**(headers or {}), "ETag": etag}
+
+    # Weak comparison: the client may hold the `W/` form of a compressed response
+    if if_none_match is not None and etag in (tag.strip().removeprefix("W/") for tag in if_none_match.split(",")):
+        return Response(status_code=304, headers=headers)
+
+    return Response(body, media_type=media_type, headers=headers)
+
+
+class CompressionMiddleware:
+    """
+        ASGI middleware compressing JSON, NDJSON and CSV responses with zstd, brotli or gzip.
+
+        Whole bodies are compressed only above `minimum_size`. Streaming bodies are compressed chunk by chunk
+        and flushed after each one, so exports still arrive incrementally. Server-Sent Events are left alone.
+    """
+
+    def __init__(self, app, minimum_size: int = COMPRESSION_MINIMUM_SIZE):
+        self.app = app
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        accept_encoding = ""
+        for name, value in scope["headers"]:
+            if name == b"accept-encoding":
+                accept_encoding = value.decode("latin-1")
+
+        encoding = choose_encoding(accept_encoding) if accept_encoding else None
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        await _CompressedResponse(encoding, self.minimum_size, send)(self.app, scope, receive)
+
+
+class _CompressedResponse:
+    def __init__(self, encoding: str, minimum_size: int, send):
+        self.encoding = encoding
+        self.minimum_size = minimum_size
+        self.send = send
+        self.start = None
+        self.encoder = None
+        self.passthrough = False
+
+    async def __call__(self, app, scope, receive):
+        await app(scope, receive, self.on_message)
+
+    async def on_message(self, message):
+        if message["type"] == "http.response.start":
+            # Held back until the first body chunk tells whether the body is worth compressing
+            self.start = message
+            headers = dict(message.get("headers", []))
+            content_type = headers.get(b"content-type", b"").decode("latin-1")
+            self.passthrough = (
+                b"content-encoding" in headers
+                or not content_type.startswith(COMPRESSIBLE_TYPES)
+            )
+            return
+
+        if message["type"] != "http.response.body" or self.passthrough:
+            await self._send_start()
+            await self.send(message)
+            return
+
+        body = message.get("body", b"")
+        more_body = message.get("more_body", False)
+
+        if self.encoder is not None:
+            chunk = self.encoder.compress(body) if body else b""
+            if not more_body:
+                chunk += self.encoder.finish()
+            await self.send({"type": "http.response.body", "body": chunk, "more_body": more_body})
+            return
+
+        if not more_body:
+            if len(body) < self.minimum_size:
+                self.passthrough = True
+                await self._send_start()
+                await self.send(message)
+                return
+
+            compressed = self._compress_whole(body)
+            await self._send_compressed_start(len(compressed))
+            await self.send({"type": "http.response.body", "body": compressed})
+            return
+
+        # Streaming response: compress incrementally, the total size is unknown
+        self.encoder = ENCODERS[self.encoding]()
+        await self._send_compressed_start(None)
+        await self.send({"type": "http.response.body", "body": self.encoder.compress(body), "more_body": True})
+
+    def _compress_whole(self, body: bytes) -> bytes:
+        etag = next((value for name, value in self.start.get("headers", []) if name == b"etag"), None)
+        if etag is None:
+            return compress_body(self.encoding, body)
+
+        if etag.startswith(_CONTENT_ETAG_PREFIX):
+            key = (self.encoding, etag)
+        else:
+            # Keyed by content, not by the ETag alone: per-row version ETags are not globally unique
+            key = (self.encoding, hashlib.blake2b(body, digest_size=16).digest())
+        compressed = compressed_cache.get(key)
+
+        if compressed is None:
+            compressed = compress_body(self.encoding, body)
+
+            if len(compressed) <= COMPRESSED_CACHE_MAX_ENTRY_BYTES:
+                compressed_cache.set(key, compressed)
+
+        return compressed
+
+    async def _send_start(self):
+        if self.start is not None:
+            start, self.start = self.start, None
+            await self.send(start)
+
+    async def _send_compressed_start(self, length: int | None):
+        start, self.start = self.start, None
+        headers = []
+
+        for name, value in start.get("headers", []):
+            if name == b"content-length":
+                continue
+            if name == b"etag" and not value.startswith(b"W/"):
+                # The compressed bytes differ from the identity ones, so the validator becomes weak
+                value = b"W/" + value
+            headers.append((name, value))
+
+        headers.append((b"content-encoding", self.encoding.encode()))
+        headers.append((b"vary", b"Accept-Encoding"))
+
+        if length is not None:
+            headers.append((b"content-length", str(length).encode()))
+
+        await self.send({**start, "headers": headers})
@@ -0,0 +1,20 @@
+from typing import Literal
+
+from pydantic import BaseModel, Field
+
+
+class BatchOperationDto(BaseModel):
+    # list, get, create, update (PUT), patch and delete of the caller's todos; `me` is `GET /user/`
+    op: Literal["list", "get", "create", "update", "patch", "delete", "me"]
+    todo_id: int | None = Field(default=None, gt=0)
+    # Expected todo version for update/patch, the `If-Match` of a single request
+    version: int | None = Field(default=None, gt=0)
+    # TodoDto for create/update, TodoPatchDto for patch
+    body: dict | None = None
+
+
+class BatchDto(BaseModel):
+    # atomic: one transaction, the first failure rolls everything back
+    # independent: each operation succeeds or fails on its own, every write with its own commit
+    mode: Literal["atomic", "independent"] = "atomic"
+    operations: list[BatchOperationDto] = Field(min_length=1, max_length=50)
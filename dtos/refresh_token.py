@@ -0,0 +1,5 @@
+from pydantic import BaseModel, Field
+
+
+class RefreshTokenRequest(BaseModel):
+    refresh_token: str = Field(min_length=1)
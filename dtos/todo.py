@@ -6,3 +6,10 @@ class TodoDto(BaseModel):
     description: str = Field(min_length=3, max_length=100)
     priority: int = Field(gt=0, lt=6)
     complete: bool
+
+
+class TodoPatchDto(BaseModel):
+    title: str | None = Field(default=None, min_length=3)
+    description: str | None = Field(default=None, min_length=3, max_length=100)
+    priority: int | None = Field(default=None, gt=0, lt=6)
+    complete: bool | None = None
@@ -4,4 +4,4 @@ from pydantic import BaseModel, Field
 class Token(BaseModel):
     access_token: str
     token_type: str
-
+    refresh_token: str | None = None
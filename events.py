@@ -0,0 +1,319 @@
+import asyncio
+import json
+import logging
+import os
+import select
+import socket
+import tempfile
+import threading
+import uuid
+from typing import Callable
+
+
+logger = logging.getLogger(__name__)
+
+# Events buffered per subscriber. A subscriber that falls further behind gets a `resync` event instead.
+SUBSCRIBER_QUEUE_SIZE = 100
+# Seconds between SSE keep-alive comments on an idle connection
+HEARTBEAT_SECONDS = 15
+# How events reach other workers: "local" (this process only), "socket" (Unix sockets) or "postgres" (LISTEN/NOTIFY)
+TODO_EVENTS_BACKEND = "local"
+# Backoff between attempts to reopen a lost LISTEN connection
+EVENTS_RECONNECT_MIN_SECONDS = 0.5
+EVENTS_RECONNECT_MAX_SECONDS = 30
+
+
+class LocalBackend:
+    """
+        Single-process backend: published events go straight to this worker's subscribers.
+    """
+
+    def attach(self, deliver: Callable[[dict], None]):
+        self.deliver = deliver
+
+    def publish(self, event: dict):
+        self.deliver(event)
+
+    def close(self):
+        pass
+
+
+class UnixSocketBackend:
+    """
+        Cross-worker backend for one host without any external service.
+
+        Every worker binds a Unix datagram socket in `directory` and publishing sends the event to all
+        sockets found there, its own included. Dead sockets left behind by crashed workers are removed.
+    """
+
+    def __init__(self, directory: str | None = None):
+        self.directory = directory or os.path.join(tempfile.gettempdir(), "todo-events")
+        os.makedirs(self.directory, exist_ok=True)
+        self.path = os.path.join(self.directory, f"{os.getpid()}-{uuid.uuid4().hex[:8]}.sock")
+        self._socket = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        self._socket.bind(self.path)
+        self._sender = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        # A stuck worker must not block the request that publishes
+        self._sender.setblocking(False)
+        self._closed = False
+
+    def attach(self, deliver: Callable[[dict], None]):
+        self.deliver = deliver
+        threading.Thread(target=self._listen, name="todo-events-socket", daemon=True).start()
+
+    def publish(self, event: dict):
+        payload = json.dumps(event).encode()
+
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            try:
+                self._sender.sendto(payload, path)
+            except (ConnectionRefusedError, FileNotFoundError):
+                if path != self.path:
+                    try:
+                        os.unlink(path)
+                    except FileNotFoundError:
+                        pass
+            except BlockingIOError:
+                logger.warning("Dropped event for %s: its socket buffer is full", path)
+
+    def _listen(self):
+        while not self._closed:
+            try:
+                payload = self._socket.recv(65536)
+            except OSError:
+                return
+
+            self.deliver(json.loads(payload))
+
+    def close(self):
+        self._closed = True
+        self._socket.close()
+        self._sender.close()
+
+        try:
+            os.unlink(self.path)
+        except FileNotFoundError:
+            pass
+
+
+class PostgresNotifyBackend:
+    """
+        Cross-worker backend using PostgreSQL LISTEN/NOTIFY.
+
+        NOTIFY is also delivered to the publishing worker, so events are only handed to subscribers
+        by the listener thread. Payloads must stay below PostgreSQL's 8000 byte limit.
+
+        A dropped listener connection is reopened with exponential backoff and LISTEN is sent again.
+        Notifications sent meanwhile are lost, so every local subscriber then gets a `resync` event.
+        The publisher reconnects on the next publish.
+    """
+
+    def __init__(self, dsn: str, channel: str = "todo_events"):
+        self.dsn = dsn
+        self.channel = channel
+        self._publisher = self._connect()
+        self._publisher_lock = threading.Lock()
+        self._listener = self._connect()
+        self._closed = threading.Event()
+
+    def _connect(self):
+        import psycopg2
+
+        connection = psycopg2.connect(self.dsn)
+        connection.autocommit = True
+        return connection
+
+    def attach(self, deliver: Callable[[dict], None]):
+        self.deliver = deliver
+
+        with self._listener.cursor() as cursor:
+            cursor.execute(f"LISTEN {self.channel}")
+
+        threading.Thread(target=self._listen, name="todo-events-notify", daemon=True).start()
+
+    def publish(self, event: dict):
+        import psycopg2
+
+        with self._publisher_lock:
+            if self._publisher.closed:
+                self._publisher = self._connect()
+
+            try:
+                self._notify(event)
+            except (psycopg2.OperationalError, psycopg2.InterfaceError):
+                # The connection died since the last publish: one retry on a fresh one
+                self._publisher.close()
+                self._publisher = self._connect()
+                self._notify(event)
+
+    def _notify(self, event: dict):
+        with self._publisher.cursor() as cursor:
+            cursor.execute("SELECT pg_notify(%s, %s)", (self.channel, json.dumps(event)))
+
+    def _listen(self):
+        backoff = EVENTS_RECONNECT_MIN_SECONDS
+
+        while not self._closed.is_set():
+            try:
+                if self._listener is None:
+                    self._listener = self._connect()
+                    with self._listener.cursor() as cursor:
+                        cursor.execute(f"LISTEN {self.channel}")
+
+                    logger.info("Reconnected to %s notifications", self.channel)
+                    self.deliver({"type": "resync"})
+
+                self._poll()
+                backoff = EVENTS_RECONNECT_MIN_SECONDS
+            except Exception:
+                if self._closed.is_set():
+                    return
+
+                logger.warning("Lost %s notifications, reconnecting in %.1fs", self.channel, backoff, exc_info=True)
+                self._drop_listener()
+                self._closed.wait(backoff)
+                backoff = min(backoff * 2, EVENTS_RECONNECT_MAX_SECONDS)
+
+    def _poll(self):
+        # Sleeps in the kernel until a notification arrives
+        if select.select([self._listener], [], [], 5) == ([], [], []):
+            return
+
+        self._listener.poll()
+        while self._listener.notifies:
+            notify = self._listener.notifies.pop(0)
+            self.deliver(json.loads(notify.payload))
+
+    def _drop_listener(self):
+        if self._listener is not None:
+            try:
+                self._listener.close()
+            except Exception:
+                pass
+
+        self._listener = None
+
+    def close(self):
+        self._closed.set()
+        self._publisher.close()
+
+        if self._listener is not None:
+            self._listener.close()
+
+
+class Subscription:
+    """
+        One SSE client. Lives on the event loop that created it; events are pushed with `call_soon_threadsafe`.
+    """
+
+    def __init__(self, owner_id: int, maxsize: int = SUBSCRIBER_QUEUE_SIZE):
+        self.owner_id = owner_id
+        self.loop = asyncio.get_running_loop()
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=maxsize)
+        self.dropped = 0
+
+    def push(self, event: dict):
+        if self.queue.full():
+            # Backpressure: a slow client must not grow memory. Whatever it missed, it has to refetch.
+            self.dropped += self.queue.qsize()
+            while not self.queue.empty():
+                self.queue.get_nowait()
+
+            self.queue.put_nowait({"type": "resync", "owner_id": self.owner_id})
+            return
+
+        self.queue.put_nowait(event)
+
+    async def get(self) -> dict:
+        return await self.queue.get()
+
+
+class EventBus:
+    """
+        In-process pub/sub of todo changes, keyed by owner. The backend decides whether events reach other workers.
+    """
+
+    def __init__(self, backend=None):
+        self._subscribers: dict[int, set[Subscription]] = {}
+        self._watchers: list[Callable[[dict], None]] = []
+        self._lock = threading.Lock()
+        self.backend = None
+        self.set_backend(backend or LocalBackend())
+
+    def set_backend(self, backend):
+        if self.backend is not None:
+            self.backend.close()
+
+        self.backend = backend
+        backend.attach(self._deliver)
+
+    def subscribe(self, owner_id: int, maxsize: int = SUBSCRIBER_QUEUE_SIZE) -> Subscription:
+        subscription = Subscription(owner_id, maxsize)
+
+        with self._lock:
+            self._subscribers.setdefault(owner_id, set()).add(subscription)
+
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        with self._lock:
+            subscribers = self._subscribers.get(subscription.owner_id)
+
+            if subscribers is not None:
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self._subscribers[subscription.owner_id]
+
+    def watch(self, callback: Callable[[dict], None]):
+        """
+            Calls `callback(event)` for every event this worker receives, on the delivering thread.
+        """
+        self._watchers.append(callback)
+
+    def publish(self, event_type: str, owner_id: int, **data):
+        """
+            Call after the change is committed. Safe from any thread.
+        """
+        try:
+            self.backend.publish({"type": event_type, "owner_id": owner_id, **data})
+        except Exception:
+            # A lost notification must never fail the write that triggered it
+            logger.warning("Failed to publish %s event", event_type, exc_info=True)
+
+    def _deliver(self, event: dict):
+        """
+            An event without `owner_id` is a `resync` from the backend, for every subscriber of this worker.
+        """
+        for callback in self._watchers:
+            callback(event)
+
+        with self._lock:
+            if "owner_id" in event:
+                subscribers = list(self._subscribers.get(event["owner_id"], ()))
+            else:
+                subscribers = [subscription for owned in self._subscribers.values() for subscription in owned]
+
+        for subscription in subscribers:
+            try:
+                subscription.loop.call_soon_threadsafe(
+                    subscription.push, event if "owner_id" in event else {**event, "owner_id": subscription.owner_id})
+            except RuntimeError:
+                # The subscriber's loop is closed
+                self.unsubscribe(subscription)
+
+
+todo_events = EventBus()
+
+
+def format_sse(event: dict) -> str:
+    return f"event: {event['type']}\ndata: {json.dumps(event)}\n\n"
+
+
+def configure_event_backend(name: str = TODO_EVENTS_BACKEND):
+    if name == "socket":
+        todo_events.set_backend(UnixSocketBackend())
+    elif name == "postgres":
+        from .database import SQLALCHEMY_DATABASE_URL
+
+        todo_events.set_backend(PostgresNotifyBackend(SQLALCHEMY_DATABASE_URL))
@@ -0,0 +1,241 @@
+import logging
+import queue
+import threading
+import time
+from collections import Counter
+from concurrent.futures import Future
+
+from sqlalchemy.orm import sessionmaker
+
+from .database import shard_router, sticky_writes
+from .events import todo_events
+from .models import Todos
+from .todo_stats import bump_todo_stats_many
+from .todo_changes import next_change_seq, next_change_seqs
+
+
+logger = logging.getLogger(__name__)
+
+# Opt-in: when True, `main.py` starts the writer and `create_todo` goes through it
+TODO_GROUP_COMMIT = False
+# A batch is flushed when it has this many rows...
+GROUP_COMMIT_MAX_ROWS = 500
+# ...or when its first row has waited this long, whichever comes first
+GROUP_COMMIT_MAX_DELAY_SECONDS = 0.005
+# How long `create_todo` waits for its batch before answering 503. The todo may still be created after that.
+GROUP_COMMIT_RESULT_TIMEOUT_SECONDS = 10
+
+_STOP = object()
+
+
+class GroupCommitUnavailable(Exception):
+    """
+        The writer is stopped or its thread died: the row was not submitted.
+    """
+
+
+class GroupCommitWriter:
+    """
+        Background writer that coalesces todo inserts from many requests into one transaction.
+
+        `submit()` returns a Future resolved with the new todo id once its batch is committed.
+        If a batch fails, its rows are retried one by one in savepoints, so a bad row only fails its own request.
+        Any other error fails the futures of the batch, never the thread. Once the writer is stopped,
+        `submit()` fails its future with `GroupCommitUnavailable` instead of queueing it.
+        Without a `session_factory`, each batch is split by owner shard and committed on each shard.
+        Rows run on this thread, outside their request, so owners are made sticky to the primary here
+        (see `StickyWindow`) before their futures resolve.
+    """
+
+    def __init__(self, session_factory: sessionmaker | None = None,
+                 max_rows: int = GROUP_COMMIT_MAX_ROWS,
+                 max_delay: float = GROUP_COMMIT_MAX_DELAY_SECONDS):
+        self.session_factory = session_factory
+        self.max_rows = max_rows
+        self.max_delay = max_delay
+        self._queue: queue.Queue = queue.Queue()
+        self._thread: threading.Thread | None = None
+        # Held while queueing, so nothing is queued behind `_STOP`
+        self._submit_lock = threading.Lock()
+
+    def start(self):
+        with self._submit_lock:
+            self._thread = threading.Thread(target=self._run, name="todo-group-commit", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        """
+            Flushes everything submitted so far, then stops the thread.
+        """
+        with self._submit_lock:
+            thread, self._thread = self._thread, None
+
+            if thread is None:
+                return
+
+            self._queue.put(_STOP)
+
+        thread.join()
+
+    def submit(self, values: dict) -> Future:
+        future = Future()
+
+        with self._submit_lock:
+            if self._thread is None or not self._thread.is_alive():
+                future.set_exception(GroupCommitUnavailable("The group commit writer is not running"))
+                return future
+
+            self._queue.put((values, future))
+
+        return future
+
+    def _run(self):
+        stopping = False
+
+        while not stopping:
+            first = self._queue.get()
+            if first is _STOP:
+                break
+
+            batch = [first]
+            deadline = time.monotonic() + self.max_delay
+
+            while len(batch) < self.max_rows:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+
+                try:
+                    item = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+
+                if item is _STOP:
+                    stopping = True
+                    break
+
+                batch.append(item)
+
+            try:
+                for shard_batch in self._split_by_shard(batch):
+                    self._flush(shard_batch)
+            except Exception as error:
+                # e.g. the rollback itself failed on a dropped connection. Fails what is still pending.
+                logger.error("Group commit of %d todos failed", len(batch), exc_info=True)
+                self._fail(batch, error)
+
+        # Only reachable by a submit that raced a dead thread; nothing is left waiting forever
+        while True:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                return
+
+            if item is not _STOP:
+                self._fail([item], GroupCommitUnavailable("The group commit writer stopped"))
+
+    @staticmethod
+    def _fail(batch: list[tuple[dict, Future]], error: Exception):
+        for _, future in batch:
+            if not future.done():
+                future.set_exception(error)
+
+    def _split_by_shard(self, batch: list[tuple[dict, Future]]) -> list[list[tuple[dict, Future]]]:
+        if self.session_factory is not None:
+            return [batch]
+
+        shards = {}
+        for values, future in batch:
+            shards.setdefault(shard_router.shard_for(values.get("owner_id")), []).append((values, future))
+
+        return list(shards.values())
+
+    def _open_session(self, batch: list[tuple[dict, Future]]):
+        if self.session_factory is not None:
+            return self.session_factory()
+
+        return shard_router.session_for(batch[0][0].get("owner_id"))
+
+    def _flush(self, batch: list[tuple[dict, Future]]):
+        with self._open_session(batch) as db:
+            try:
+                self._bump_stats(db, [values for values, _ in batch])
+                # The whole batch commits at once, so the rows of one owner share a change sequence number
+                updated_seqs = next_change_seqs(db, [values.get("owner_id") for values, _ in batch])
+
+                todos = [Todos(**values, updated_seq=updated_seqs[values.get("owner_id")]) for values, _ in batch]
+                db.add_all(todos)
+                db.flush()
+                ids = [todo.id for todo in todos]
+
+                db.commit()
+            except Exception:
+                logger.warning("Group commit of %d todos failed, retrying one by one", len(batch), exc_info=True)
+                db.rollback()
+                self._flush_one_by_one(db, batch)
+                return
+
+        self._stick_to_primary([values for values, _ in batch])
+
+        for (values, future), todo_id in zip(batch, ids):
+            future.set_result(todo_id)
+            todo_events.publish("created", values.get("owner_id"), todo_id=todo_id, version=1)
+
+    def _flush_one_by_one(self, db, batch: list[tuple[dict, Future]]):
+        committed = []
+
+        for values, future in batch:
+            try:
+                with db.begin_nested():
+                    self._bump_stats(db, [values])
+                    todo = Todos(**values, updated_seq=next_change_seq(db, values.get("owner_id")))
+                    db.add(todo)
+                    db.flush()
+                committed.append((values, future, todo.id))
+            except Exception as error:
+                future.set_exception(error)
+
+        try:
+            db.commit()
+        except Exception as error:
+            db.rollback()
+            for _, future, _ in committed:
+                future.set_exception(error)
+            return
+
+        self._stick_to_primary([values for values, _, _ in committed])
+
+        for values, future, todo_id in committed:
+            future.set_result(todo_id)
+            todo_events.publish("created", values.get("owner_id"), todo_id=todo_id, version=1)
+
+    @staticmethod
+    def _stick_to_primary(rows: list[dict]):
+        # What `RoutingSession` does after a commit in a request, where `current_user_id` is set
+        for owner_id in {values.get("owner_id") for values in rows}:
+            sticky_writes.touch(owner_id)
+
+    @staticmethod
+    def _bump_stats(db, rows: list[dict]):
+        bump_todo_stats_many(db, Counter((values.get("complete"), values.get("priority")) for values in rows))
+
+
+todo_writer: GroupCommitWriter | None = None
+
+
+def enable_group_commit(session_factory: sessionmaker | None = None, **kwargs) -> GroupCommitWriter:
+    global todo_writer
+
+    disable_group_commit()
+    todo_writer = GroupCommitWriter(session_factory, **kwargs)
+    todo_writer.start()
+
+    return todo_writer
+
+
+def disable_group_commit():
+    global todo_writer
+
+    if todo_writer is not None:
+        todo_writer.stop()
+        todo_writer = None
@@ -0,0 +1,348 @@
+"""
+    Production entry point: one preloaded master process forking uvicorn workers.
+
+    Run from the directory that contains this package:
+        python -m package.launcher [--host 0.0.0.0] [--port 8000] [--workers N]
+
+    Signals to the master:
+        SIGHUP           rolling restart, one worker at a time, each replaced only once its successor is serving
+        SIGUSR1          log the memory of every worker
+        SIGTERM, SIGINT  graceful shutdown: workers finish their in-flight requests
+"""
+import argparse
+import gc
+import logging
+import math
+import os
+import select
+import signal
+import socket
+import time
+
+import uvicorn
+
+from .log_config import configure_logging, stop_logging
+
+
+logger = logging.getLogger(__name__)
+
+# Seconds between periodic memory reports
+RSS_REPORT_INTERVAL_SECONDS = 60
+# How long a new worker may take to start serving, and an old one to drain, during a rolling restart
+WORKER_START_TIMEOUT_SECONDS = 30
+WORKER_STOP_TIMEOUT_SECONDS = 30
+# A worker dying sooner than this after its start is replaced only after this delay, not in a tight loop
+WORKER_RESPAWN_DELAY_SECONDS = 1
+
+
+def cgroup_cpu_limit() -> float | None:
+    """
+        CPUs granted by the container's CFS quota (cgroup v2 `cpu.max`, then v1), or None when unlimited.
+    """
+    try:
+        with open("/sys/fs/cgroup/cpu.max") as file:
+            quota, period = file.read().split()
+        return None if quota == "max" else int(quota) / int(period)
+    except (OSError, ValueError):
+        pass
+
+    try:
+        with open("/sys/fs/cgroup/cpu/cpu.cfs_quota_us") as file:
+            quota = int(file.read())
+        with open("/sys/fs/cgroup/cpu/cpu.cfs_period_us") as file:
+            period = int(file.read())
+        return None if quota <= 0 else quota / period
+    except (OSError, ValueError):
+        return None
+
+
+def default_workers() -> int:
+    """
+        One worker per usable CPU: the CPUs this process may run on, capped by the cgroup quota.
+    """
+    if hasattr(os, "sched_getaffinity"):
+        cpus = len(os.sched_getaffinity(0))
+    else:
+        cpus = os.cpu_count() or 1
+
+    limit = cgroup_cpu_limit()
+    if limit is not None:
+        cpus = min(cpus, math.ceil(limit))
+
+    return max(1, cpus)
+
+
+def worker_memory(pid: int) -> dict:
+    """
+        RSS and PSS in KiB. PSS splits pages shared with the master and the other workers, so the sum over
+        workers is the real footprint; RSS counts every shared page again in each worker.
+    """
+    memory = {}
+    sources = (
+        (f"/proc/{pid}/status", ("VmRSS",)),
+        (f"/proc/{pid}/smaps_rollup", ("Pss", "Shared_Clean")),
+    )
+
+    for path, fields in sources:
+        try:
+            with open(path) as file:
+                for line in file:
+                    name, _, value = line.partition(":")
+                    if name in fields:
+                        memory[name] = int(value.split()[0])
+        except OSError:
+            pass
+
+    return memory
+
+
+def preload_app():
+    """
+        Imports the app and builds everything shareable before forking, then stops the background
+        threads `main.py` started: threads do not survive `fork()`, each worker starts its own.
+    """
+    from .main import app
+    from .events import LocalBackend, todo_events
+    from .group_commit import disable_group_commit
+
+    # Built once here instead of on the first `/docs` hit of every worker
+    app.openapi()
+
+    todo_events.set_backend(LocalBackend())
+    disable_group_commit()
+
+    # Objects alive now are never collected; keeping the GC away from them keeps their pages shared
+    gc.collect()
+    gc.freeze()
+
+    return app
+
+
+def run_worker(app, sock: socket.socket, ready_fd: int, log_level: str):
+    from .database import dispose_engines_after_fork
+    from .events import configure_event_backend
+    from .group_commit import TODO_GROUP_COMMIT, enable_group_commit
+
+    # The master's handlers and its pooled DB connections must not leak into the worker
+    for signum in (signal.SIGHUP, signal.SIGUSR1, signal.SIGCHLD):
+        signal.signal(signum, signal.SIG_DFL)
+
+    dispose_engines_after_fork()
+    configure_event_backend()
+
+    if TODO_GROUP_COMMIT:
+        enable_group_commit()
+
+    # `log_config=None`: uvicorn's loggers propagate to the JSON queue handler of `log_config.py`
+    server = _WorkerServer(uvicorn.Config(app, log_level=log_level, log_config=None), ready_fd)
+    server.run(sockets=[sock])
+
+
+class _WorkerServer(uvicorn.Server):
+    """
+        Tells the master it is serving by writing to `ready_fd` once startup (lifespan included) is done.
+    """
+
+    def __init__(self, config: uvicorn.Config, ready_fd: int):
+        super().__init__(config)
+        self.ready_fd = ready_fd
+
+    async def startup(self, sockets=None):
+        await super().startup(sockets)
+
+        try:
+            os.write(self.ready_fd, b"1")
+        except BrokenPipeError:
+            # Only rolling restarts wait for the signal
+            pass
+        finally:
+            os.close(self.ready_fd)
+
+
+class Master:
+    def __init__(self, app, sock: socket.socket, workers: int, log_level: str):
+        self.app = app
+        self.sock = sock
+        self.workers = workers
+        self.log_level = log_level
+        # pid -> monotonic start time
+        self.pids: dict[int, float] = {}
+        self.stopping = False
+        self._signals: list[int] = []
+        self._wakeup_read, self._wakeup_write = os.pipe()
+        os.set_blocking(self._wakeup_write, False)
+
+    def spawn(self) -> tuple[int, int]:
+        """
+            Forks a worker. Returns its pid and the fd that becomes readable once it is serving.
+        """
+        ready_read, ready_write = os.pipe()
+        pid = os.fork()
+
+        if pid == 0:
+            os.close(ready_read)
+            try:
+                run_worker(self.app, self.sock, ready_write, self.log_level)
+            finally:
+                os._exit(0)
+
+        os.close(ready_write)
+        self.pids[pid] = time.monotonic()
+
+        return pid, ready_read
+
+    def run(self):
+        for signum in (signal.SIGHUP, signal.SIGUSR1, signal.SIGTERM, signal.SIGINT, signal.SIGCHLD):
+            signal.signal(signum, self._on_signal)
+
+        for _ in range(self.workers):
+            _, ready_fd = self.spawn()
+            os.close(ready_fd)
+
+        logger.info("Master %d serving with %d workers", os.getpid(), self.workers)
+        next_report = time.monotonic() + RSS_REPORT_INTERVAL_SECONDS
+
+        while self.pids or not self.stopping:
+            timeout = max(0.0, next_report - time.monotonic())
+            select.select([self._wakeup_read], [], [], timeout)
+            self._drain_wakeups()
+
+            while self._signals:
+                self._handle(self._signals.pop(0))
+
+            self._reap()
+
+            if time.monotonic() >= next_report:
+                self.report_memory()
+                next_report = time.monotonic() + RSS_REPORT_INTERVAL_SECONDS
+
+    def _on_signal(self, signum, frame):
+        self._signals.append(signum)
+        try:
+            os.write(self._wakeup_write, b"\0")
+        except BlockingIOError:
+            pass
+
+    def _drain_wakeups(self):
+        while True:
+            readable, _, _ = select.select([self._wakeup_read], [], [], 0)
+            if not readable:
+                return
+            os.read(self._wakeup_read, 1024)
+
+    def _handle(self, signum: int):
+        if signum in (signal.SIGTERM, signal.SIGINT):
+            self.stopping = True
+            for pid in self.pids:
+                self._kill(pid, signal.SIGTERM)
+        elif signum == signal.SIGHUP and not self.stopping:
+            self.rolling_restart()
+        elif signum == signal.SIGUSR1:
+            self.report_memory()
+
+    def _reap(self):
+        while self.pids:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                self.pids.clear()
+                return
+
+            if pid == 0:
+                return
+
+            started_at = self.pids.pop(pid, None)
+            if started_at is None:
+                continue
+
+            if not self.stopping:
+                logger.warning("Worker %d exited with status %d, replacing it", pid, os.waitstatus_to_exitcode(status))
+                if time.monotonic() - started_at < WORKER_RESPAWN_DELAY_SECONDS:
+                    time.sleep(WORKER_RESPAWN_DELAY_SECONDS)
+                _, ready_fd = self.spawn()
+                os.close(ready_fd)
+
+    def rolling_restart(self):
+        """
+            Replaces the workers one by one. The listening socket is shared, so there is always
+            at least `workers` processes accepting connections.
+        """
+        logger.info("Rolling restart of %d workers", len(self.pids))
+
+        for old_pid in list(self.pids):
+            new_pid, ready_fd = self.spawn()
+            readable, _, _ = select.select([ready_fd], [], [], WORKER_START_TIMEOUT_SECONDS)
+            started = bool(readable) and os.read(ready_fd, 1) == b"1"
+            os.close(ready_fd)
+
+            if not started:
+                logger.error("Worker %d did not start, keeping worker %d", new_pid, old_pid)
+                continue
+
+            # uvicorn stops accepting, then finishes its in-flight requests before exiting
+            self._kill(old_pid, signal.SIGTERM)
+            self._wait(old_pid, WORKER_STOP_TIMEOUT_SECONDS)
+
+        logger.info("Rolling restart done")
+
+    def _wait(self, pid: int, timeout: float):
+        deadline = time.monotonic() + timeout
+
+        while time.monotonic() < deadline:
+            waited, _ = os.waitpid(pid, os.WNOHANG)
+            if waited == pid:
+                self.pids.pop(pid, None)
+                return
+            time.sleep(0.05)
+
+        logger.warning("Worker %d did not drain in %ss, killing it", pid, timeout)
+        self._kill(pid, signal.SIGKILL)
+        os.waitpid(pid, 0)
+        self.pids.pop(pid, None)
+
+    @staticmethod
+    def _kill(pid: int, signum: int):
+        try:
+            os.kill(pid, signum)
+        except ProcessLookupError:
+            pass
+
+    def report_memory(self):
+        total_pss = 0
+
+        for pid in sorted(self.pids):
+            memory = worker_memory(pid)
+            total_pss += memory.get("Pss", 0)
+            logger.info("Worker %d: rss=%s KiB pss=%s KiB shared_clean=%s KiB",
+                        pid, memory.get("VmRSS"), memory.get("Pss"), memory.get("Shared_Clean"))
+
+        master = worker_memory(os.getpid())
+        logger.info("Master %d: rss=%s KiB pss=%s KiB; workers pss total=%d KiB",
+                    os.getpid(), master.get("VmRSS"), master.get("Pss"), total_pss)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--workers", type=int, default=None, help="defaults to the usable CPU count")
+    parser.add_argument("--log-level", default="info")
+    args = parser.parse_args()
+
+    configure_logging(args.log_level)
+
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((args.host, args.port))
+    sock.listen(2048)
+    sock.set_inheritable(True)
+
+    app = preload_app()
+    try:
+        Master(app, sock, args.workers or default_workers(), args.log_level).run()
+    finally:
+        stop_logging()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,226 @@
+"""
+    Structured JSON logging that never blocks a request.
+
+    Request threads only put records on a bounded queue; a background thread formats them and writes to stdout.
+    When the queue is full (stdout is slow or a pipe is stuck) records are dropped and counted instead of
+    stalling the request. Every record carries the `request_id` of the request that logged it.
+"""
+import contextvars
+import copy
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import sys
+import threading
+import time
+import uuid
+
+
+# Records waiting for the writer thread. Beyond this they are dropped, not waited for.
+LOG_QUEUE_SIZE = 10_000
+LOG_LEVEL = "INFO"
+# logger name (or prefix) -> fraction of its records below WARNING that are kept, e.g. {"package.routers": 0.1}
+LOG_SAMPLE_RATES: dict[str, float] = {}
+
+# Set per request by `RequestIdMiddleware`
+request_id = contextvars.ContextVar("request_id", default=None)
+
+# Attributes every `LogRecord` has; anything else was passed with `extra=` and goes into the JSON too
+_RECORD_ATTRIBUTES = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "asctime", "request_id"}
+
+
+class LogCounters:
+    def __init__(self):
+        self.queued = 0
+        self.dropped = 0
+        self.sampled_out = 0
+        self._lock = threading.Lock()
+
+    def add(self, name: str):
+        with self._lock:
+            setattr(self, name, getattr(self, name) + 1)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {"queued": self.queued, "dropped": self.dropped, "sampled_out": self.sampled_out}
+
+
+log_counters = LogCounters()
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(record.created)) + f".{int(record.msecs):03d}Z",
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+            "request_id": getattr(record, "request_id", None),
+            "pid": record.process,
+        }
+
+        for name, value in vars(record).items():
+            if name not in _RECORD_ATTRIBUTES:
+                entry[name] = value
+
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry["exc"] = record.exc_text
+
+        return json.dumps(entry, default=str)
+
+
+class SamplingFilter(logging.Filter):
+    """
+        Keeps a fraction of the records below WARNING of the loggers in `rates`. The longest matching
+        name prefix wins; loggers not listed keep everything.
+    """
+
+    def __init__(self, rates: dict[str, float]):
+        super().__init__()
+        self.rates = rates
+        self._rate_of: dict[str, float] = {}
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.WARNING or not self.rates:
+            return True
+
+        rate = self._rate_of.get(record.name)
+        if rate is None:
+            rate = self._rate_of[record.name] = self._lookup(record.name)
+
+        if rate >= 1 or random.random() < rate:
+            return True
+
+        log_counters.add("sampled_out")
+        return False
+
+    def _lookup(self, name: str) -> float:
+        while name:
+            if name in self.rates:
+                return self.rates[name]
+            name = name.rpartition(".")[0]
+
+        return 1.0
+
+
+class NonBlockingQueueHandler(logging.handlers.QueueHandler):
+    """
+        Puts records on a bounded queue without waiting; a full queue drops the record and counts it.
+        The message is rendered here, in the logging thread, so arguments cannot change before it is written.
+    """
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record = copy.copy(record)
+        record.request_id = request_id.get()
+        record.msg = record.getMessage()
+        record.args = None
+
+        if record.exc_info:
+            # Tracebacks are not picklable and hold frames alive; keep their text only
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            log_counters.add("dropped")
+            return
+
+        log_counters.add("queued")
+
+
+_installed: tuple[int, logging.Handler, logging.handlers.QueueListener] | None = None
+
+
+def configure_logging(level: str | None = None, stream=None, queue_size: int = LOG_QUEUE_SIZE,
+                      sample_rates: dict[str, float] | None = None):
+    """
+        Routes the root logger through the queue to one JSON writer thread. Safe to call again, also in a
+        forked worker: the handler inherited from the parent is replaced, its dead writer thread is left alone.
+        Without `level`, a reconfiguration keeps the current level.
+    """
+    global _installed
+
+    root = logging.getLogger()
+
+    if level is None:
+        level = LOG_LEVEL if _installed is None else root.level
+
+    if _installed is not None:
+        pid, handler, listener = _installed
+        root.removeHandler(handler)
+        if pid == os.getpid():
+            listener.stop()
+
+    log_queue = queue.Queue(maxsize=queue_size)
+    handler = NonBlockingQueueHandler(log_queue)
+    handler.addFilter(SamplingFilter(LOG_SAMPLE_RATES if sample_rates is None else sample_rates))
+
+    writer = logging.StreamHandler(stream or sys.stdout)
+    writer.setFormatter(JsonFormatter())
+    listener = logging.handlers.QueueListener(log_queue, writer)
+    listener.start()
+
+    root.addHandler(handler)
+    root.setLevel(level.upper() if isinstance(level, str) else level)
+    _installed = (os.getpid(), handler, listener)
+
+
+def stop_logging():
+    """
+        Writes out what is still queued and stops the writer thread.
+    """
+    global _installed
+
+    if _installed is None:
+        return
+
+    pid, handler, listener = _installed
+    logging.getLogger().removeHandler(handler)
+    if pid == os.getpid():
+        listener.stop()
+    _installed = None
+
+
+class RequestIdMiddleware:
+    """
+        ASGI middleware giving each request an id for its log records: the client's `X-Request-ID` if sent,
+        a new one otherwise. The id is echoed in the response's `X-Request-ID` header.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        incoming = None
+        for name, value in scope["headers"]:
+            if name == b"x-request-id":
+                incoming = value.decode("latin-1")[:64]
+
+        current = incoming or uuid.uuid4().hex
+        token = request_id.set(current)
+
+        async def send_with_request_id(message):
+            if message["type"] == "http.response.start":
+                message = {**message, "headers": [*message.get("headers", []), (b"x-request-id", current.encode())]}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_request_id)
+        finally:
+            request_id.reset(token)
@@ -1,3 +1,6 @@
+from contextlib import asynccontextmanager
+
+from anyio import to_thread
 from fastapi import FastAPI
 # From absolute path
 # import models
@@ -6,16 +9,61 @@ from fastapi import FastAPI
 
 # From relative path
 from .models import Base
-from .database import engine
-from .routers import auth, todos, admin, user
+from .database import engine, shard_router, ReadReplicaMiddleware
+from .compression import CompressionMiddleware
+from .log_config import RequestIdMiddleware, configure_logging, stop_logging
+from .tracing import TracingMiddleware
+from .recording import RecordingMiddleware
+from .routers import auth, todos, admin, user, batch, diagnostics
+from .group_commit import TODO_GROUP_COMMIT, enable_group_commit
+from .events import configure_event_backend
+from .archive import todo_archiver
+from .todo_changes import tombstone_compactor
+from .single_flight import read_flights
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # JSON logs through a queue: request threads never wait on stdout
+    configure_logging()
+    # Waiters of one coalesced read may only hold part of the threadpool sync endpoints run on
+    read_flights.size_to_threadpool(to_thread.current_default_thread_limiter().total_tokens)
+    # Periodically drops old delete tombstones of `/todo/changes`
+    tombstone_compactor.start()
+    # Moves long-completed todos to `todos_archive`
+    todo_archiver.start()
+    yield
+    todo_archiver.stop()
+    tombstone_compactor.stop()
+    stop_logging()
 
-app = FastAPI()
+
+app = FastAPI(lifespan=lifespan)
+# GET/HEAD requests may read from a replica (see `SQLALCHEMY_REPLICA_URLS`)
+app.add_middleware(ReadReplicaMiddleware)
+# gzip (or zstd/brotli when installed) for JSON, NDJSON and CSV bodies above `COMPRESSION_MINIMUM_SIZE`
+app.add_middleware(CompressionMiddleware)
+# Anonymized sample of the traffic for `benchmarks/replay.py`, see `RECORD_SAMPLE_RATE`
+app.add_middleware(RecordingMiddleware)
+# Span tree of a sampled request, see `TRACE_SAMPLE_RATE`
+app.add_middleware(TracingMiddleware)
+# Outermost: every log line of a request, compression included, carries its `X-Request-ID`
+app.add_middleware(RequestIdMiddleware)
 
 # For absolute path
 # models.Base.metadata.create_all(bind=engine)
 
 # For relative path
 Base.metadata.create_all(bind=engine)
+# Todos may live on other databases (see `SQLALCHEMY_SHARD_URLS`)
+shard_router.create_all(Base.metadata)
+
+# Fan-out of todo change events across workers (see `TODO_EVENTS_BACKEND`)
+configure_event_backend()
+
+# Opt-in: coalesce todo inserts of concurrent requests into shared transactions
+if TODO_GROUP_COMMIT:
+    enable_group_commit()
 
 # Just to check everything is OK for testing
 # Typically it should be checked
@@ -28,3 +76,5 @@ app.include_router(auth.router)
 app.include_router(todos.router)
 app.include_router(admin.router)
 app.include_router(user.router)
+app.include_router(batch.router)
+app.include_router(diagnostics.router)
@@ -0,0 +1,196 @@
+"""
+    Memory diagnostics of this worker process, for `routers/diagnostics.py`.
+
+    Allocation tracing (`tracemalloc`) is off unless started, so it costs nothing until someone asks;
+    while on, every allocation pays for recording its traceback. Snapshots are kept in memory, at most
+    `DIAGNOSTICS_MAX_SNAPSHOTS`, and dropped when tracing stops.
+
+    Every worker is its own process with its own tracer and snapshots: a request reaches one of them,
+    which is why every report carries the `pid`.
+"""
+import gc
+import itertools
+import os
+import resource
+import sys
+import threading
+import tracemalloc
+from collections import OrderedDict
+
+from sqlalchemy.orm import Session
+
+from .database import engine, replica_set, shard_router
+
+
+# Oldest snapshots are dropped beyond this: each one holds every live traced allocation
+DIAGNOSTICS_MAX_SNAPSHOTS = 4
+# Frames recorded per allocation when tracing starts; more tells more, and costs more
+DIAGNOSTICS_TRACE_FRAMES = 10
+
+# The tracer's own allocations say nothing about the app
+_IGNORED = (
+    tracemalloc.Filter(False, tracemalloc.__file__),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+    tracemalloc.Filter(False, "<unknown>"),
+)
+
+
+def rss_bytes() -> int | None:
+    try:
+        with open("/proc/self/statm") as file:
+            return int(file.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        return None
+
+
+def peak_rss_bytes() -> int:
+    # Kilobytes on Linux, bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def _stat(stat, group_by: str) -> dict:
+    frame = stat.traceback[0]
+    entry = {
+        "file": frame.filename,
+        "line": frame.lineno if group_by != "filename" else None,
+        "size": stat.size,
+        "count": stat.count,
+    }
+
+    if hasattr(stat, "size_diff"):
+        entry["size_diff"] = stat.size_diff
+        entry["count_diff"] = stat.count_diff
+
+    if group_by == "traceback":
+        entry["traceback"] = [f"{frame.filename}:{frame.lineno}" for frame in stat.traceback]
+
+    return entry
+
+
+class AllocationTracer:
+    def __init__(self, max_snapshots: int = DIAGNOSTICS_MAX_SNAPSHOTS):
+        self.max_snapshots = max_snapshots
+        self._snapshots: OrderedDict[int, tracemalloc.Snapshot] = OrderedDict()
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def status(self) -> dict:
+        tracing = tracemalloc.is_tracing()
+        current, peak = tracemalloc.get_traced_memory() if tracing else (0, 0)
+
+        return {
+            "pid": os.getpid(),
+            "tracing": tracing,
+            "frames": tracemalloc.get_traceback_limit() if tracing else None,
+            "traced_bytes": current,
+            "traced_peak_bytes": peak,
+            "tracer_overhead_bytes": tracemalloc.get_tracemalloc_memory() if tracing else 0,
+            "rss_bytes": rss_bytes(),
+            "peak_rss_bytes": peak_rss_bytes(),
+            "snapshots": list(self._snapshots),
+        }
+
+    def start(self, frames: int = DIAGNOSTICS_TRACE_FRAMES):
+        """
+            Only allocations made from now on are traced: memory held since before is invisible.
+        """
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(frames)
+
+    def stop(self):
+        with self._lock:
+            self._snapshots.clear()
+        tracemalloc.stop()
+
+    def take_snapshot(self) -> int | None:
+        """
+            Returns the new snapshot id, or None when tracing is off.
+        """
+        if not tracemalloc.is_tracing():
+            return None
+
+        snapshot = tracemalloc.take_snapshot().filter_traces(_IGNORED)
+
+        with self._lock:
+            snapshot_id = next(self._ids)
+            self._snapshots[snapshot_id] = snapshot
+
+            while len(self._snapshots) > self.max_snapshots:
+                self._snapshots.popitem(last=False)
+
+        return snapshot_id
+
+    def top(self, snapshot_id: int, group_by: str = "lineno", limit: int = 25) -> list[dict] | None:
+        snapshot = self._snapshots.get(snapshot_id)
+
+        if snapshot is None:
+            return None
+
+        return [_stat(stat, group_by) for stat in snapshot.statistics(group_by)[:limit]]
+
+    def diff(self, first_id: int, second_id: int, group_by: str = "lineno", limit: int = 25) -> list[dict] | None:
+        """
+            What grew (or shrank) from the first snapshot to the second, largest change first.
+        """
+        first, second = self._snapshots.get(first_id), self._snapshots.get(second_id)
+
+        if first is None or second is None:
+            return None
+
+        return [_stat(stat, group_by) for stat in second.compare_to(first, group_by)[:limit]]
+
+
+allocation_tracer = AllocationTracer()
+
+
+def session_report(limit: int = 25) -> dict:
+    """
+        Every SQLAlchemy session still alive in this process and the size of its identity map.
+        Objects loaded by a session stay referenced by it until it is closed or expunged, so a session
+        that outlives its request keeps its whole result set alive.
+    """
+    sessions = [item for item in gc.get_objects() if isinstance(item, Session)]
+    sizes = sorted(
+        (
+            {
+                "identity_map": len(session.identity_map),
+                "new": len(session.new),
+                "in_transaction": session.in_transaction(),
+                "class": type(session).__name__,
+            }
+            for session in sessions
+        ),
+        key=lambda entry: entry["identity_map"],
+        reverse=True,
+    )
+
+    return {
+        "pid": os.getpid(),
+        "sessions": len(sizes),
+        "in_transaction": sum(entry["in_transaction"] for entry in sizes),
+        "identity_map_objects": sum(entry["identity_map"] for entry in sizes),
+        "largest": sizes[:limit],
+    }
+
+
+def pool_report() -> list[dict]:
+    engines = list(dict.fromkeys([engine, *replica_set.engines, *shard_router.engines]))
+    report = []
+
+    for item in engines:
+        pool = item.pool
+        entry = {
+            "url": item.url.render_as_string(hide_password=True),
+            "pool": type(pool).__name__,
+            "status": pool.status(),
+        }
+
+        # Only `QueuePool` counts connections
+        for name in ("size", "checkedin", "checkedout", "overflow"):
+            if hasattr(pool, name):
+                entry[name] = getattr(pool, name)()
+
+        report.append(entry)
+
+    return report
@@ -1,5 +1,6 @@
 from .database import Base
-from sqlalchemy import Column, Integer, String, Boolean, ForeignKey
+from sqlalchemy import Column, Integer, BigInteger, String, Boolean, ForeignKey, DateTime, Index, func
+from sqlalchemy.orm import deferred
 
 
 class Users(Base):
@@ -27,4 +28,101 @@ class Todos(Base):
     priority = Column(Integer)
     complete = Column(Boolean, default=False)
     owner_id = Column(Integer, ForeignKey("users.id"))
+    # Optimistic concurrency: sent as the ETag, checked against If-Match on PUT and PATCH
+    version = Column(Integer, nullable=False, default=1, server_default="1")
 
+    # Position in the owner's change sequence of the last write, for `/todo/changes`.
+    # Deferred: it is sync bookkeeping and stays out of the regular todo responses.
+    updated_seq = deferred(Column(BigInteger, nullable=False, default=0, server_default="0"))
+    # Set by SQLAlchemy on every INSERT and UPDATE, ORM or Core. Completed todos untouched for
+    # `ARCHIVE_AFTER` are moved to `todos_archive` (see `archive.py`).
+    updated_at = deferred(Column(DateTime(timezone=True), nullable=False,
+                                 default=func.now(), onupdate=func.now(), server_default=func.now()))
+
+    # ORM updates become `UPDATE ... WHERE version = ?` and bump it; a lost race raises StaleDataError
+    __mapper_args__ = {"version_id_col": version}
+
+    __table_args__ = (
+        # Covers the per-user `GROUP BY complete, priority` of `/todo/stats`
+        Index("ix_todos_owner_id_complete_priority", "owner_id", "complete", "priority"),
+        # Covers `WHERE owner_id = ? AND updated_seq > ? ORDER BY updated_seq` of `/todo/changes`
+        Index("ix_todos_owner_id_updated_seq", "owner_id", "updated_seq"),
+        # Covers the archiver's `WHERE complete AND updated_at < ?`
+        Index("ix_todos_complete_updated_at", "complete", "updated_at"),
+        # SQLite shards continue ids from `sqlite_sequence`, which only AUTOINCREMENT tables use
+        {"sqlite_autoincrement": True},
+    )
+
+
+class TodosArchive(Base):
+    """
+        Cold storage for completed todos, same columns as `todos`. Read only with `include_archived`.
+    """
+    __tablename__ = "todos_archive"
+
+    id = Column(Integer, primary_key=True, autoincrement=False)
+    title = Column(String(100))
+    description = Column(String(255))
+    priority = Column(Integer)
+    complete = Column(Boolean)
+    owner_id = Column(Integer, index=True)
+    version = Column(Integer, nullable=False)
+    updated_seq = Column(BigInteger, nullable=False)
+    updated_at = Column(DateTime(timezone=True), nullable=False)
+    archived_at = Column(DateTime(timezone=True), nullable=False)
+
+
+class TodoStats(Base):
+    """
+        System-wide todo counts per (complete, priority).
+        Kept up to date in the same transaction as every todo write, so `/admin/stats` never scans `todos`.
+    """
+    __tablename__ = "todo_stats"
+
+    complete = Column(Boolean, primary_key=True)
+    priority = Column(Integer, primary_key=True)
+    count = Column(Integer, nullable=False, default=0)
+
+
+class TodoTombstones(Base):
+    """
+        One row per deleted todo, so `/todo/changes` can tell clients what to remove.
+        Compacted once older than `TOMBSTONE_RETENTION` (see `todo_changes.py`).
+    """
+    __tablename__ = "todo_tombstones"
+
+    id = Column(Integer, primary_key=True)
+    todo_id = Column(Integer, nullable=False)
+    owner_id = Column(Integer, nullable=False)
+    deleted_seq = Column(BigInteger, nullable=False)
+    deleted_at = Column(DateTime(timezone=True), nullable=False)
+
+    __table_args__ = (
+        Index("ix_todo_tombstones_owner_id_deleted_seq", "owner_id", "deleted_seq"),
+    )
+
+
+class TodoChangeSequence(Base):
+    """
+        Per-owner counter behind `updated_seq` and `deleted_seq`, created by the owner's first write.
+        `compacted_seq` is the owner's newest tombstone already compacted away: older cursors must resync.
+
+        The row of owner 0 holds the shard-wide counter of before counters were per owner. An owner
+        without a row of their own reads as that row, and their counter starts above it.
+    """
+    __tablename__ = "todo_change_seq"
+
+    owner_id = Column(Integer, primary_key=True, autoincrement=False)
+    value = Column(BigInteger, nullable=False, default=0)
+    compacted_seq = Column(BigInteger, nullable=False, default=0)
+
+
+class RefreshTokens(Base):
+    __tablename__ = "refresh_tokens"
+
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"), index=True)
+    # SHA-256 of the token. The raw token is only ever known by the client.
+    token_hash = Column(String(64), unique=True, index=True)
+    expires_at = Column(DateTime(timezone=True))
+    revoked = Column(Boolean, default=False)
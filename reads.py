@@ -0,0 +1,157 @@
+"""
+    Lean read path for endpoints that only serialize what they load.
+
+    Statements are SQLAlchemy Core `lambda_stmt`s over the tables, not the ORM classes: the statement is built
+    and its SQL compiled once per shape, later calls only bind new parameters. Rows come back as `Row` tuples
+    straight from the cursor, with no ORM instances, identity map or change tracking.
+    Anything that writes must still load ORM objects through the session.
+"""
+from fastapi import HTTPException
+from sqlalchemy import CursorResult, Row, lambda_stmt, select
+from sqlalchemy.orm import Session
+
+from .models import Todos, TodosArchive, Users
+
+
+todos = Todos.__table__
+archive = TodosArchive.__table__
+users = Users.__table__
+
+# The columns a serialized `Todos` instance has always had (`updated_seq` is deferred, so it never was one)
+TODO_COLUMNS = (
+    todos.c.id,
+    todos.c.title,
+    todos.c.description,
+    todos.c.priority,
+    todos.c.complete,
+    todos.c.owner_id,
+    todos.c.version,
+)
+
+# Same names as `TODO_COLUMNS`, so archived rows serialize like live ones
+ARCHIVE_COLUMNS = tuple(archive.c[column.name] for column in TODO_COLUMNS)
+
+# Public columns only: `hashed_password` never leaves the DB
+USER_COLUMNS = (
+    users.c.id,
+    users.c.email,
+    users.c.username,
+    users.c.first_name,
+    users.c.last_name,
+    users.c.role,
+    users.c.is_active,
+    users.c.phone_number,
+)
+
+
+# Sparse fieldsets: `?fields=title,complete` selects and returns only those columns
+TODO_FIELDS = tuple(column.name for column in TODO_COLUMNS)
+USER_FIELDS = tuple(column.name for column in USER_COLUMNS)
+FIELDS_DESCRIPTION = "Comma-separated columns to return, e.g. `title,complete`. All of them by default."
+
+
+def parse_fields(fields: str | None, allowed: tuple[str, ...]) -> tuple[str, ...] | None:
+    """
+        `fields=title,complete` -> ("title", "complete"), in column order so equal selections share
+        one cached statement. None (no `fields=`) selects everything.
+    """
+    if fields is None:
+        return None
+
+    requested = {name.strip() for name in fields.split(",") if name.strip()}
+    unknown = requested - set(allowed)
+
+    if not requested or unknown:
+        raise HTTPException(status_code=422,
+                            detail=f"Unknown fields: {', '.join(sorted(unknown))}. Allowed: {', '.join(allowed)}")
+
+    return tuple(name for name in allowed if name in requested)
+
+
+def require_fields(fields: tuple[str, ...] | None, *names: str) -> tuple[str, ...] | None:
+    """
+        Adds the columns an endpoint needs itself (an id to page by, a version for the ETag) to a selection.
+    """
+    if fields is None:
+        return None
+
+    return tuple(name for name in TODO_FIELDS if name in fields or name in names)
+
+
+def pick_fields(row: Row, fields: tuple[str, ...] | None) -> dict:
+    values = row._asdict()
+
+    if fields is None:
+        return values
+
+    return {name: values[name] for name in fields}
+
+
+def _select(columns: tuple, fields: tuple[str, ...] | None) -> tuple:
+    return columns if fields is None else tuple(column for column in columns if column.name in fields)
+
+
+def _execute(db: Session, statement) -> list[Row]:
+    # `Session.connection()` keeps replica routing and the session's transaction, nothing else of the ORM
+    return db.connection().execute(statement).all()
+
+
+def read_todos_of_owner(db: Session, owner_id: int, include_archived: bool = False,
+                        fields: tuple[str, ...] | None = None) -> list[Row]:
+    """
+        With `fields`, only those columns are selected. The column tuple is part of the lambda's
+        cache key, so each selection is compiled once.
+    """
+    columns = _select(TODO_COLUMNS, fields)
+    rows = _execute(db, lambda_stmt(lambda: select(*columns).where(todos.c.owner_id == owner_id)))
+
+    if include_archived:
+        archived_columns = _select(ARCHIVE_COLUMNS, fields)
+        rows += _execute(db, lambda_stmt(
+            lambda: select(*archived_columns).where(archive.c.owner_id == owner_id)
+        ))
+
+    return rows
+
+
+def read_todo(db: Session, todo_id: int, owner_id: int, fields: tuple[str, ...] | None = None) -> Row | None:
+    columns = _select(TODO_COLUMNS, fields)
+    rows = _execute(db, lambda_stmt(
+        lambda: select(*columns).where(todos.c.id == todo_id, todos.c.owner_id == owner_id)
+    ))
+
+    return rows[0] if rows else None
+
+
+def iter_todo_page(db: Session, owner_id: int | None = None, complete: bool | None = None,
+                   priority: int | None = None, after_id: int | None = None, limit: int | None = None,
+                   archived: bool = False, fields: tuple[str, ...] | None = None) -> CursorResult:
+    """
+        Admin listing ordered by id, as an open cursor, from `todos` or with `archived` from `todos_archive`.
+        Each combination of filters and columns is its own cached statement.
+    """
+    table, columns = (archive, ARCHIVE_COLUMNS) if archived else (todos, TODO_COLUMNS)
+    columns = _select(columns, fields)
+    statement = lambda_stmt(lambda: select(*columns))
+
+    if owner_id is not None:
+        statement += lambda s: s.where(table.c.owner_id == owner_id)
+    if complete is not None:
+        statement += lambda s: s.where(table.c.complete == complete)
+    if priority is not None:
+        statement += lambda s: s.where(table.c.priority == priority)
+    if after_id is not None:
+        statement += lambda s: s.where(table.c.id > after_id)
+
+    statement += lambda s: s.order_by(table.c.id)
+
+    if limit is not None:
+        statement += lambda s: s.limit(limit)
+
+    return db.connection().execute(statement)
+
+
+def read_user(db: Session, user_id: int) -> Row | None:
+    rows = _execute(db, lambda_stmt(lambda: select(*USER_COLUMNS).where(users.c.id == user_id)))
+
+    return rows[0] if rows else None
@@ -0,0 +1,201 @@
+"""
+    Records a sample of real traffic to replay it later (see `benchmarks/replay.py`).
+
+    One JSON line per sampled request: arrival time, method, route template (`/todo/{todo_id}`, never the
+    concrete path), anonymized query parameters, the shape of the JSON body, status and server time.
+    Nothing identifying is kept:
+
+        - the caller is a pseudonym (keyed hash of their user id or login name) plus their role
+        - string values become "x" of the same length; numbers and booleans are kept
+        - query values are kept only for `RECORD_QUERY_PARAMS`, others are replaced the same way
+        - form bodies (the login) are dropped; replay logs in as a seeded user
+
+    Pseudonyms are only as private as their key: ids are sequential and usernames guessable, so with a
+    known key they are reversed by trying them all. Nothing is recorded until `TODOS_RECORD_PSEUDONYM_KEY`
+    holds a secret of the deployment's own.
+"""
+import hashlib
+import hmac
+import json
+import logging
+import os
+import queue
+import random
+import threading
+import time
+from urllib.parse import parse_qsl
+
+from jose import jwt, JWTError
+
+
+logger = logging.getLogger(__name__)
+
+# Fraction of requests recorded; 0 turns the recorder off
+RECORD_SAMPLE_RATE = 0.0
+RECORD_FILE = "traffic.ndjson"
+# Query parameters whose values say nothing about the caller and are kept as sent
+RECORD_QUERY_PARAMS = {"fields", "include_archived", "limit", "priority", "complete", "format", "since"}
+# Request bodies larger than this are recorded without their shape
+RECORD_MAX_BODY_BYTES = 64 * 1024
+# Recorded requests waiting for the writer thread; more are dropped
+RECORD_QUEUE_SIZE = 1000
+# Secret keying the caller pseudonyms, shared by every worker so a user gets the same pseudonym in each.
+# None: the recorder stays off.
+RECORD_PSEUDONYM_KEY = os.environ.get("TODOS_RECORD_PSEUDONYM_KEY", "").encode() or None
+
+
+def pseudonym(value) -> str:
+    return hmac.new(RECORD_PSEUDONYM_KEY, str(value).encode(), hashlib.blake2b).hexdigest()[:12]
+
+
+def anonymize(value):
+    """
+        Same structure and sizes, no content: strings become "x" of the same length.
+    """
+    if isinstance(value, str):
+        return "x" * len(value)
+    if isinstance(value, dict):
+        return {key: anonymize(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [anonymize(item) for item in value]
+    return value
+
+
+def caller(headers: dict, body: bytes) -> tuple[str | None, str | None]:
+    """
+        Pseudonym and role of the caller, from the bearer token or, for the login, the form's username.
+        The token is not verified: this only labels the record, the app still authenticates the request.
+    """
+    authorization = headers.get(b"authorization", b"").decode("latin-1")
+
+    if authorization.lower().startswith("bearer "):
+        try:
+            claims = jwt.get_unverified_claims(authorization[7:])
+        except JWTError:
+            return None, None
+        return pseudonym(claims.get("id")), claims.get("role")
+
+    if headers.get(b"content-type", b"").startswith(b"application/x-www-form-urlencoded"):
+        username = dict(parse_qsl(body.decode("latin-1"))).get("username")
+        if username:
+            return pseudonym(username), None
+
+    return None, None
+
+
+def body_shape(headers: dict, body: bytes):
+    if not body or len(body) > RECORD_MAX_BODY_BYTES:
+        return None
+
+    if not headers.get(b"content-type", b"").startswith(b"application/json"):
+        return None
+
+    try:
+        return anonymize(json.loads(body))
+    except ValueError:
+        return None
+
+
+class TrafficRecorder:
+    """
+        Appends recorded requests to `path` from a background thread, so a request never waits on the disk.
+    """
+
+    def __init__(self, path: str = RECORD_FILE, maxsize: int = RECORD_QUEUE_SIZE):
+        self.path = path
+        self.dropped = 0
+        self._queue: queue.Queue = queue.Queue(maxsize=maxsize)
+        self._thread: threading.Thread | None = None
+
+    def record(self, entry: dict):
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name="traffic-recorder", daemon=True)
+            self._thread.start()
+
+        try:
+            self._queue.put_nowait(entry)
+        except queue.Full:
+            self.dropped += 1
+
+    def flush(self):
+        self._queue.join()
+
+    def _run(self):
+        while True:
+            entry = self._queue.get()
+            try:
+                # One write per line: lines of several workers appending to the same file do not interleave
+                with open(self.path, "a") as file:
+                    file.write(json.dumps(entry, separators=(",", ":")) + "\n")
+            except Exception:
+                logger.warning("Failed to record a request", exc_info=True)
+            finally:
+                self._queue.task_done()
+
+
+traffic_recorder = TrafficRecorder()
+
+
+class RecordingMiddleware:
+    """
+        ASGI middleware recording a `sample_rate` fraction of the requests. Requests not sampled
+        pass straight through, and so do all of them without a `RECORD_PSEUDONYM_KEY`.
+    """
+
+    def __init__(self, app, sample_rate: float = RECORD_SAMPLE_RATE, recorder: TrafficRecorder | None = None):
+        self.app = app
+        self.sample_rate = sample_rate
+        self.recorder = recorder or traffic_recorder
+
+        if sample_rate > 0 and RECORD_PSEUDONYM_KEY is None:
+            logger.warning("Traffic recording is off: TODOS_RECORD_PSEUDONYM_KEY is not set")
+
+    async def __call__(self, scope, receive, send):
+        if (scope["type"] != "http" or self.sample_rate <= 0 or RECORD_PSEUDONYM_KEY is None
+                or random.random() >= self.sample_rate):
+            await self.app(scope, receive, send)
+            return
+
+        chunks = []
+        size = 0
+        status_code = None
+
+        async def recording_receive():
+            nonlocal size
+            message = await receive()
+
+            if message["type"] == "http.request" and size <= RECORD_MAX_BODY_BYTES:
+                chunks.append(message.get("body", b""))
+                size += len(chunks[-1])
+
+            return message
+
+        async def recording_send(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        arrived_at = time.time()
+        started = time.perf_counter()
+        try:
+            await self.app(scope, recording_receive, recording_send)
+        finally:
+            elapsed_ms = (time.perf_counter() - started) * 1000
+            headers = dict(scope["headers"])
+            body = b"".join(chunks)
+            route = scope.get("route")
+            user, role = caller(headers, body)
+
+            self.recorder.record({
+                "t": round(arrived_at, 3),
+                "method": scope["method"],
+                "route": getattr(route, "path", None) or scope["path"],
+                "query": {name: value if name in RECORD_QUERY_PARAMS else anonymize(value)
+                          for name, value in parse_qsl(scope["query_string"].decode("latin-1"))},
+                "body": body_shape(headers, body),
+                "user": user,
+                "role": role,
+                "status": status_code,
+                "ms": round(elapsed_ms, 2),
+            })
@@ -1,10 +1,28 @@
-from typing import Annotated
-from fastapi import APIRouter, Depends, HTTPException, Path
+import heapq
+import itertools
+import uuid
+from typing import Annotated, Literal
+from fastapi import APIRouter, Depends, Header, HTTPException, Path, Query, Request, Response
+from fastapi.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
 from starlette import status
-from ..models import Todos
-from ..database import SessionLocal
+from ..compression import etag_response
+from ..models import Todos, TodoStats
+from ..database import SessionLocal, shard_router, scatter
 from ..dtos.todo import TodoDto
+from ..todo_stats import bump_todo_stats, summarize_todo_stats, count_todos
+from ..user_import import (
+    UserImport,
+    IMPORT_BATCH_SIZE,
+    hash_passwords,
+    import_progress,
+    validate_record,
+)
+from ..streaming import iter_records
+from ..events import todo_events
+from ..reads import FIELDS_DESCRIPTION, TODO_FIELDS, iter_todo_page, parse_fields, pick_fields, require_fields
+from ..single_flight import json_body, read_flights
+from ..todo_changes import record_tombstone
 from .auth import get_current_user
 
 router = APIRouter(
@@ -21,28 +39,181 @@ def get_db():
         db.close()
 
 
+def get_shard_dbs():
+    """
+        One session per todo shard, for scatter-gather queries (see `SQLALCHEMY_SHARD_URLS`).
+    """
+    dbs = shard_router.open_all()
+    try:
+        yield dbs
+    finally:
+        for db in dbs:
+            db.close()
+
+
 db_dependency = Annotated[Session, Depends(get_db)]
+shard_dbs_dependency = Annotated[list[Session], Depends(get_shard_dbs)]
 user_dependency = Annotated[dict, Depends(get_current_user)]
 
 
 @router.get("/todo", status_code=status.HTTP_200_OK)
-def read_all(user: user_dependency, db: db_dependency):
+def read_all(
+    user: user_dependency,
+    dbs: shard_dbs_dependency,
+    response: Response,
+    owner_id: int | None = Query(default=None, gt=0),
+    complete: bool | None = None,
+    priority: int | None = Query(default=None, gt=0, lt=6),
+    # Keyset paging: pass the last id of the previous page (also sent back in `X-Next-Cursor`)
+    after_id: int | None = Query(default=None, ge=0),
+    limit: int | None = Query(default=None, gt=0, le=1000),
+    # `none` skips counting, `estimate` and `cached` avoid a full `COUNT(*)`
+    count: Literal["none", "estimate", "cached", "exact"] = "none",
+    # Also list todos moved to `todos_archive`; counts always cover live todos only
+    include_archived: bool = False,
+    fields: str | None = Query(default=None, description=FIELDS_DESCRIPTION),
+    if_none_match: str | None = Header(default=None),
+):
     if user is None or user.get("role") != "admin":
         raise HTTPException(status_code=401, detail="You are not authorized for read_all.")
 
-    # Without filter
-    return db.query(Todos).all()
+    selected = parse_fields(fields, TODO_FIELDS)
+    # Shards are merged and paged by id, so it is always read
+    columns = require_fields(selected, "id")
+
+    shards = list(enumerate(dbs))
+
+    if owner_id is not None:
+        # All todos of an owner live on one shard
+        shard = shard_router.shard_for(owner_id)
+        shards = [(shard, dbs[shard])]
+
+    if count != "none":
+        def count_shard(item):
+            shard, db = item
+            query = db.query(Todos)
+
+            if owner_id is not None:
+                query = query.filter(Todos.owner_id == owner_id)
+            if complete is not None:
+                query = query.filter(Todos.complete == complete)
+            if priority is not None:
+                query = query.filter(Todos.priority == priority)
+
+            return count_todos(db, query, count, owner_id, complete, priority, shard)
+
+        counts = scatter(shards, count_shard)
+        modes = {mode for _, mode in counts}
+        response.headers["X-Total-Count"] = str(sum(total for total, _ in counts))
+        # The least exact mode any shard used
+        response.headers["X-Total-Count-Mode"] = min(modes, key=["estimate", "cached", "exact"].index)
+
+    cursors = scatter(shards, lambda item: iter_todo_page(item[1], owner_id, complete, priority, after_id, limit,
+                                                          fields=columns))
+
+    if include_archived:
+        # Archived rows keep their id, so they merge into the same id order
+        cursors += scatter(shards, lambda item: iter_todo_page(item[1], owner_id, complete, priority, after_id,
+                                                               limit, archived=True, fields=columns))
+
+    # Each shard returns its page ordered by id; the merge pulls rows lazily until the page is full
+    todos = list(itertools.islice(heapq.merge(*cursors, key=lambda row: row.id), limit))
+
+    if limit is not None and len(todos) == limit:
+        response.headers["X-Next-Cursor"] = str(todos[-1].id)
+
+    # A returned `Response` does not pick up the headers set on `response` above
+    return etag_response(json_body([pick_fields(row, selected) for row in todos]), if_none_match,
+                         headers=response.headers)
+
+
+@router.get("/stats", status_code=status.HTTP_200_OK)
+def read_stats(user: user_dependency, dbs: shard_dbs_dependency):
+    if user is None or user.get("role") != "admin":
+        raise HTTPException(status_code=401, detail="You are not authorized for read_stats.")
+
+    # At most (2 x 5) rows per shard: O(1) no matter how many todos exist
+    rows = scatter(dbs, lambda db: db.query(TodoStats.complete, TodoStats.priority, TodoStats.count).all())
+
+    return summarize_todo_stats(itertools.chain.from_iterable(rows))
 
 
 @router.delete("/todo/{todo_id}", status_code=status.HTTP_204_NO_CONTENT)
-def delete_todo(user: user_dependency, db: db_dependency, todo_id: int = Path(gt=0)):
+def delete_todo(user: user_dependency, dbs: shard_dbs_dependency, todo_id: int = Path(gt=0)):
     if user is None or user.get("role") != "admin":
         raise HTTPException(status_code=401, detail="You are not authorized for delete_user.")
 
-    todo = db.query(Todos).filter(Todos.id == todo_id).first()
+    # Ids are unique across shards (see `SHARD_ID_SPACING`), so at most one shard has it
+    found = scatter(dbs, lambda db: db.query(Todos).filter(Todos.id == todo_id).first())
+    db, todo = next(((db, todo) for db, todo in zip(dbs, found) if todo is not None), (None, None))
 
     if todo is None:
         raise HTTPException(status_code=404, detail="Unable to find the todo")
 
+    bump_todo_stats(db, todo.complete, todo.priority, -1)
+    owner_id = todo.owner_id
+    record_tombstone(db, todo_id, owner_id)
     db.query(Todos).filter(Todos.id == todo_id).delete()
     db.commit()
+    read_flights.forget(owner_id)
+
+    todo_events.publish("deleted", owner_id, todo_id=todo_id)
+
+
+@router.post("/users/import", status_code=status.HTTP_200_OK)
+async def import_users(
+    user: user_dependency,
+    db: db_dependency,
+    request: Request,
+    file_format: Literal["csv", "ndjson"] = Query(default="ndjson", alias="format"),
+    import_id: str | None = None,
+):
+    """
+        Streams a CSV (with header) or NDJSON body of `UserDto` rows into `users`.
+
+        The body is never buffered as a whole: rows are validated as they arrive, hashed in a process pool
+        and inserted `IMPORT_BATCH_SIZE` at a time. Poll `GET /admin/users/import/{import_id}` for progress.
+    """
+    if user is None or user.get("role") != "admin":
+        raise HTTPException(status_code=401, detail="You are not authorized for import_users.")
+
+    user_import = UserImport(import_id or uuid.uuid4().hex)
+
+    async def flush():
+        passwords = [dto.password for _, dto in user_import.pending]
+        hashed_passwords = await run_in_threadpool(hash_passwords, passwords)
+        await run_in_threadpool(user_import.flush, db, hashed_passwords)
+
+    try:
+        async for row_number, record, error in iter_records(request.stream(), file_format):
+            if error is None:
+                dto, error = validate_record(record)
+
+            if error is not None:
+                user_import.fail(row_number, error)
+                continue
+
+            user_import.pending.append((row_number, dto))
+
+            if len(user_import.pending) >= IMPORT_BATCH_SIZE:
+                await flush()
+
+        if user_import.pending:
+            await flush()
+    finally:
+        user_import.progress["done"] = True
+
+    return user_import.progress
+
+
+@router.get("/users/import/{import_id}", status_code=status.HTTP_200_OK)
+def read_import_progress(user: user_dependency, import_id: str):
+    if user is None or user.get("role") != "admin":
+        raise HTTPException(status_code=401, detail="You are not authorized for read_import_progress.")
+
+    progress = import_progress.get(import_id)
+
+    if progress is None:
+        raise HTTPException(status_code=404, detail="Unable to find the import")
+
+    return progress
@@ -1,3 +1,5 @@
+import hashlib
+import secrets
 from datetime import timedelta, datetime, timezone
 from typing import Annotated
 from starlette import status
@@ -6,10 +8,13 @@ from sqlalchemy.orm import Session
 from passlib.context import CryptContext
 from fastapi.security import OAuth2PasswordRequestForm, OAuth2PasswordBearer
 from jose import jwt, JWTError
-from ..models import Users
-from ..database import SessionLocal
+from ..models import Users, RefreshTokens
+from ..database import SessionLocal, current_user_id
+from ..cache import user_cache, get_user_profile
 from ..dtos.user import UserDto
 from ..dtos.token import Token
+from ..dtos.refresh_token import RefreshTokenRequest
+from ..tracing import span
 
 
 router = APIRouter(
@@ -19,6 +24,8 @@ router = APIRouter(
 
 SECRET_KEY = "AFJLAJFLADafdafalc"
 ALGORITHM = "HS256"
+ACCESS_TOKEN_EXPIRES = timedelta(minutes=20)
+REFRESH_TOKEN_EXPIRES = timedelta(days=7)
 
 
 bcrypt_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
@@ -42,7 +49,10 @@ def authenticate_user(username: str, password: str, db: db_dependency) -> Users
     if not user:
         return False
 
-    if not bcrypt_context.verify(password, user.hashed_password):
+    with span("bcrypt.verify"):
+        verified = bcrypt_context.verify(password, user.hashed_password)
+
+    if not verified:
         return False
 
     return user
@@ -56,9 +66,28 @@ def create_access_token(username: str, user_id: str, role: str, expires_delta: t
     return jwt.encode(encode, SECRET_KEY, algorithm=ALGORITHM)
 
 
+def hash_refresh_token(token: str) -> str:
+    # Refresh tokens are 256 random bits, so a fast hash is enough; bcrypt is not needed here
+    return hashlib.sha256(token.encode()).hexdigest()
+
+
+def create_refresh_token(user_id: int, db: db_dependency) -> str:
+    token = secrets.token_urlsafe(32)
+
+    db.add(RefreshTokens(
+        user_id=user_id,
+        token_hash=hash_refresh_token(token),
+        expires_at=datetime.now(timezone.utc) + REFRESH_TOKEN_EXPIRES,
+        revoked=False,
+    ))
+
+    return token
+
+
 async def get_current_user(token: Annotated[str, Depends(oauth2_bearer)]):
     try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+        with span("auth.jwt_decode"):
+            payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
         username = payload.get("sub")
         user_id = payload.get("id")
         user_role = payload.get("role")
@@ -69,6 +98,17 @@ async def get_current_user(token: Annotated[str, Depends(oauth2_bearer)]):
                 detail="Could not validate the user",
             )
 
+        # Cheap active check: only consults the profile cache, never the DB
+        cached_user = user_cache.get(user_id)
+        if cached_user is not None and not cached_user["is_active"]:
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                detail="Could not validate the user",
+            )
+
+        # Lets the DB session keep this user on the primary right after they write
+        current_user_id.set(user_id)
+
         return {
             "username": username,
             "id": user_id,
@@ -83,19 +123,23 @@ async def get_current_user(token: Annotated[str, Depends(oauth2_bearer)]):
 
 @router.post("/", status_code=status.HTTP_201_CREATED)
 def create_user(db: db_dependency, create_user_request: UserDto):
+    with span("bcrypt.hash"):
+        hashed_password = bcrypt_context.hash(create_user_request.password)
+
     create_user_model = Users(
         username=create_user_request.username,
         email=create_user_request.email,
         first_name=create_user_request.first_name,
         last_name=create_user_request.last_name,
         role=create_user_request.role,
-        hashed_password=bcrypt_context.hash(create_user_request.password),
+        hashed_password=hashed_password,
         is_active=True,
         phone_number=create_user_request.phone_number,
     )
 
     db.add(create_user_model)
     db.commit()
+    user_cache.invalidate(create_user_model.id)
 
 
 @router.post("/token", response_model=Token, status_code=status.HTTP_200_OK)
@@ -111,9 +155,88 @@ def login_for_access_token(
             detail="Failed to validate the user"
         )
 
-    token = create_access_token(user.username, user.id, user.role, timedelta(minutes=20))
+    token = create_access_token(user.username, user.id, user.role, ACCESS_TOKEN_EXPIRES)
+    refresh_token = create_refresh_token(user.id, db)
+    db.commit()
+
+    return {
+        "access_token": token,
+        "token_type": "bearer",
+        "refresh_token": refresh_token,
+    }
+
+
+@router.post("/refresh", response_model=Token, status_code=status.HTTP_200_OK)
+def refresh_access_token(db: db_dependency, refresh_request: RefreshTokenRequest):
+    stored_token = (db.query(RefreshTokens)
+                    .filter(RefreshTokens.token_hash == hash_refresh_token(refresh_request.refresh_token))
+                    .first())
+
+    if stored_token is None:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Invalid refresh token"
+        )
+
+    if stored_token.revoked:
+        # A rotated token was presented again, so it has leaked. Revoke the whole family.
+        (db.query(RefreshTokens)
+         .filter(RefreshTokens.user_id == stored_token.user_id)
+         .update({RefreshTokens.revoked: True}))
+        db.commit()
+
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Invalid refresh token"
+        )
+
+    expires_at = stored_token.expires_at
+    # SQLite drops the timezone, PostgreSQL keeps it
+    if expires_at.tzinfo is None:
+        expires_at = expires_at.replace(tzinfo=timezone.utc)
+
+    if expires_at <= datetime.now(timezone.utc):
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Refresh token expired"
+        )
+
+    user = get_user_profile(db, stored_token.user_id)
+
+    if user is None or not user["is_active"]:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Could not validate the user"
+        )
+
+    # Rotation: every refresh token is single use.
+    # The conditional UPDATE makes two concurrent refreshes of the same token race safely.
+    rotated = (db.query(RefreshTokens)
+               .filter(RefreshTokens.id == stored_token.id)
+               .filter(RefreshTokens.revoked == False)  # noqa: E712
+               .update({RefreshTokens.revoked: True}))
+
+    if rotated == 0:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Invalid refresh token"
+        )
+
+    refresh_token = create_refresh_token(user["id"], db)
+    db.commit()
+
+    token = create_access_token(user["username"], user["id"], user["role"], ACCESS_TOKEN_EXPIRES)
 
     return {
         "access_token": token,
         "token_type": "bearer",
+        "refresh_token": refresh_token,
     }
+
+
+@router.post("/revoke", status_code=status.HTTP_204_NO_CONTENT)
+def revoke_refresh_token(db: db_dependency, refresh_request: RefreshTokenRequest):
+    (db.query(RefreshTokens)
+     .filter(RefreshTokens.token_hash == hash_refresh_token(refresh_request.refresh_token))
+     .update({RefreshTokens.revoked: True}))
+    db.commit()
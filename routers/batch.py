@@ -0,0 +1,276 @@
+from collections import Counter
+from typing import Annotated
+
+from fastapi import APIRouter, Depends, HTTPException
+from pydantic import ValidationError
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+from starlette import status
+
+from ..cache import get_user_profile
+from ..database import SessionLocal, shard_router
+from ..dtos.batch import BatchDto, BatchOperationDto
+from ..dtos.todo import TodoDto, TodoPatchDto
+from ..events import todo_events
+from ..models import Todos
+from ..reads import read_todo, read_todos_of_owner
+from ..single_flight import read_flights
+from ..todo_changes import next_change_seq
+from ..todo_stats import bump_todo_stats_many
+from ..todo_writes import insert_todo, patch_todo_values, remove_todo, replace_todo
+from .auth import get_current_user
+
+
+router = APIRouter(
+    prefix="/batch",
+    tags=["batch"],
+)
+
+
+def get_db(user: Annotated[dict, Depends(get_current_user)]):
+    # Same shard as `routers/todos.py`: all of a user's todos live on the shard of their id
+    db = shard_router.session_for(user.get("id") if user else None)
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+def get_user_db():
+    # Users live on the primary; the session only connects if a `me` operation misses the cache
+    db = SessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+db_dependency = Annotated[Session, Depends(get_db)]
+user_db_dependency = Annotated[Session, Depends(get_user_db)]
+user_dependency = Annotated[dict, Depends(get_current_user)]
+
+
+# Operations that write a todo, as opposed to `list`, `get` and `me`
+WRITE_OPERATIONS = ("create", "update", "patch", "delete")
+
+
+@router.post("/", status_code=status.HTTP_200_OK)
+def run_batch(user: user_dependency, db: db_dependency, user_db: user_db_dependency, batch: BatchDto):
+    """
+        Runs up to 50 operations with one authentication and one session.
+        Returns one `{"status", "body"}` result per operation, in order, and whether anything was committed.
+
+        In `atomic` mode the batch is one transaction and the first failing operation rolls it back:
+        the operations before it report 424 and the ones after it are not run.
+        In `independent` mode every write is committed on its own, so a failure only undoes that operation.
+        An unexpected error (e.g. a lost connection) still ends the batch with 500, and the operations
+        before it stay committed.
+    """
+    if user is None:
+        raise HTTPException(status_code=401, detail="Authentication failed in run_batch")
+
+    if batch.mode == "independent":
+        return run_independent(db, user_db, user.get("id"), batch.operations)
+
+    return run_atomic(db, user_db, user.get("id"), batch.operations)
+
+
+def run_independent(db: Session, user_db: Session, owner_id: int, operations: list[BatchOperationDto]) -> dict:
+    results = []
+
+    for operation in operations:
+        try:
+            result, event = run_operation(db, user_db, owner_id, operation)
+
+            if operation.op in WRITE_OPERATIONS:
+                db.commit()
+        except (HTTPException, ValidationError) as error:
+            db.rollback()
+            result, event = error_result(error), None
+
+        results.append(result)
+
+        if event is not None:
+            read_flights.forget(owner_id)
+            event_type, data = event
+            todo_events.publish(event_type, owner_id, **data)
+
+    return {"committed": True, "results": results}
+
+
+def run_atomic(db: Session, user_db: Session, owner_id: int, operations: list[BatchOperationDto]) -> dict:
+    """
+        Takes the locks of the whole batch in the order of every single todo write (see `todo_writes.py`):
+        first the stats of all the writes, sorted, then one change sequence number, and only then todo rows.
+        Taking them operation by operation would bump stats while holding the counter and earlier rows,
+        and deadlock against concurrent single writes.
+    """
+    todos = {}
+    deltas = Counter()
+    plans = []
+
+    for index, operation in enumerate(operations):
+        try:
+            plans.append(plan_write(db, owner_id, operation, todos, deltas)
+                         if operation.op in WRITE_OPERATIONS else None)
+        except (HTTPException, ValidationError) as error:
+            return roll_back(db, operations, index, error_result(error))
+
+    change_seq = None
+    if any(operation.op in WRITE_OPERATIONS for operation in operations):
+        bump_todo_stats_many(db, deltas)
+        change_seq = next_change_seq(db, owner_id)
+
+    results = []
+    events = []
+
+    for index, (operation, plan) in enumerate(zip(operations, plans)):
+        try:
+            result, event = run_operation(db, user_db, owner_id, operation, plan, change_seq)
+        except (HTTPException, ValidationError) as error:
+            return roll_back(db, operations, index, error_result(error))
+
+        results.append(result)
+
+        if event is not None:
+            events.append(event)
+
+    db.commit()
+
+    if events:
+        read_flights.forget(owner_id)
+
+    for event_type, data in events:
+        todo_events.publish(event_type, owner_id, **data)
+
+    return {"committed": True, "results": results}
+
+
+def roll_back(db: Session, operations: list[BatchOperationDto], failed_index: int, failure: dict) -> dict:
+    db.rollback()
+
+    rolled_back = {"status": 424, "body": {"detail": "Rolled back: a later operation of the batch failed"}}
+    not_run = {"status": 424, "body": {"detail": "Not run: an earlier operation of the batch failed"}}
+    results = [rolled_back] * failed_index + [failure] + [not_run] * (len(operations) - failed_index - 1)
+
+    return {"committed": False, "results": results}
+
+
+def error_result(error: HTTPException | ValidationError) -> dict:
+    if isinstance(error, HTTPException):
+        return {"status": error.status_code, "body": {"detail": error.detail}}
+
+    return {"status": 422, "body": {"detail": error.errors(include_url=False, include_context=False)}}
+
+
+def require_todo_id(operation: BatchOperationDto) -> int:
+    if operation.todo_id is None:
+        raise HTTPException(status_code=422, detail=f"`todo_id` is required for {operation.op}")
+
+    return operation.todo_id
+
+
+def validate_body(operation: BatchOperationDto) -> TodoDto | dict | None:
+    if operation.op in ("create", "update"):
+        return TodoDto.model_validate(operation.body or {})
+
+    if operation.op == "patch":
+        return TodoPatchDto.model_validate(operation.body or {}).model_dump(exclude_unset=True, exclude_none=True)
+
+    return None
+
+
+def plan_write(db: Session, owner_id: int, operation: BatchOperationDto, todos: dict,
+               deltas: Counter) -> tuple[TodoDto | dict | None, int | None]:
+    """
+        Validates a write of an atomic batch and adds its stats deltas to `deltas`, without writing anything.
+        `todos` maps each todo id to its (complete, priority, version) after the writes planned so far,
+        or None once deleted.
+
+        Returns the validated body and the version the write must still find, so a todo changed by
+        another request in the meantime fails the batch with 412 instead of skewing the stats.
+    """
+    if operation.op == "create":
+        body = validate_body(operation)
+        deltas[(body.complete, body.priority)] += 1
+        return body, None
+
+    todo_id = require_todo_id(operation)
+    body = validate_body(operation)
+
+    if todo_id not in todos:
+        current = db.execute(
+            select(Todos.complete, Todos.priority, Todos.version)
+            .where(Todos.id == todo_id, Todos.owner_id == owner_id)
+        ).first()
+        todos[todo_id] = tuple(current) if current is not None else None
+
+    if todos[todo_id] is None:
+        raise HTTPException(status_code=404, detail="Todo not found")
+
+    complete, priority, version = todos[todo_id]
+
+    if operation.version is not None and operation.version != version:
+        raise HTTPException(status_code=412, detail="Todo was modified by another request")
+
+    # An empty patch writes nothing (see `patch_todo_values`)
+    if operation.op == "patch" and not body:
+        return body, version
+
+    deltas[(bool(complete), priority)] -= 1
+
+    if operation.op == "delete":
+        todos[todo_id] = None
+        return None, version
+
+    if operation.op == "update":
+        new_complete, new_priority = body.complete, body.priority
+    else:
+        new_complete, new_priority = body.get("complete", complete), body.get("priority", priority)
+
+    deltas[(bool(new_complete), new_priority)] += 1
+    todos[todo_id] = (new_complete, new_priority, version + 1)
+
+    return body, version
+
+
+def run_operation(db: Session, user_db: Session, owner_id: int, operation: BatchOperationDto,
+                  plan: tuple | None = None, change_seq: int | None = None) -> tuple[dict, tuple | None]:
+    """
+        Returns the operation's result and the change event to publish once it is committed.
+        Writes of an atomic batch come with their `plan_write` plan and the batch's `change_seq`.
+    """
+    if operation.op == "me":
+        return {"status": 200, "body": get_user_profile(user_db, owner_id)}, None
+
+    if operation.op == "list":
+        return {"status": 200, "body": [row._asdict() for row in read_todos_of_owner(db, owner_id)]}, None
+
+    if operation.op == "create":
+        new_todo = plan[0] if plan is not None else validate_body(operation)
+        todo_id = insert_todo(db, owner_id, new_todo, change_seq)
+        return {"status": 201, "body": {"id": todo_id}}, ("created", {"todo_id": todo_id, "version": 1})
+
+    todo_id = require_todo_id(operation)
+
+    if operation.op == "get":
+        todo = read_todo(db, todo_id, owner_id)
+
+        if todo is None:
+            raise HTTPException(status_code=404, detail="Todo not found")
+
+        return {"status": 200, "body": todo._asdict(), "etag": f'"{todo.version}"'}, None
+
+    body, expected_version = plan if plan is not None else (validate_body(operation), operation.version)
+
+    if operation.op == "delete":
+        remove_todo(db, owner_id, todo_id, expected_version, change_seq)
+        return {"status": 204, "body": None}, ("deleted", {"todo_id": todo_id})
+
+    if operation.op == "update":
+        new_version = replace_todo(db, owner_id, todo_id, body, expected_version, change_seq)
+    else:
+        new_version = patch_todo_values(db, owner_id, todo_id, body, expected_version, change_seq)
+
+    return ({"status": 204, "body": None, "etag": f'"{new_version}"'},
+            ("updated", {"todo_id": todo_id, "version": new_version}))
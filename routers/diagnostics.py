@@ -0,0 +1,105 @@
+from typing import Annotated, Literal
+
+from fastapi import APIRouter, Depends, HTTPException, Path, Query
+from starlette import status
+
+from ..memory_diagnostics import (
+    DIAGNOSTICS_TRACE_FRAMES,
+    allocation_tracer,
+    pool_report,
+    session_report,
+)
+from .auth import get_current_user
+
+
+router = APIRouter(
+    prefix="/admin/diagnostics",
+    tags=["admin"],
+)
+
+user_dependency = Annotated[dict, Depends(get_current_user)]
+group_by_query = Query(default="lineno", description="`lineno`, `filename` or `traceback`")
+
+
+@router.get("/memory", status_code=status.HTTP_200_OK)
+def read_memory(user: user_dependency):
+    """
+        Allocation tracing state, traced and resident memory, and the snapshots taken, of the worker
+        that serves this request.
+    """
+    if user is None or user.get("role") != "admin":
+        raise HTTPException(status_code=401, detail="You are not authorized for read_memory.")
+
+    return allocation_tracer.status()
+
+
+@router.post("/memory/start", status_code=status.HTTP_200_OK)
+def start_tracing(user: user_dependency, frames: int = Query(default=DIAGNOSTICS_TRACE_FRAMES, gt=0, le=100)):
+    if user is None or user.get("role") != "admin":
+        raise HTTPException(status_code=401, detail="You are not authorized for start_tracing.")
+
+    allocation_tracer.start(frames)
+
+    return allocation_tracer.status()
+
+
+@router.post("/memory/stop", status_code=status.HTTP_200_OK)
+def stop_tracing(user: user_dependency):
+    """
+        Stops tracing and drops the snapshots, which gives their memory back.
+    """
+    if user is None or user.get("role") != "admin":
+        raise HTTPException(status_code=401, detail="You are not authorized for stop_tracing.")
+
+    allocation_tracer.stop()
+
+    return allocation_tracer.status()
+
+
+@router.post("/memory/snapshots", status_code=status.HTTP_201_CREATED)
+def take_snapshot(user: user_dependency, group_by: Literal["lineno", "filename", "traceback"] = group_by_query,
+                  limit: int = Query(default=25, gt=0, le=500)):
+    """
+        Snapshots the traced allocations and returns its id with the largest allocation sites.
+    """
+    if user is None or user.get("role") != "admin":
+        raise HTTPException(status_code=401, detail="You are not authorized for take_snapshot.")
+
+    snapshot_id = allocation_tracer.take_snapshot()
+    if snapshot_id is None:
+        raise HTTPException(status_code=409, detail="Allocation tracing is not started")
+
+    return {"id": snapshot_id, "top": allocation_tracer.top(snapshot_id, group_by, limit)}
+
+
+@router.get("/memory/snapshots/{first_id}/diff/{second_id}", status_code=status.HTTP_200_OK)
+def diff_snapshots(user: user_dependency, first_id: int = Path(gt=0), second_id: int = Path(gt=0),
+                   group_by: Literal["lineno", "filename", "traceback"] = group_by_query,
+                   limit: int = Query(default=25, gt=0, le=500)):
+    """
+        Allocation sites by how much they grew from the first snapshot to the second.
+    """
+    if user is None or user.get("role") != "admin":
+        raise HTTPException(status_code=401, detail="You are not authorized for diff_snapshots.")
+
+    stats = allocation_tracer.diff(first_id, second_id, group_by, limit)
+    if stats is None:
+        raise HTTPException(status_code=404, detail="Snapshot not found in this worker")
+
+    return stats
+
+
+@router.get("/sessions", status_code=status.HTTP_200_OK)
+def read_sessions(user: user_dependency, limit: int = Query(default=25, gt=0, le=500)):
+    if user is None or user.get("role") != "admin":
+        raise HTTPException(status_code=401, detail="You are not authorized for read_sessions.")
+
+    return session_report(limit)
+
+
+@router.get("/pools", status_code=status.HTTP_200_OK)
+def read_pools(user: user_dependency):
+    if user is None or user.get("role") != "admin":
+        raise HTTPException(status_code=401, detail="You are not authorized for read_pools.")
+
+    return pool_report()
@@ -1,20 +1,37 @@
-from typing import Annotated
+import asyncio
+from typing import Annotated, Literal
 
-from fastapi import APIRouter, Depends, HTTPException, Path
+from fastapi import APIRouter, Depends, Header, HTTPException, Path, Query, Request, Response
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+from sqlalchemy import func
+from sqlalchemy.exc import IntegrityError, SQLAlchemyError
 from sqlalchemy.orm import Session
 from starlette import status
 
+from .. import group_commit
+from ..compression import etag_response
 from ..models import Todos
-from ..database import SessionLocal
-from ..dtos.todo import TodoDto
+from ..database import shard_router
+from ..dtos.todo import TodoDto, TodoPatchDto
+from ..todo_stats import summarize_todo_stats
+from ..todo_transfer import TodoImport, iter_export
+from ..streaming import iter_records
+from ..events import todo_events, format_sse, HEARTBEAT_SECONDS
+from ..reads import (FIELDS_DESCRIPTION, TODO_FIELDS, parse_fields, pick_fields, read_todo, read_todos_of_owner,
+                     require_fields)
+from ..single_flight import json_body, read_flights
+from ..todo_changes import CHANGES_PAGE_SIZE, ResyncRequired, read_changes
+from ..todo_writes import insert_todo, patch_todo_values, remove_todo, replace_todo
 from .auth import get_current_user
 
 
 router = APIRouter()
 
 
-def get_db():
-    db = SessionLocal()
+def get_db(user: Annotated[dict, Depends(get_current_user)]):
+    # Every todo of a user lives on the shard of their id (see `SQLALCHEMY_SHARD_URLS`)
+    db = shard_router.session_for(user.get("id") if user else None)
     try:
         yield db
     finally:
@@ -24,29 +41,157 @@ def get_db():
 db_dependency = Annotated[Session, Depends(get_db)]
 user_dependency = Annotated[dict, Depends(get_current_user)]
 
+# Reads of an owner already in flight may predate a write. The handlers of this worker forget them before
+# answering; the event covers writes made by other workers, whose events arrive later on a listener thread.
+# A `resync` (events were lost) has no owner and forgets every read.
+todo_events.watch(lambda event: read_flights.forget(event.get("owner_id")))
+
+
+def parse_if_match(if_match: str | None) -> int | None:
+    """
+        `If-Match: "3"` -> 3. Missing header or `*` -> None (no version check).
+    """
+    if if_match is None or if_match.strip() == "*":
+        return None
+
+    try:
+        return int(if_match.strip().removeprefix("W/").strip('"'))
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid If-Match header")
+
+
+def set_etag(response: Response, version: int):
+    response.headers["ETag"] = f'"{version}"'
+
 
 @router.get("/", status_code=status.HTTP_200_OK)
-def find_all(user: user_dependency, db: db_dependency):
+def find_all(user: user_dependency, db: db_dependency, include_archived: bool = False,
+             fields: str | None = Query(default=None, description=FIELDS_DESCRIPTION),
+             if_none_match: str | None = Header(default=None)):
     if user is None:
         raise HTTPException(status_code=401, detail="Authentication failed in find_all")
 
-    return (db.query(Todos)
+    selected = parse_fields(fields, TODO_FIELDS)
+
+    # `todos_archive` is only read when asked for: the default listing touches live rows only
+    # Identical concurrent listings share one query and one serialized body
+    body = read_flights.do(
+        ("find_all", user.get("id"), include_archived, selected),
+        lambda: json_body([
+            row._asdict() for row in read_todos_of_owner(db, user.get("id"), include_archived, selected)
+        ]),
+    )
+
+    return etag_response(body, if_none_match)
+
+
+# Must be declared before `/todo/{todo_id}`, otherwise "stats" is parsed as a todo id
+@router.get("/todo/stats", status_code=status.HTTP_200_OK)
+def find_stats(user: user_dependency, db: db_dependency):
+    if user is None:
+        raise HTTPException(status_code=401, detail="Authentication failed in find_stats")
+
+    rows = (db.query(Todos.complete, Todos.priority, func.count(Todos.id))
             .filter(Todos.owner_id == user.get("id"))
+            .group_by(Todos.complete, Todos.priority)
             .all())
 
+    return summarize_todo_stats(rows)
+
+
+@router.get("/todo/export", status_code=status.HTTP_200_OK)
+def export_todos(
+    user: user_dependency,
+    db: db_dependency,
+    file_format: Literal["csv", "ndjson"] = Query(default="csv", alias="format"),
+    # Admins may export somebody else's todos
+    owner_id: int | None = Query(default=None, gt=0),
+):
+    if user is None:
+        raise HTTPException(status_code=401, detail="Authentication failed in export_todos")
+
+    if owner_id is not None and owner_id != user.get("id") and user.get("role") != "admin":
+        raise HTTPException(status_code=401, detail="You are not authorized to export these todos.")
+
+    if owner_id is not None and shard_router.shard_for(owner_id) != shard_router.shard_for(user.get("id")):
+        # `iter_export` closes it once the stream ends
+        db = shard_router.session_for(owner_id)
+
+    return StreamingResponse(
+        iter_export(db, owner_id or user.get("id"), file_format),
+        media_type="text/csv" if file_format == "csv" else "application/x-ndjson",
+        headers={"Content-Disposition": f'attachment; filename="todos.{file_format}"'},
+    )
+
+
+@router.get("/todo/changes", status_code=status.HTTP_200_OK)
+def find_changes(
+    user: user_dependency,
+    db: db_dependency,
+    since: int | None = Query(default=None, ge=0),
+    limit: int = Query(default=CHANGES_PAGE_SIZE, gt=0, le=CHANGES_PAGE_SIZE),
+):
+    """
+        Delta sync: todos changed and ids deleted since the `cursor` of the previous call.
+        Omit `since` for the first, full sync. 410 means the cursor is too old: drop local data and full sync.
+    """
+    if user is None:
+        raise HTTPException(status_code=401, detail="Authentication failed in find_changes")
+
+    try:
+        return read_changes(db, user.get("id"), since, limit)
+    except ResyncRequired:
+        raise HTTPException(status_code=410, detail="Cursor expired, a full sync is required")
+
+
+@router.get("/todo/events", status_code=status.HTTP_200_OK)
+async def stream_events(user: user_dependency):
+    """
+        Server-Sent Events of the caller's todo changes: `created`, `updated`, `deleted`, `imported`,
+        and `resync` when the client fell too far behind and should refetch.
+
+        No DB session is held; an idle connection is one small queue and a heartbeat timer.
+    """
+    if user is None:
+        raise HTTPException(status_code=401, detail="Authentication failed in stream_events")
+
+    subscription = todo_events.subscribe(user.get("id"))
+
+    async def stream():
+        try:
+            yield ": connected\n\n"
+
+            while True:
+                try:
+                    event = await asyncio.wait_for(subscription.get(), timeout=HEARTBEAT_SECONDS)
+                except asyncio.TimeoutError:
+                    yield ": keep-alive\n\n"
+                    continue
+
+                yield format_sse(event)
+        finally:
+            todo_events.unsubscribe(subscription)
+
+    return StreamingResponse(
+        stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
 
 @router.get("/todo/{todo_id}", status_code=status.HTTP_200_OK)
-def find_todo(user: user_dependency, db: db_dependency, todo_id: int = Path(gt=0)):
+def find_todo(user: user_dependency, db: db_dependency, response: Response, todo_id: int = Path(gt=0),
+              fields: str | None = Query(default=None, description=FIELDS_DESCRIPTION)):
     if user is None:
         raise HTTPException(status_code=401, detail="Authentication failed in find_todo")
 
-    todo_model = (db.query(Todos)
-                  .filter(Todos.id == todo_id)
-                  .filter(Todos.owner_id == user.get("id"))
-                  .first())
+    selected = parse_fields(fields, TODO_FIELDS)
+    # The ETag needs the version even when the client did not ask for it
+    todo = read_todo(db, todo_id, user.get("id"), require_fields(selected, "version"))
 
-    if todo_model is not None:
-        return todo_model
+    if todo is not None:
+        set_etag(response, todo.version)
+        return pick_fields(todo, selected)
 
     raise HTTPException(status_code=404, detail="Todo not found")
 
@@ -56,31 +201,112 @@ def create_todo(user: user_dependency, db: db_dependency, new_todo: TodoDto):
     if user is None:
         raise HTTPException(status_code=401, detail="You are not authorized to create todo.")
 
-    todo_model = Todos(**new_todo.model_dump(), owner_id=user.get("id"))
-    db.add(todo_model)
+    # Opt-in group commit: the row is inserted by the background writer together with other requests
+    if group_commit.todo_writer is not None:
+        future = group_commit.todo_writer.submit({**new_todo.model_dump(), "owner_id": user.get("id")})
+
+        try:
+            future.result(timeout=group_commit.GROUP_COMMIT_RESULT_TIMEOUT_SECONDS)
+        except (TimeoutError, group_commit.GroupCommitUnavailable):
+            raise HTTPException(status_code=503, detail="Todo creation is temporarily unavailable")
+        except IntegrityError:
+            # This row was rejected on its own (see `GroupCommitWriter._flush_one_by_one`), e.g. its owner is gone
+            raise HTTPException(status_code=409, detail="The todo conflicts with existing data")
+        except SQLAlchemyError:
+            # The batch could not be committed, e.g. on a lost connection
+            raise HTTPException(status_code=503, detail="Todo creation is temporarily unavailable")
+
+        read_flights.forget(user.get("id"))
+        return
+
+    todo_id = insert_todo(db, user.get("id"), new_todo)
     db.commit()
+    read_flights.forget(user.get("id"))
+
+    todo_events.publish("created", user.get("id"), todo_id=todo_id, version=1)
+
+
+@router.post("/todo/import", status_code=status.HTTP_201_CREATED)
+async def import_todos(
+    user: user_dependency,
+    db: db_dependency,
+    request: Request,
+    file_format: Literal["csv", "ndjson"] = Query(default="csv", alias="format"),
+):
+    """
+        Restores todos from a streamed CSV (with header) or NDJSON body in a single transaction.
+        Any invalid row rejects the whole import with 422 and the list of row errors.
+    """
+    if user is None:
+        raise HTTPException(status_code=401, detail="You are not authorized to import todos.")
+
+    todo_import = TodoImport(user.get("id"))
+
+    async for row_number, record, error in iter_records(request.stream(), file_format):
+        todo_import.add(row_number, record, error)
+
+        if todo_import.batch_ready:
+            await run_in_threadpool(todo_import.flush, db)
+
+    if todo_import.failed:
+        await run_in_threadpool(db.rollback)
+        raise HTTPException(status_code=422, detail=todo_import.errors)
+
+    def finish():
+        todo_import.finish(db)
+        db.commit()
+
+    await run_in_threadpool(finish)
+    read_flights.forget(user.get("id"))
+    todo_events.publish("imported", user.get("id"), count=todo_import.imported)
+
+    return {"imported": todo_import.imported}
 
 
 @router.put("/todo/{todo_id}", status_code=status.HTTP_204_NO_CONTENT)
-def update_todo(user: user_dependency, db: db_dependency, new_todo: TodoDto, todo_id: int = Path(gt=0)):
+def update_todo(
+    user: user_dependency,
+    db: db_dependency,
+    response: Response,
+    new_todo: TodoDto,
+    todo_id: int = Path(gt=0),
+    if_match: str | None = Header(default=None),
+):
     if user is None:
         raise HTTPException(status_code=401, detail="Authentication failed in update_todo")
 
-    existing_model = (db.query(Todos)
-                      .filter(Todos.id == todo_id)
-                      .filter(Todos.owner_id == user.get("id"))
-                      .first())
+    new_version = replace_todo(db, user.get("id"), todo_id, new_todo, parse_if_match(if_match))
+    db.commit()
+    read_flights.forget(user.get("id"))
+    set_etag(response, new_version)
+
+    todo_events.publish("updated", user.get("id"), todo_id=todo_id, version=new_version)
 
-    if existing_model is None:
-        raise HTTPException(status_code=404, detail="Todo not found")
 
-    existing_model.title = new_todo.title
-    existing_model.description = new_todo.description
-    existing_model.priority = new_todo.priority
-    existing_model.complete = new_todo.complete
+@router.patch("/todo/{todo_id}", status_code=status.HTTP_204_NO_CONTENT)
+def patch_todo(
+    user: user_dependency,
+    db: db_dependency,
+    response: Response,
+    changes: TodoPatchDto,
+    todo_id: int = Path(gt=0),
+    if_match: str | None = Header(default=None),
+):
+    """
+        Updates only the fields present in the body, without a row lock (see `patch_todo_values`).
+    """
+    if user is None:
+        raise HTTPException(status_code=401, detail="Authentication failed in patch_todo")
 
-    db.add(existing_model)
+    values = changes.model_dump(exclude_unset=True, exclude_none=True)
+    new_version = patch_todo_values(db, user.get("id"), todo_id, values, parse_if_match(if_match))
     db.commit()
+    set_etag(response, new_version)
+
+    # An empty body changes nothing
+    if values:
+        read_flights.forget(user.get("id"))
+        todo_events.publish("updated", user.get("id"), todo_id=todo_id, version=new_version)
 
 
 # [IMPORTANT] HTTP_204_NO_CONTENT return nothing because it is `no_content`
@@ -89,17 +315,8 @@ def delete_todo(user: user_dependency, db: db_dependency, todo_id: int = Path(gt
     if user is None:
         raise HTTPException(status_code=401, detail="Authentication failed in update_todo")
 
-    existing_model = (db.query(Todos)
-                      .filter(Todos.id == todo_id)
-                      .filter(Todos.owner_id == user.get("id"))
-                      .first())
-
-    if existing_model is None:
-        raise HTTPException(status_code=404, detail="Todo not found")
-
-    (db.query(Todos)
-     .filter(Todos.id == todo_id)
-     .filter(Todos.owner_id == user.get("id"))
-     .delete())
-
+    remove_todo(db, user.get("id"), todo_id)
     db.commit()
+    read_flights.forget(user.get("id"))
+
+    todo_events.publish("deleted", user.get("id"), todo_id=todo_id)
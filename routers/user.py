@@ -1,6 +1,7 @@
+import logging
 from typing import Annotated
 
-from fastapi import APIRouter, Depends, HTTPException, Path
+from fastapi import APIRouter, Depends, HTTPException, Path, Query, Response
 from sqlalchemy.orm import Session
 from starlette import status
 from passlib.context import CryptContext
@@ -8,11 +9,17 @@ from passlib.context import CryptContext
 
 from ..models import Todos, Users
 from ..database import SessionLocal
+from ..cache import user_cache, get_user_profile
+from ..single_flight import json_body, read_flights
+from ..reads import FIELDS_DESCRIPTION, USER_FIELDS, parse_fields
+from ..tracing import span
 from .auth import get_current_user
 from ..dtos.user import UserDto
 from ..dtos.user_password import UserPassword
 
 
+logger = logging.getLogger(__name__)
+
 router = APIRouter(
     prefix="/user",
     tags=["user"]
@@ -33,33 +40,53 @@ bcrypt_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
 
 @router.get("/", status_code=status.HTTP_200_OK)
-def me(user: user_dependency, db: db_dependency):
+def me(user: user_dependency, db: db_dependency,
+       fields: str | None = Query(default=None, description=FIELDS_DESCRIPTION)):
     # During the py test, it is `user` overidden
-    print("user: ====> ", user)
+    logger.debug("me: user %s", user and user.get("id"))
 
     if user is None:
         raise HTTPException(status_code=401, detail="You are not logged in now")
 
-    return db.query(Users).filter(Users.id == user.get("id")).first()
+    selected = parse_fields(fields, USER_FIELDS)
+
+    def read_profile():
+        profile = get_user_profile(db, user.get("id"))
+
+        # The whole profile is cached, so `fields` only trims the payload here
+        if profile is not None and selected is not None:
+            profile = {name: profile[name] for name in selected}
+
+        return json_body(profile)
+
+    # A reconnecting client's burst of `/user/` shares one cache miss
+    body = read_flights.do(("me", user.get("id"), selected), read_profile)
+
+    return Response(body, media_type="application/json")
 
 
 @router.patch("/password_update", status_code=status.HTTP_204_NO_CONTENT)
 def update_password(user: user_dependency, db: db_dependency, updated_password: UserPassword):
-    print("user in update_password:", user)
+    logger.debug("update_password: user %s", user and user.get("id"))
     if user is None:
         raise HTTPException(status_code=401, detail="not possible to change password")
 
     current_user = db.query(Users).filter(Users.id == user.get("id")).first()
-    print("current_user in update_password:", current_user)
 
 
-    if not bcrypt_context.verify(updated_password.current_password, current_user.hashed_password):
+    with span("bcrypt.verify"):
+        verified = bcrypt_context.verify(updated_password.current_password, current_user.hashed_password)
+
+    if not verified:
         raise HTTPException(status_code=401, detail="The current password is not identical")
 
-    current_user.hashed_password = bcrypt_context.hash(updated_password.new_password)
+    with span("bcrypt.hash"):
+        current_user.hashed_password = bcrypt_context.hash(updated_password.new_password)
 
     db.add(current_user)
     db.commit()
+    user_cache.invalidate(current_user.id)
+    read_flights.forget(current_user.id)
 
 
 @router.put("/user_update", status_code=status.HTTP_204_NO_CONTENT)
@@ -72,3 +99,5 @@ def update_user(user: user_dependency, db: db_dependency, user_update: UserDto):
 
     db.add(current_user)
     db.commit()
+    user_cache.invalidate(current_user.id)
+    read_flights.forget(current_user.id)
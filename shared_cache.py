@@ -0,0 +1,210 @@
+"""
+    Host-local cache shared by every worker process, in a memory-mapped file.
+
+    The file is a header followed by fixed-size slots. A key hashes to one slot (direct-mapped: a colliding
+    key simply replaces it, this is a cache). Each slot starts with a sequence counter used as a seqlock:
+
+        writer: lock the slot, counter += 1 (odd), write key hash, expiry and value, counter += 1 (even)
+        reader: read counter, read the slot, read counter again; a changed or odd counter means a write
+                was in progress, so retry, and after a few attempts report a miss
+
+    Reads take no lock at all. Writers lock only their slot, across processes with `fcntl.lockf` on
+    the slot's byte range and within the process with a thread lock. Invalidation writes the slot,
+    so it is seen by every worker at once.
+
+    Each slot also counts its invalidations (the generation). A caller filling the cache after a miss
+    reads the generation before loading the value and passes it to `set`, which drops the value if an
+    invalidation came in between: it may have been loaded before the write that invalidated it.
+"""
+import fcntl
+import hashlib
+import json
+import logging
+import mmap
+import os
+import struct
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+
+
+logger = logging.getLogger(__name__)
+
+# Where the segment lives: tmpfs when available, so it never touches the disk
+SHARED_CACHE_DIRECTORY = "/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir()
+# A reader seeing a write in progress this many times in a row treats the lookup as a miss
+SHARED_CACHE_READ_ATTEMPTS = 4
+
+_MAGIC = b"TODOSHM2"
+# magic, slot count, slot size
+_HEADER = struct.Struct("<8sII")
+_HEADER_SIZE = 64
+# sequence counter, key hash, expires at (wall clock, shared by every process), value length, generation
+_SLOT_HEADER = struct.Struct("<QQdII")
+_SLOT_HEADER_SIZE = 32
+_GENERATION = struct.Struct("<I")
+_GENERATION_OFFSET = 28
+
+
+def _key_hash(key) -> int:
+    # Never 0, which marks an empty slot
+    return int.from_bytes(hashlib.blake2b(repr(key).encode(), digest_size=8).digest(), "little") or 1
+
+
+class SharedCache:
+    """
+        `TTLCache`'s interface over a shared memory segment. Values must be JSON-serializable;
+        one that does not fit in a slot is not cached, and counted in `oversized`.
+    """
+
+    def __init__(self, name: str, ttl: float, slots: int = 16384, slot_size: int = 512,
+                 directory: str = SHARED_CACHE_DIRECTORY):
+        self.ttl = ttl
+        self.slots = slots
+        self.slot_size = slot_size
+        # The layout is part of the name: a process with other sizes never resizes a segment in use
+        self.path = os.path.join(directory, f"{name}-{slots}x{slot_size}")
+        self.hits = 0
+        self.misses = 0
+        self.oversized = 0
+        self._write_lock = threading.Lock()
+
+        size = _HEADER_SIZE + slots * slot_size
+        self._fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+
+        # Whole-file lock while checking the layout: the first process to come initializes it
+        fcntl.lockf(self._fd, fcntl.LOCK_EX)
+        try:
+            header = os.pread(self._fd, _HEADER.size, 0)
+            if os.fstat(self._fd).st_size != size or header != _HEADER.pack(_MAGIC, slots, slot_size):
+                os.ftruncate(self._fd, 0)
+                os.ftruncate(self._fd, size)
+                os.pwrite(self._fd, _HEADER.pack(_MAGIC, slots, slot_size), 0)
+        finally:
+            fcntl.lockf(self._fd, fcntl.LOCK_UN)
+
+        self._map = mmap.mmap(self._fd, size, mmap.MAP_SHARED, mmap.PROT_READ | mmap.PROT_WRITE)
+
+    def _offset(self, key_hash: int) -> int:
+        return _HEADER_SIZE + (key_hash % self.slots) * self.slot_size
+
+    def get(self, key, default=None):
+        key_hash = _key_hash(key)
+        offset = self._offset(key_hash)
+
+        for _ in range(SHARED_CACHE_READ_ATTEMPTS):
+            sequence, stored_hash, expires_at, length, _ = _SLOT_HEADER.unpack_from(self._map, offset)
+
+            if sequence & 1:
+                continue
+
+            if stored_hash != key_hash or expires_at <= time.time():
+                break
+
+            start = offset + _SLOT_HEADER_SIZE
+            payload = self._map[start:start + length]
+
+            if _SLOT_HEADER.unpack_from(self._map, offset)[0] != sequence:
+                continue
+
+            try:
+                value = json.loads(payload)
+            except ValueError:
+                continue
+
+            self.hits += 1
+            return value
+
+        self.misses += 1
+        return default
+
+    def generation(self, key) -> int:
+        """
+            Read before loading a value to `set` after a miss.
+        """
+        return _GENERATION.unpack_from(self._map, self._offset(_key_hash(key)) + _GENERATION_OFFSET)[0]
+
+    def set(self, key, value, generation: int | None = None):
+        """
+            With `generation`, the value is dropped if the key's slot was invalidated since it was read.
+        """
+        payload = json.dumps(value, separators=(",", ":")).encode()
+
+        if len(payload) > self.slot_size - _SLOT_HEADER_SIZE:
+            self.oversized += 1
+            # 1st, 2nd, 4th, 8th... time: visible without flooding the log
+            if self.oversized & (self.oversized - 1) == 0:
+                logger.warning("Not cached: %d byte value over the %d byte slots of %s (%d so far)",
+                               len(payload), self.slot_size - _SLOT_HEADER_SIZE, self.path, self.oversized)
+            self.invalidate(key)
+            return
+
+        key_hash = _key_hash(key)
+        offset = self._offset(key_hash)
+
+        with self._locked(offset):
+            if generation is not None and self._generation_at(offset) != generation:
+                return
+
+            self._store(offset, key_hash, time.time() + self.ttl, payload)
+
+    def invalidate(self, key):
+        key_hash = _key_hash(key)
+        offset = self._offset(key_hash)
+
+        with self._locked(offset):
+            # Even when the slot holds another key: a `set` of this one may be under way
+            self._bump_generation(offset)
+
+            # Only clear the slot if it holds this key, not another one hashed to the same slot
+            if _SLOT_HEADER.unpack_from(self._map, offset)[1] == key_hash:
+                self._store(offset, 0, 0.0, b"")
+
+    def clear(self):
+        for index in range(self.slots):
+            offset = _HEADER_SIZE + index * self.slot_size
+
+            with self._locked(offset):
+                self._bump_generation(offset)
+
+                if _SLOT_HEADER.unpack_from(self._map, offset)[1]:
+                    self._store(offset, 0, 0.0, b"")
+
+    @contextmanager
+    def _locked(self, offset: int):
+        with self._write_lock:
+            fcntl.lockf(self._fd, fcntl.LOCK_EX, self.slot_size, offset)
+            try:
+                yield
+            finally:
+                fcntl.lockf(self._fd, fcntl.LOCK_UN, self.slot_size, offset)
+
+    def _generation_at(self, offset: int) -> int:
+        return _GENERATION.unpack_from(self._map, offset + _GENERATION_OFFSET)[0]
+
+    def _bump_generation(self, offset: int):
+        # Readers ignore the generation, so it changes outside the seqlock
+        _GENERATION.pack_into(self._map, offset + _GENERATION_OFFSET, (self._generation_at(offset) + 1) & 0xFFFFFFFF)
+
+    def _store(self, offset: int, key_hash: int, expires_at: float, payload: bytes):
+        # Called with the slot locked
+        sequence = _SLOT_HEADER.unpack_from(self._map, offset)[0]
+        struct.pack_into("<Q", self._map, offset, sequence + 1)
+
+        start = offset + _SLOT_HEADER_SIZE
+        self._map[start:start + len(payload)] = payload
+        struct.pack_into("<QdI", self._map, offset + 8, key_hash, expires_at, len(payload))
+
+        struct.pack_into("<Q", self._map, offset, sequence + 2)
+
+    def __len__(self):
+        now = time.time()
+        count = 0
+
+        for index in range(self.slots):
+            _, key_hash, expires_at, _, _ = _SLOT_HEADER.unpack_from(self._map, _HEADER_SIZE + index * self.slot_size)
+            if key_hash and expires_at > now:
+                count += 1
+
+        return count
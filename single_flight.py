@@ -0,0 +1,151 @@
+import json
+import threading
+
+from fastapi import HTTPException
+from starlette import status
+
+from .tracing import span
+
+
+# Distinct keys in flight at once. Beyond that a read runs on its own, uncoalesced.
+SINGLE_FLIGHT_MAX_KEYS = 10_000
+# Share of the threadpool the requests waiting on one key may hold (each waiter blocks a thread).
+# Beyond that they get a 503, so a hot key leaves threads for everything else.
+SINGLE_FLIGHT_WAITER_SHARE = 0.25
+# anyio's default threadpool size, used until `size_to_threadpool` is told the real one
+DEFAULT_THREADPOOL_SIZE = 40
+# How long a request waits for the read it joined before giving up with a 503
+SINGLE_FLIGHT_TIMEOUT_SECONDS = 10
+
+
+class SingleFlightTimeout(HTTPException):
+    def __init__(self):
+        super().__init__(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Timed out waiting for an identical request",
+            headers={"Retry-After": "1"},
+        )
+
+
+class SingleFlightBusy(HTTPException):
+    def __init__(self):
+        super().__init__(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Too many identical requests in flight",
+            headers={"Retry-After": "1"},
+        )
+
+
+class SingleFlightError(Exception):
+    """
+        The read a waiter joined failed. The leader's exception is the `__cause__`.
+    """
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error: BaseException | None = None
+        self.waiters = 0
+
+
+class SingleFlight:
+    """
+        Coalesces identical concurrent reads: the first caller of a key runs `fn`, callers arriving
+        while it runs wait for its result instead of running `fn` again.
+
+        Only calls that overlap share a result; nothing is kept once the leader returns. A waiter that
+        times out gets a 503 rather than running its own query, so a slow read does not turn a herd
+        of waiters into a herd of queries. So does a caller finding `max_waiters` already waiting:
+        each waiter holds a threadpool thread, and one hot key must not take them all.
+    """
+
+    def __init__(self, max_keys: int = SINGLE_FLIGHT_MAX_KEYS, timeout: float = SINGLE_FLIGHT_TIMEOUT_SECONDS,
+                 max_waiters: int | None = None):
+        self.max_keys = max_keys
+        self.timeout = timeout
+        self.max_waiters = max_waiters
+        if max_waiters is None:
+            self.size_to_threadpool(DEFAULT_THREADPOOL_SIZE)
+        self._calls: dict[tuple, _Call] = {}
+        self._lock = threading.Lock()
+
+    def size_to_threadpool(self, threads: int):
+        """
+            Caps the waiters per key at `SINGLE_FLIGHT_WAITER_SHARE` of the `threads` sync endpoints run on.
+        """
+        self.max_waiters = max(1, int(threads * SINGLE_FLIGHT_WAITER_SHARE))
+
+    def do(self, key: tuple, fn, timeout: float | None = None):
+        leading = False
+
+        with self._lock:
+            call = self._calls.get(key)
+
+            if call is None and len(self._calls) < self.max_keys:
+                call = self._calls[key] = _Call()
+                leading = True
+            elif call is not None:
+                if call.waiters >= self.max_waiters:
+                    raise SingleFlightBusy()
+                call.waiters += 1
+
+        if call is None:
+            return fn()
+
+        if not leading:
+            try:
+                return self._wait(call, self.timeout if timeout is None else timeout)
+            finally:
+                with self._lock:
+                    call.waiters -= 1
+
+        try:
+            call.result = fn()
+        except BaseException as error:
+            call.error = error
+            raise
+        finally:
+            with self._lock:
+                if self._calls.get(key) is call:
+                    del self._calls[key]
+            call.done.set()
+
+        return call.result
+
+    def _wait(self, call: _Call, timeout: float):
+        if not call.done.wait(timeout):
+            raise SingleFlightTimeout()
+
+        if call.error is not None:
+            # A new exception per waiter: raising the leader's own object in many threads would keep
+            # appending every one of their frames to its single traceback
+            if isinstance(call.error, HTTPException):
+                raise HTTPException(status_code=call.error.status_code, detail=call.error.detail,
+                                    headers=call.error.headers) from call.error
+            raise SingleFlightError("The identical request this one joined failed") from call.error
+
+        return call.result
+
+    def forget(self, user_id: int | None):
+        """
+            Call after a write of `user_id`: reads started before it may miss the write, so later
+            requests start a new read instead of joining them. None forgets the reads of every user.
+        """
+        with self._lock:
+            for key in [key for key in self._calls if user_id is None or key[1] == user_id]:
+                del self._calls[key]
+
+    def __len__(self):
+        return len(self._calls)
+
+
+def json_body(content) -> bytes:
+    # Same bytes as FastAPI's default `JSONResponse`, rendered once for every waiter
+    with span("render.json"):
+        return json.dumps(content, ensure_ascii=False, allow_nan=False, indent=None, separators=(",", ":")).encode()
+
+
+# Keys are (route, user id, *query parameters)
+read_flights = SingleFlight()
@@ -0,0 +1,158 @@
+import codecs
+import csv
+import json
+from collections import deque
+from typing import AsyncIterator
+
+from pydantic import ValidationError
+
+
+async def iter_lines(chunks: AsyncIterator[bytes]) -> AsyncIterator[str]:
+    """
+        Splits a streamed upload into lines, each with its "\n", without holding more than one chunk and
+        one partial line.
+    """
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    pending = ""
+
+    async for chunk in chunks:
+        pending += decoder.decode(chunk)
+        *lines, pending = pending.split("\n")
+
+        for line in lines:
+            yield line + "\n"
+
+    pending += decoder.decode(b"", final=True)
+    if pending:
+        yield pending
+
+
+# Where `csv.reader` (the default dialect, not strict) is within a record after a character
+_START_FIELD, _IN_FIELD, _IN_QUOTED_FIELD, _QUOTE_IN_QUOTED_FIELD = range(4)
+
+
+def _scan_quotes(line: str, state: int) -> int:
+    """
+        The state after `line`, by csv's own rules: a quote opens a field only at its start, is doubled
+        inside a quoted field, and is an ordinary character anywhere else.
+    """
+    for char in line:
+        if state == _IN_QUOTED_FIELD:
+            if char == '"':
+                state = _QUOTE_IN_QUOTED_FIELD
+        elif state == _QUOTE_IN_QUOTED_FIELD:
+            state = _IN_QUOTED_FIELD if char == '"' else _START_FIELD if char == "," else _IN_FIELD
+        elif char == ",":
+            state = _START_FIELD
+        elif state == _START_FIELD:
+            state = _IN_QUOTED_FIELD if char == '"' else _IN_FIELD
+
+    return state
+
+
+class _LineFeed:
+    """
+        Iterator a single `csv.reader` pulls its lines from while the upload is still arriving.
+
+        The reader cannot be resumed once its iterator runs dry in the middle of a record, so lines are
+        counted into `complete` records (a line ending outside a quoted field ends one) and the reader
+        is only advanced while a whole record is buffered.
+    """
+    def __init__(self):
+        self.lines = deque()
+        self.complete = 0
+        self.state = _START_FIELD
+
+    def __iter__(self):
+        return self
+
+    def __next__(self) -> str:
+        if not self.lines:
+            raise StopIteration
+        return self.lines.popleft()
+
+    def append(self, line: str):
+        self.lines.append(line)
+
+        # Lines without a quote cannot change whether a quoted field is open
+        if '"' in line:
+            self.state = _scan_quotes(line, self.state)
+
+        if self.state != _IN_QUOTED_FIELD:
+            self.complete += 1
+            self.state = _START_FIELD
+
+
+async def iter_csv_rows(chunks: AsyncIterator[bytes]) -> AsyncIterator[tuple[int, list[str]]]:
+    """
+        Yields (line number, values) for every row of a streamed CSV upload, the line number being the
+        one the row starts on. Quoted fields may span lines, as written by `csv.writer` or `COPY ... CSV`.
+    """
+    feed = _LineFeed()
+    reader = csv.reader(feed)
+
+    async for line in iter_lines(chunks):
+        feed.append(line)
+
+        while feed.complete:
+            feed.complete -= 1
+            line_number = reader.line_num + 1
+            yield line_number, next(reader)
+
+    # Whatever is left, an unterminated quote included, is read as the reader would read a file
+    while True:
+        line_number = reader.line_num + 1
+        try:
+            values = next(reader)
+        except StopIteration:
+            return
+        yield line_number, values
+
+
+async def iter_records(chunks: AsyncIterator[bytes], file_format: str) -> AsyncIterator[tuple[int, dict | None, str | None]]:
+    """
+        Yields (line number, record, error) for every non-empty row of a CSV (with header) or NDJSON upload.
+    """
+    if file_format == "csv":
+        header = None
+
+        async for line_number, values in iter_csv_rows(chunks):
+            if not values or values == [""]:
+                continue
+
+            if header is None:
+                header = values
+                continue
+
+            if len(values) != len(header):
+                yield line_number, None, f"Expected {len(header)} columns, got {len(values)}"
+                continue
+
+            yield line_number, dict(zip(header, values)), None
+        return
+
+    line_number = 0
+
+    async for line in iter_lines(chunks):
+        line_number += 1
+        if not line.strip():
+            continue
+
+        try:
+            record = json.loads(line)
+        except json.JSONDecodeError as error:
+            yield line_number, None, f"Invalid JSON: {error.msg}"
+            continue
+
+        if not isinstance(record, dict):
+            yield line_number, None, "Expected a JSON object"
+            continue
+
+        yield line_number, record, None
+
+
+def format_validation_error(error: ValidationError) -> str:
+    """
+        One-line summary of a pydantic error, for per-row upload reports.
+    """
+    return "; ".join(f"{'.'.join(map(str, e['loc']))}: {e['msg']}" for e in error.errors())
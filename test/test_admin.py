@@ -1,10 +1,31 @@
+import json
+import threading
+import time
+from datetime import timedelta
+
 from fastapi import status
 from .utils import *
-from ..routers.admin import get_db, get_current_user
+from ..routers.admin import get_db, get_shard_dbs, get_current_user
+from ..routers import todos
+from ..archive import archive_completed_todos
+from ..todo_stats import bump_todo_stats, move_todo_stats, rebuild_todo_stats
+from sqlalchemy.orm import Session
+
+
+# A single shard: the test database
+def override_get_shard_dbs():
+    db = TestingSessionLocal()
+    try:
+        yield [db]
+    finally:
+        db.close()
 
 
 app.dependency_overrides[get_db] = override_get_db
+app.dependency_overrides[get_shard_dbs] = override_get_shard_dbs
 app.dependency_overrides[get_current_user] = override_get_current_user
+# Todos are written through the todos router in the stats tests
+app.dependency_overrides[todos.get_db] = override_get_db
 
 
 def test_admin_find_all_authenticated(test_todo):
@@ -15,7 +36,8 @@ def test_admin_find_all_authenticated(test_todo):
         'description': 'Need to watch and practice codes everyday',
         'complete': False,
         'owner_id': 1,
-        'title': 'Learn the python', 'id': 1
+        'title': 'Learn the python', 'id': 1,
+        'version': 1,
     }]
 
 
@@ -28,8 +50,250 @@ def test_admin_delete_todo_authenticated(test_todo):
     assert model is None
 
 
+def test_admin_delete_todo_leaves_tombstone(test_todo):
+    cursor = client.get("/todo/changes").json()["cursor"]
+
+    client.delete("/admin/todo/1")
+
+    response = client.get("/todo/changes", params={"since": cursor})
+    assert response.json()["deleted"] == [1]
+
+
 def test_admin_delete_todo_authenticated_not_found(test_todo):
     response = client.delete("/admin/todo/2")
     assert response.status_code == status.HTTP_404_NOT_FOUND
     assert response.json() == { "detail": "Unable to find the todo" }
 
+
+def test_admin_stats_follow_writes(test_todo):
+    # `test_todo` is inserted directly, so the summary starts from a rebuild
+    db = TestingSessionLocal()
+    rebuild_todo_stats(db)
+    db.commit()
+
+    client.post("/todo/create", json={
+        "title": "new todo",
+        "description": "already done",
+        "priority": 2,
+        "complete": True,
+    })
+    client.put("/todo/1", json={
+        "title": "Learn the python",
+        "description": "Need to watch and practice codes everyday",
+        "priority": 4,
+        "complete": True,
+    })
+
+    response = client.get("/admin/stats")
+    assert response.status_code == status.HTTP_200_OK
+    assert response.json() == {
+        "total": 2,
+        "complete": 2,
+        "incomplete": 0,
+        "by_priority": {"2": 1, "4": 1},
+    }
+
+    client.delete("/admin/todo/1")
+
+    response = client.get("/admin/stats")
+    assert response.json() == {
+        "total": 1,
+        "complete": 1,
+        "incomplete": 0,
+        "by_priority": {"2": 1},
+    }
+
+
+def add_todos(db, rows):
+    for title, priority, complete, owner_id in rows:
+        db.add(Todos(title=title, description="admin listing", priority=priority, complete=complete, owner_id=owner_id))
+    db.commit()
+
+
+def test_admin_find_all_filters(test_todo):
+    db = TestingSessionLocal()
+    db.add(Users(email="jane@example.com", username="jane", is_active=True, role="user"))
+    db.commit()
+    add_todos(db, [("second", 2, True, 1), ("third", 2, False, 2)])
+
+    response = client.get("/admin/todo", params={"owner_id": 2})
+    assert [todo["title"] for todo in response.json()] == ["third"]
+
+    response = client.get("/admin/todo", params={"complete": False, "priority": 2})
+    assert [todo["title"] for todo in response.json()] == ["third"]
+
+
+def test_admin_find_all_sparse_fields(test_todo):
+    response = client.get("/admin/todo", params={"fields": "complete", "limit": 1})
+    assert response.json() == [{"complete": False}]
+    # Paging still works without `id` in the payload
+    assert response.headers["X-Next-Cursor"] == "1"
+
+
+def test_admin_find_all_keyset_paging(test_todo):
+    db = TestingSessionLocal()
+    add_todos(db, [("second", 2, True, 1), ("third", 3, False, 1)])
+
+    response = client.get("/admin/todo", params={"limit": 2})
+    assert [todo["id"] for todo in response.json()] == [1, 2]
+    assert response.headers["X-Next-Cursor"] == "2"
+
+    response = client.get("/admin/todo", params={"limit": 2, "after_id": response.headers["X-Next-Cursor"]})
+    assert [todo["id"] for todo in response.json()] == [3]
+    assert "X-Next-Cursor" not in response.headers
+
+
+def test_admin_find_all_counts(test_todo):
+    db = TestingSessionLocal()
+    add_todos(db, [("second", 2, True, 1)])
+
+    response = client.get("/admin/todo", params={"count": "exact", "limit": 1})
+    assert response.headers["X-Total-Count"] == "2"
+    assert response.headers["X-Total-Count-Mode"] == "exact"
+
+    response = client.get("/admin/todo", params={"count": "cached", "complete": True})
+    assert response.headers["X-Total-Count"] == "1"
+    assert response.headers["X-Total-Count-Mode"] == "cached"
+
+    # Without count the listing never counts
+    response = client.get("/admin/todo")
+    assert "X-Total-Count" not in response.headers
+
+
+def test_admin_find_all_etag_keeps_headers(test_todo):
+    response = client.get("/admin/todo", params={"count": "exact", "limit": 1})
+    assert response.headers["X-Total-Count"] == "1"
+    assert response.headers["X-Next-Cursor"] == "1"
+
+    response = client.get("/admin/todo", params={"count": "exact", "limit": 1},
+                          headers={"If-None-Match": response.headers["ETag"]})
+    assert response.status_code == status.HTTP_304_NOT_MODIFIED
+
+
+def test_admin_find_all_estimated_count(test_todo):
+    db = TestingSessionLocal()
+    rebuild_todo_stats(db)
+    db.commit()
+
+    # Without an owner filter the summary table answers, exactly
+    response = client.get("/admin/todo", params={"count": "estimate"})
+    assert response.headers["X-Total-Count"] == "1"
+    assert response.headers["X-Total-Count-Mode"] == "exact"
+
+    # With one, PostgreSQL's planner estimate is used
+    response = client.get("/admin/todo", params={"count": "estimate", "owner_id": 1})
+    assert response.status_code == status.HTTP_200_OK
+    assert response.headers["X-Total-Count-Mode"] == "estimate"
+    assert int(response.headers["X-Total-Count"]) >= 0
+
+
+def test_admin_import_users_ndjson(test_user):
+    body = "\n".join([
+        json.dumps({"username": "jane", "email": "jane@example.com", "first_name": "Jane", "last_name": "Doe",
+                    "password": "janepassword", "role": "user", "phone_number": "1-222-333-4444"}),
+        json.dumps({"username": "missing_fields"}),
+        "not json",
+        # `john` already exists from `test_user`
+        json.dumps({"username": "john", "email": "other@example.com", "first_name": "John", "last_name": "Doe",
+                    "password": "johnpassword", "role": "user", "phone_number": "1-222-333-4444"}),
+    ])
+
+    response = client.post("/admin/users/import", params={"format": "ndjson", "import_id": "ndjson"}, content=body)
+    assert response.status_code == status.HTTP_200_OK
+    result = response.json()
+    assert result["processed"] == 4
+    assert result["inserted"] == 1
+    assert result["failed"] == 3
+    assert [error["row"] for error in result["errors"]] == [2, 3, 4]
+
+    db = TestingSessionLocal()
+    jane = db.query(Users).filter(Users.username == "jane").first()
+    assert jane.is_active
+    assert bcrypt_context.verify("janepassword", jane.hashed_password)
+
+    response = client.get("/admin/users/import/ndjson")
+    assert response.json()["done"] is True
+
+
+def test_admin_import_users_csv(test_user):
+    body = (
+        "username,email,first_name,last_name,password,role,phone_number\n"
+        "jane,jane@example.com,Jane,Doe,janepassword,user,1-222-333-4444\n"
+        "mike,mike@example.com,Mike,Roe,mikepassword,user,1-555-666-7777\n"
+        "mike,mike2@example.com,Mike,Roe,mikepassword,user,1-555-666-7777\n"
+    )
+
+    response = client.post("/admin/users/import", params={"format": "csv"}, content=body)
+    assert response.status_code == status.HTTP_200_OK
+    assert response.json()["inserted"] == 2
+    # Rows are reported by the line they start on, the header being line 1
+    assert response.json()["errors"] == [{"row": 4, "error": "Username 'mike' already exists"}]
+
+    db = TestingSessionLocal()
+    assert db.query(Users).count() == 3
+
+
+def test_admin_import_users_csv_quoted_newline(test_user):
+    body = (
+        "username,email,first_name,last_name,password,role,phone_number\n"
+        'jane,jane@example.com,Jane,"Doe\nSmith",janepassword,user,1-222-333-4444\n'
+        "mike,mike@example.com,Mike,Roe,mikepassword,user,1-555-666-7777\n"
+    )
+
+    response = client.post("/admin/users/import", params={"format": "csv"}, content=body)
+    assert response.status_code == status.HTTP_200_OK
+    assert response.json()["inserted"] == 2
+    assert response.json()["errors"] == []
+
+    db = TestingSessionLocal()
+    assert db.query(Users).filter(Users.username == "jane").first().last_name == "Doe\nSmith"
+
+
+def test_admin_find_all_include_archived(test_todo):
+    client.patch("/todo/1", json={"complete": True})
+
+    db = TestingSessionLocal()
+    assert archive_completed_todos(db, archive_after=timedelta(0)) == 1
+
+    assert client.get("/admin/todo").json() == []
+
+    response = client.get("/admin/todo", params={"include_archived": True, "count": "exact"})
+    assert [todo["id"] for todo in response.json()] == [1]
+    # Counts cover live todos only
+    assert response.headers["X-Total-Count"] == "0"
+
+
+def test_opposite_stats_moves_do_not_deadlock(test_todo):
+    # Two connections of their own: the test session shares a single one
+    separate = create_engine(SQLALCHEMY_DATABASE_URL)
+    sessions = [Session(bind=separate) for _ in range(2)]
+    both_started = threading.Barrier(2)
+    errors = []
+
+    for db in sessions:
+        bump_todo_stats(db, False, 3, 0)
+        bump_todo_stats(db, True, 3, 0)
+        db.commit()
+
+    def move(db, old_complete, new_complete):
+        try:
+            both_started.wait()
+            move_todo_stats(db, old_complete, 3, new_complete, 3)
+            time.sleep(0.2)
+            db.commit()
+        except Exception as error:
+            errors.append(error)
+            db.rollback()
+
+    threads = [threading.Thread(target=move, args=(sessions[0], False, True)),
+               threading.Thread(target=move, args=(sessions[1], True, False))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    for db in sessions:
+        db.close()
+    separate.dispose()
+
+    assert errors == []
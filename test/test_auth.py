@@ -5,6 +5,7 @@ from jose import jwt
 
 from .utils import *
 from ..routers.auth import get_db, authenticate_user, create_access_token, ALGORITHM, SECRET_KEY, get_current_user
+from ..models import RefreshTokens
 
 
 app.dependency_overrides[get_db] = override_get_db
@@ -75,4 +76,58 @@ async def test_get_current_user_invalid(test_user):
     with pytest.raises(HTTPException) as excinfig:
         await get_current_user(token=token)
         assert excinfig.value.status_code == 401
-        assert excinfig.value.detail == "Could not validate the user"
\ No newline at end of file
+        assert excinfig.value.detail == "Could not validate the user"
+
+
+def login(test_user):
+    response = client.post("/auth/token", data={"username": test_user.username, "password": "hashpassword"})
+    assert response.status_code == 200
+
+    return response.json()
+
+
+def test_login_issues_hashed_refresh_token(test_user):
+    tokens = login(test_user)
+    assert tokens.get("refresh_token")
+
+    db = TestingSessionLocal()
+    stored = db.query(RefreshTokens).first()
+    # Only the hash is stored
+    assert stored.token_hash != tokens.get("refresh_token")
+    assert stored.user_id == test_user.id
+
+
+def test_refresh_rotates_token(test_user):
+    tokens = login(test_user)
+
+    response = client.post("/auth/refresh", json={"refresh_token": tokens.get("refresh_token")})
+    assert response.status_code == 200
+    refreshed = response.json()
+    assert refreshed.get("refresh_token") != tokens.get("refresh_token")
+
+    user = jwt.decode(refreshed.get("access_token"), SECRET_KEY, algorithms=[ALGORITHM])
+    assert user.get("id") == test_user.id
+    assert user.get("sub") == test_user.username
+
+
+def test_refresh_reuse_revokes_family(test_user):
+    tokens = login(test_user)
+    refreshed = client.post("/auth/refresh", json={"refresh_token": tokens.get("refresh_token")}).json()
+
+    # Replaying the rotated token is treated as theft
+    response = client.post("/auth/refresh", json={"refresh_token": tokens.get("refresh_token")})
+    assert response.status_code == 401
+
+    # ...so the newest token of that user is revoked as well
+    response = client.post("/auth/refresh", json={"refresh_token": refreshed.get("refresh_token")})
+    assert response.status_code == 401
+
+
+def test_revoke_refresh_token(test_user):
+    tokens = login(test_user)
+
+    response = client.post("/auth/revoke", json={"refresh_token": tokens.get("refresh_token")})
+    assert response.status_code == 204
+
+    response = client.post("/auth/refresh", json={"refresh_token": tokens.get("refresh_token")})
+    assert response.status_code == 401
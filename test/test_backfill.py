@@ -0,0 +1,48 @@
+import pytest
+from sqlalchemy import Column, Integer, MetaData, String, Table, create_engine, insert, select
+
+from .. import backfill as backfill_module
+from ..backfill import backfill, backfill_checkpoints
+
+
+@pytest.fixture
+def people(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'backfill.db'}")
+    metadata = MetaData()
+    table = Table("people", metadata, Column("id", Integer, primary_key=True), Column("nickname", String))
+    metadata.create_all(engine)
+
+    with engine.begin() as connection:
+        connection.execute(insert(table), [{"id": i, "nickname": None} for i in range(1, 26)])
+
+    yield engine, table
+    engine.dispose()
+
+
+def test_backfill_in_chunks(people):
+    engine, table = people
+
+    assert backfill(engine, table, {"nickname": "n/a"}, where=table.c.nickname.is_(None), batch_size=10, pause=0) == 25
+
+    with engine.connect() as connection:
+        assert connection.execute(select(table.c.nickname).distinct()).scalars().all() == ["n/a"]
+        # Finished backfills leave no checkpoint behind
+        assert connection.execute(select(backfill_checkpoints)).all() == []
+
+
+def test_backfill_resumes_after_interruption(people, monkeypatch):
+    engine, table = people
+
+    def interrupt(seconds):
+        raise KeyboardInterrupt
+
+    monkeypatch.setattr(backfill_module.time, "sleep", interrupt)
+    with pytest.raises(KeyboardInterrupt):
+        backfill(engine, table, {"nickname": "n/a"}, batch_size=10)
+
+    with engine.connect() as connection:
+        assert connection.execute(select(backfill_checkpoints.c.last_key, backfill_checkpoints.c.rows_done)).all() == [(10, 10)]
+
+    monkeypatch.undo()
+    # Only the rows after the checkpoint are updated again
+    assert backfill(engine, table, {"nickname": "n/a"}, batch_size=10, pause=0) == 15
@@ -0,0 +1,104 @@
+from fastapi import status
+
+from ..routers.batch import get_db, get_user_db, get_current_user
+from ..models import TodoStats
+from .utils import *
+
+
+app.dependency_overrides[get_db] = override_get_db
+app.dependency_overrides[get_user_db] = override_get_db
+app.dependency_overrides[get_current_user] = override_get_current_user
+
+
+NEW_TODO = {
+    "title": "Batched todo",
+    "description": "Created in a batch",
+    "priority": 2,
+    "complete": False,
+}
+
+
+def test_batch_runs_operations_in_order(test_todo):
+    response = client.post("/batch/", json={"operations": [
+        {"op": "create", "body": NEW_TODO},
+        {"op": "patch", "todo_id": 1, "version": 1, "body": {"complete": True}},
+        {"op": "get", "todo_id": 1},
+        {"op": "me"},
+    ]})
+    assert response.status_code == status.HTTP_200_OK
+
+    body = response.json()
+    assert body["committed"] is True
+    assert [result["status"] for result in body["results"]] == [201, 204, 200, 200]
+    assert body["results"][1]["etag"] == '"2"'
+    # Later operations see the earlier ones
+    assert body["results"][2]["body"]["complete"] is True
+    assert body["results"][3]["body"]["username"] == "john"
+
+    db = TestingSessionLocal()
+    assert db.query(Todos).count() == 2
+
+
+def test_batch_atomic_rolls_back_everything(test_todo):
+    response = client.post("/batch/", json={"operations": [
+        {"op": "create", "body": NEW_TODO},
+        {"op": "delete", "todo_id": 99},
+        {"op": "delete", "todo_id": 1},
+    ]})
+
+    body = response.json()
+    assert body["committed"] is False
+    assert [result["status"] for result in body["results"]] == [424, 404, 424]
+
+    db = TestingSessionLocal()
+    assert db.query(Todos).count() == 1
+
+
+def test_batch_independent_keeps_successful_operations(test_todo):
+    response = client.post("/batch/", json={"mode": "independent", "operations": [
+        {"op": "create", "body": NEW_TODO},
+        {"op": "update", "todo_id": 1, "version": 7, "body": NEW_TODO},
+        {"op": "create", "body": {"title": "x"}},
+        {"op": "delete", "todo_id": 1},
+    ]})
+
+    body = response.json()
+    assert body["committed"] is True
+    assert [result["status"] for result in body["results"]] == [201, 412, 422, 204]
+
+    db = TestingSessionLocal()
+    assert [todo.title for todo in db.query(Todos).all()] == ["Batched todo"]
+    # Stats follow the committed operations only
+    assert db.query(TodoStats.count).filter(TodoStats.complete.is_(False), TodoStats.priority == 2).scalar() == 1
+
+
+def test_batch_atomic_bumps_stats_once_with_one_change_seq(test_todo):
+    response = client.post("/batch/", json={"operations": [
+        {"op": "create", "body": NEW_TODO},
+        {"op": "patch", "todo_id": 1, "body": {"complete": True}},
+        {"op": "update", "todo_id": 1, "version": 2, "body": NEW_TODO},
+    ]})
+    assert [result["status"] for result in response.json()["results"]] == [201, 204, 204]
+
+    db = TestingSessionLocal()
+    # Every write of the batch shares one change sequence number
+    assert len({todo.updated_seq for todo in db.query(Todos)}) == 1
+
+    # The fixture todo left (False, 4) and ended in (False, 2); the patch in between nets out
+    counts = {(row.complete, row.priority): row.count for row in db.query(TodoStats)}
+    assert counts.get((False, 4), 0) == -1
+    assert counts.get((False, 2), 0) == 2
+    assert counts.get((True, 4), 0) == 0
+
+
+def test_batch_independent_commits_each_write(test_todo):
+    response = client.post("/batch/", json={"mode": "independent", "operations": [
+        {"op": "create", "body": NEW_TODO},
+        {"op": "delete", "todo_id": 99},
+        {"op": "create", "body": NEW_TODO},
+    ]})
+    assert [result["status"] for result in response.json()["results"]] == [201, 404, 201]
+
+    db = TestingSessionLocal()
+    # Two commits, two change sequence numbers
+    assert len({todo.updated_seq for todo in db.query(Todos).filter(Todos.id > 1)}) == 2
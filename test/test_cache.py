@@ -0,0 +1,76 @@
+import os
+import time
+
+from ..cache import TTLCache, UserCache
+
+
+def test_ttl_cache_get_and_set():
+    cache = TTLCache(ttl=60)
+    cache.set(1, {"username": "john"})
+
+    assert cache.get(1) == {"username": "john"}
+    assert cache.get(2) is None
+
+
+def test_ttl_cache_expires():
+    cache = TTLCache(ttl=0.01)
+    cache.set(1, "john")
+    time.sleep(0.02)
+
+    assert cache.get(1) is None
+    assert len(cache) == 0
+
+
+def test_ttl_cache_evicts_least_recently_used():
+    cache = TTLCache(ttl=60, maxsize=2)
+    cache.set(1, "a")
+    cache.set(2, "b")
+    # Touch `1` so that `2` becomes the oldest entry
+    cache.get(1)
+    cache.set(3, "c")
+
+    assert cache.get(1) == "a"
+    assert cache.get(2) is None
+    assert cache.get(3) == "c"
+
+
+def test_ttl_cache_invalidate():
+    cache = TTLCache(ttl=60)
+    cache.set(1, "john")
+    cache.invalidate(1)
+
+    assert cache.get(1) is None
+
+
+def test_ttl_cache_drops_a_set_started_before_an_invalidation():
+    cache = TTLCache(ttl=60)
+
+    generation = cache.generation(1)
+    cache.invalidate(1)
+    cache.set(1, "stale", generation)
+    assert cache.get(1) is None
+
+    cache.set(1, "fresh", cache.generation(1))
+    assert cache.get(1) == "fresh"
+
+
+def test_user_cache_segment_is_keyed_by_database():
+    first = UserCache().configure("shared", database_url="postgresql://localhost/first")
+    second = UserCache().configure("shared", database_url="postgresql://localhost/second")
+
+    try:
+        assert first.backend.path != second.backend.path
+
+        first.set(1, {"username": "john"})
+        assert second.get(1) is None
+    finally:
+        os.remove(first.backend.path)
+        os.remove(second.backend.path)
+
+
+def test_user_cache_local_backend():
+    cache = UserCache().configure("local")
+    cache.set(1, {"username": "john"})
+
+    assert isinstance(cache.backend, TTLCache)
+    assert cache.get(1) == {"username": "john"}
@@ -0,0 +1,100 @@
+import gzip
+
+from fastapi import FastAPI, Response
+from fastapi.responses import StreamingResponse
+from fastapi.testclient import TestClient
+
+from .. import compression
+from ..compression import CompressionMiddleware, choose_encoding, compressed_cache, content_etag
+
+
+# A bare app: the middleware is tested on its own, without a database
+compression_app = FastAPI()
+compression_app.add_middleware(CompressionMiddleware, minimum_size=100)
+
+LARGE = [{"id": index, "title": "Learn the python", "complete": False} for index in range(50)]
+
+
+@compression_app.get("/large")
+def large(response: Response):
+    response.headers["ETag"] = '"1"'
+    return LARGE
+
+
+@compression_app.get("/listing")
+def listing(response: Response):
+    response.headers["ETag"] = content_etag(b"listing")
+    return LARGE
+
+
+@compression_app.get("/small")
+def small():
+    return {"status": "Healthy"}
+
+
+@compression_app.get("/stream")
+def stream():
+    return StreamingResponse((f"row {index}\n" for index in range(100)), media_type="text/csv")
+
+
+compression_client = TestClient(compression_app)
+
+
+def test_choose_encoding():
+    assert choose_encoding("gzip") == "gzip"
+    assert choose_encoding("gzip;q=0, identity") is None
+    assert choose_encoding("*") is not None
+    assert choose_encoding("deflate") is None
+
+
+def test_large_body_is_compressed_with_weak_etag():
+    compressed_cache.clear()
+
+    response = compression_client.get("/large", headers={"Accept-Encoding": "gzip"})
+    assert response.headers["Content-Encoding"] == "gzip"
+    assert response.headers["Vary"] == "Accept-Encoding"
+    assert response.headers["ETag"] == 'W/"1"'
+    # httpx decodes the body transparently
+    assert response.json() == LARGE
+    assert len(compressed_cache) == 1
+
+    # Same payload again: served from the cache
+    compression_client.get("/large", headers={"Accept-Encoding": "gzip"})
+    assert len(compressed_cache) == 1
+
+
+def test_small_body_is_not_compressed():
+    response = compression_client.get("/small", headers={"Accept-Encoding": "gzip"})
+    assert "Content-Encoding" not in response.headers
+    assert response.json() == {"status": "Healthy"}
+
+
+def test_identity_when_not_accepted():
+    response = compression_client.get("/large", headers={"Accept-Encoding": "identity"})
+    assert "Content-Encoding" not in response.headers
+    assert response.headers["ETag"] == '"1"'
+
+
+def test_streaming_body_is_compressed_incrementally():
+    with compression_client.stream("GET", "/stream", headers={"Accept-Encoding": "gzip"}) as response:
+        assert response.headers["Content-Encoding"] == "gzip"
+        assert "Content-Length" not in response.headers
+        raw = b"".join(response.iter_raw())
+
+    assert gzip.decompress(raw).decode() == "".join(f"row {index}\n" for index in range(100))
+
+
+def test_content_etag_is_the_cache_key():
+    compressed_cache.clear()
+
+    compression_client.get("/listing", headers={"Accept-Encoding": "gzip"})
+    assert compressed_cache.get(("gzip", content_etag(b"listing").encode())) is not None
+
+
+def test_large_compressed_body_is_not_cached(monkeypatch):
+    compressed_cache.clear()
+    monkeypatch.setattr(compression, "COMPRESSED_CACHE_MAX_ENTRY_BYTES", 16)
+
+    response = compression_client.get("/large", headers={"Accept-Encoding": "gzip"})
+    assert response.json() == LARGE
+    assert len(compressed_cache) == 0
@@ -0,0 +1,111 @@
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from ..database import (
+    Base,
+    RoutingSession,
+    ReplicaSet,
+    StickyWindow,
+    read_only_request,
+    current_user_id,
+)
+from ..models import Todos, Users
+
+
+"""
+    Primary/replica routing with two local SQLite files.
+    Each file gets a todo with a different title so we can tell which one answered.
+"""
+
+
+def make_database(path, title):
+    engine = create_engine(f"sqlite:///{path}")
+    Base.metadata.create_all(bind=engine)
+
+    with sessionmaker(bind=engine)() as db:
+        db.add(Users(username="john", email="john@example.com", is_active=True, role="admin"))
+        db.add(Todos(title=title, description="routing", priority=1, complete=False, owner_id=1))
+        db.commit()
+
+    return engine
+
+
+def make_session_factory(tmp_path, replica_path=None, sticky_seconds=5):
+    primary = make_database(tmp_path / "primary.db", "primary")
+    replica = make_database(replica_path or tmp_path / "replica.db", "replica")
+
+    return sessionmaker(
+        class_=RoutingSession,
+        bind=primary,
+        replicas=ReplicaSet([replica]),
+        sticky=StickyWindow(sticky_seconds),
+    )
+
+
+def read_title(session_factory):
+    with session_factory() as db:
+        return db.query(Todos.title).filter(Todos.id == 1).scalar()
+
+
+def test_read_only_request_uses_replica(tmp_path):
+    session_factory = make_session_factory(tmp_path)
+
+    token = read_only_request.set(True)
+    try:
+        assert read_title(session_factory) == "replica"
+    finally:
+        read_only_request.reset(token)
+
+    # Not marked read-only: stays on the primary
+    assert read_title(session_factory) == "primary"
+
+
+def test_user_is_sticky_to_primary_after_write(tmp_path):
+    session_factory = make_session_factory(tmp_path)
+    user_token = current_user_id.set(1)
+
+    try:
+        with session_factory() as db:
+            db.add(Todos(title="new", description="routing", priority=1, complete=False, owner_id=1))
+            db.commit()
+
+        token = read_only_request.set(True)
+        try:
+            assert read_title(session_factory) == "primary"
+        finally:
+            read_only_request.reset(token)
+    finally:
+        current_user_id.reset(user_token)
+
+    # Another user is not affected by the stickiness of user 1
+    user_token = current_user_id.set(2)
+    token = read_only_request.set(True)
+    try:
+        assert read_title(session_factory) == "replica"
+    finally:
+        read_only_request.reset(token)
+        current_user_id.reset(user_token)
+
+
+def test_unhealthy_replica_falls_back_to_primary(tmp_path):
+    primary = make_database(tmp_path / "primary.db", "primary")
+    # SQLite cannot open a file inside a directory that does not exist
+    broken_replica = create_engine(f"sqlite:///{tmp_path / 'missing' / 'replica.db'}")
+    session_factory = sessionmaker(class_=RoutingSession, bind=primary, replicas=ReplicaSet([broken_replica]))
+
+    token = read_only_request.set(True)
+    try:
+        assert read_title(session_factory) == "primary"
+    finally:
+        read_only_request.reset(token)
+
+
+def test_replica_set_round_robin(tmp_path):
+    first = create_engine(f"sqlite:///{tmp_path / 'first.db'}")
+    second = create_engine(f"sqlite:///{tmp_path / 'second.db'}")
+    replicas = ReplicaSet([first, second])
+
+    assert [replicas.choose() for _ in range(4)] == [first, second, first, second]
+
+    replicas.mark_down(first)
+    assert [replicas.choose() for _ in range(2)] == [second, second]
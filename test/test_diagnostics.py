@@ -0,0 +1,57 @@
+from fastapi import status
+
+from ..memory_diagnostics import allocation_tracer
+from ..routers.diagnostics import get_current_user
+from .utils import *
+
+
+app.dependency_overrides[get_current_user] = override_get_current_user
+
+
+def test_snapshot_diff_shows_where_memory_grew():
+    assert client.post("/admin/diagnostics/memory/snapshots").status_code == status.HTTP_409_CONFLICT
+
+    try:
+        assert client.post("/admin/diagnostics/memory/start", params={"frames": 5}).json()["tracing"] is True
+        first = client.post("/admin/diagnostics/memory/snapshots").json()["id"]
+
+        held = [bytearray(1024) for _ in range(2000)]
+        second = client.post("/admin/diagnostics/memory/snapshots").json()["id"]
+
+        response = client.get(f"/admin/diagnostics/memory/snapshots/{first}/diff/{second}")
+        assert response.status_code == status.HTTP_200_OK
+        assert response.json()[0]["file"] == __file__
+        assert response.json()[0]["size_diff"] >= 2000 * 1024
+        del held
+
+        assert client.get(f"/admin/diagnostics/memory/snapshots/{first}/diff/99").status_code == 404
+    finally:
+        stopped = client.post("/admin/diagnostics/memory/stop").json()
+
+    assert stopped["tracing"] is False
+    assert stopped["snapshots"] == []
+    assert allocation_tracer.status()["tracing"] is False
+
+
+def test_sessions_and_pools_are_reported(test_todo):
+    db = TestingSessionLocal()
+    try:
+        db.query(Todos).all()
+
+        sessions = client.get("/admin/diagnostics/sessions").json()
+        assert sessions["sessions"] >= 1
+        assert sessions["identity_map_objects"] >= 1
+    finally:
+        db.close()
+
+    pools = client.get("/admin/diagnostics/pools").json()
+    assert pools[0]["url"].startswith("postgresql://root:***@")
+    assert "status" in pools[0]
+
+
+def test_diagnostics_require_admin():
+    app.dependency_overrides[get_current_user] = lambda: {"username": "jane", "id": 2, "role": "user"}
+    try:
+        assert client.get("/admin/diagnostics/pools").status_code == status.HTTP_401_UNAUTHORIZED
+    finally:
+        app.dependency_overrides[get_current_user] = override_get_current_user
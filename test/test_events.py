@@ -0,0 +1,112 @@
+import asyncio
+import threading
+
+import pytest
+
+from .. import events
+from ..events import EventBus, PostgresNotifyBackend, UnixSocketBackend, todo_events, format_sse
+from ..routers.todos import get_db, get_current_user
+from .utils import *
+
+
+app.dependency_overrides[get_db] = override_get_db
+app.dependency_overrides[get_current_user] = override_get_current_user
+
+
+@pytest.mark.asyncio
+async def test_event_bus_delivers_to_owner_only():
+    bus = EventBus()
+    john = bus.subscribe(1)
+    jane = bus.subscribe(2)
+
+    # Handlers publish from the thread pool, not from the event loop
+    thread = threading.Thread(target=bus.publish, args=("created", 1), kwargs={"todo_id": 7})
+    thread.start()
+    thread.join()
+
+    event = await asyncio.wait_for(john.get(), timeout=1)
+    assert event == {"type": "created", "owner_id": 1, "todo_id": 7}
+    assert jane.queue.empty()
+
+
+@pytest.mark.asyncio
+async def test_slow_subscriber_gets_resync():
+    bus = EventBus()
+    subscription = bus.subscribe(1, maxsize=2)
+
+    for todo_id in range(5):
+        bus.publish("updated", 1, todo_id=todo_id)
+    # Let the `call_soon_threadsafe` callbacks run
+    await asyncio.sleep(0)
+
+    assert subscription.queue.qsize() <= 2
+    events = [subscription.queue.get_nowait() for _ in range(subscription.queue.qsize())]
+    assert {"type": "resync", "owner_id": 1} in events
+    assert subscription.dropped > 0
+
+
+@pytest.mark.asyncio
+async def test_unix_socket_backend_reaches_other_workers(tmp_path):
+    # Two buses on one socket directory stand in for two workers
+    first_worker = EventBus(UnixSocketBackend(str(tmp_path)))
+    second_worker = EventBus(UnixSocketBackend(str(tmp_path)))
+
+    try:
+        subscription = second_worker.subscribe(1)
+        first_worker.publish("deleted", 1, todo_id=3)
+
+        event = await asyncio.wait_for(subscription.get(), timeout=2)
+        assert event == {"type": "deleted", "owner_id": 1, "todo_id": 3}
+    finally:
+        first_worker.backend.close()
+        second_worker.backend.close()
+
+
+@pytest.mark.asyncio
+async def test_todo_writes_publish_events(test_todo):
+    subscription = todo_events.subscribe(1)
+
+    try:
+        # TestClient runs the app in its own thread, like a worker's thread pool
+        await asyncio.to_thread(client.patch, "/todo/1", json={"complete": True})
+        await asyncio.to_thread(client.delete, "/todo/1")
+
+        updated = await asyncio.wait_for(subscription.get(), timeout=1)
+        deleted = await asyncio.wait_for(subscription.get(), timeout=1)
+    finally:
+        todo_events.unsubscribe(subscription)
+
+    assert updated == {"type": "updated", "owner_id": 1, "todo_id": 1, "version": 2}
+    assert deleted == {"type": "deleted", "owner_id": 1, "todo_id": 1}
+
+
+def test_format_sse():
+    assert format_sse({"type": "deleted", "owner_id": 1, "todo_id": 3}) == (
+        'event: deleted\ndata: {"type": "deleted", "owner_id": 1, "todo_id": 3}\n\n'
+    )
+
+
+@pytest.mark.asyncio
+async def test_postgres_backend_reconnects_and_resyncs(monkeypatch):
+    monkeypatch.setattr(events, "EVENTS_RECONNECT_MIN_SECONDS", 0.05)
+    bus = EventBus(PostgresNotifyBackend(SQLALCHEMY_DATABASE_URL, channel="todo_events_test"))
+    subscription = bus.subscribe(1)
+    backend = bus.backend
+
+    try:
+        # Drop both connections of the worker, as a database restart would
+        with engine.connect() as connection:
+            connection.execute(text("SELECT pg_terminate_backend(pid) FROM unnest(CAST(:pids AS int[])) AS pid"),
+                               {"pids": [backend._listener.get_backend_pid(), backend._publisher.get_backend_pid()]})
+
+        # Whatever was sent while the listener was down is lost
+        event = await asyncio.wait_for(subscription.get(), timeout=5)
+        assert event == {"type": "resync", "owner_id": 1}
+
+        # The publisher reconnects on its own, and the listener hears it again
+        await asyncio.to_thread(bus.publish, "deleted", 1, todo_id=3)
+        event = await asyncio.wait_for(subscription.get(), timeout=5)
+        assert event == {"type": "deleted", "owner_id": 1, "todo_id": 3}
+    finally:
+        bus.unsubscribe(subscription)
+        backend.close()
@@ -0,0 +1,135 @@
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from fastapi import status
+import pytest
+
+from .. import group_commit
+from ..group_commit import GroupCommitUnavailable, GroupCommitWriter, enable_group_commit, disable_group_commit
+from ..routers.todos import get_db, get_current_user
+from ..todo_stats import summarize_todo_stats
+from ..models import TodoStats
+from ..database import StickyWindow
+from .utils import *
+
+
+app.dependency_overrides[get_db] = override_get_db
+app.dependency_overrides[get_current_user] = override_get_current_user
+
+
+def new_todo(title: str, owner_id: int = 1) -> dict:
+    return {
+        "title": title,
+        "description": "group commit",
+        "priority": 3,
+        "complete": False,
+        "owner_id": owner_id,
+    }
+
+
+def test_group_commit_create_todo(test_todo):
+    enable_group_commit(TestingSessionLocal, max_delay=0.05)
+
+    try:
+        request_data = {"title": "new todo", "description": "through the writer", "priority": 5, "complete": False}
+
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            responses = list(pool.map(lambda _: client.post("/todo/create", json=request_data), range(8)))
+    finally:
+        disable_group_commit()
+
+    assert all(response.status_code == status.HTTP_201_CREATED for response in responses)
+
+    db = TestingSessionLocal()
+    assert db.query(Todos).filter(Todos.title == "new todo").count() == 8
+    assert db.query(TodoStats.count).filter(TodoStats.priority == 5).scalar() == 8
+
+
+def test_group_commit_isolates_failing_rows(test_todo):
+    writer = GroupCommitWriter(TestingSessionLocal, max_delay=0.2)
+    writer.start()
+
+    try:
+        futures = [
+            writer.submit(new_todo("first")),
+            # No user 999: violates the foreign key
+            writer.submit(new_todo("broken", owner_id=999)),
+            writer.submit(new_todo("third")),
+        ]
+        ids = [futures[0].result(), futures[2].result()]
+
+        with pytest.raises(Exception):
+            futures[1].result()
+    finally:
+        writer.stop()
+
+    db = TestingSessionLocal()
+    titles = {todo.id: todo.title for todo in db.query(Todos).filter(Todos.id.in_(ids))}
+    assert titles == {ids[0]: "first", ids[1]: "third"}
+
+    rows = db.query(TodoStats.complete, TodoStats.priority, TodoStats.count).all()
+    assert summarize_todo_stats(rows)["total"] == 2
+
+
+def test_group_commit_survives_flush_errors(test_todo, monkeypatch):
+    writer = GroupCommitWriter(TestingSessionLocal, max_delay=0.01)
+    writer.start()
+
+    def broken_flush(batch):
+        raise RuntimeError("rollback failed on a dropped connection")
+
+    try:
+        with monkeypatch.context() as patch:
+            patch.setattr(writer, "_flush", broken_flush)
+
+            with pytest.raises(RuntimeError):
+                writer.submit(new_todo("lost")).result(timeout=5)
+
+        # The thread is still alive and serves the next batch
+        assert writer.submit(new_todo("saved")).result(timeout=5) > 0
+    finally:
+        writer.stop()
+
+    with pytest.raises(GroupCommitUnavailable):
+        writer.submit(new_todo("too late")).result(timeout=5)
+
+
+def test_group_commit_create_todo_times_out_with_503(test_todo, monkeypatch):
+    # A writer that never answers
+    monkeypatch.setattr(group_commit, "todo_writer", GroupCommitWriter(TestingSessionLocal))
+    monkeypatch.setattr(group_commit.todo_writer, "submit", lambda values: Future())
+    monkeypatch.setattr(group_commit, "GROUP_COMMIT_RESULT_TIMEOUT_SECONDS", 0.01)
+
+    request_data = {"title": "new todo", "description": "through the writer", "priority": 5, "complete": False}
+    response = client.post("/todo/create", json=request_data)
+    assert response.status_code == status.HTTP_503_SERVICE_UNAVAILABLE
+
+
+def test_group_commit_create_todo_sticks_to_primary(test_todo, monkeypatch):
+    sticky = StickyWindow()
+    monkeypatch.setattr(group_commit, "sticky_writes", sticky)
+    enable_group_commit(TestingSessionLocal, max_delay=0.01)
+
+    try:
+        request_data = {"title": "new todo", "description": "through the writer", "priority": 5, "complete": False}
+        response = client.post("/todo/create", json=request_data)
+    finally:
+        disable_group_commit()
+
+    assert response.status_code == status.HTTP_201_CREATED
+    # The insert ran on the writer thread, yet the owner's next reads go to the primary
+    assert sticky.is_sticky(1)
+
+
+def test_group_commit_create_todo_rejected_row_is_409(test_todo):
+    # No user 999: the row violates the foreign key and fails on its own
+    app.dependency_overrides[get_current_user] = lambda: {"username": "ghost", "id": 999, "role": "user"}
+    enable_group_commit(TestingSessionLocal, max_delay=0.01)
+
+    try:
+        request_data = {"title": "new todo", "description": "through the writer", "priority": 5, "complete": False}
+        response = client.post("/todo/create", json=request_data)
+    finally:
+        disable_group_commit()
+        app.dependency_overrides[get_current_user] = override_get_current_user
+
+    assert response.status_code == status.HTTP_409_CONFLICT
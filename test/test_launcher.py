@@ -0,0 +1,12 @@
+import os
+
+from ..launcher import default_workers, worker_memory
+
+
+def test_default_workers_is_bounded_by_usable_cpus():
+    assert 1 <= default_workers() <= (os.cpu_count() or 1)
+
+
+def test_worker_memory_reads_proc():
+    memory = worker_memory(os.getpid())
+    assert memory["VmRSS"] > 0
@@ -0,0 +1,65 @@
+import io
+import json
+import logging
+import queue
+
+from ..log_config import JsonFormatter, NonBlockingQueueHandler, SamplingFilter, log_counters, request_id
+from .utils import client
+
+
+def make_logger(name: str, handler: logging.Handler) -> logging.Logger:
+    logger = logging.getLogger(name)
+    logger.handlers = [handler]
+    logger.propagate = False
+    logger.setLevel(logging.DEBUG)
+    return logger
+
+
+def test_records_are_json_with_request_id():
+    log_queue = queue.Queue()
+    logger = make_logger("test.log_config.json", NonBlockingQueueHandler(log_queue))
+
+    token = request_id.set("abc123")
+    try:
+        logger.info("hello %s", "world", extra={"user_id": 7})
+    finally:
+        request_id.reset(token)
+
+    stream = io.StringIO()
+    writer = logging.StreamHandler(stream)
+    writer.setFormatter(JsonFormatter())
+    writer.handle(log_queue.get_nowait())
+
+    entry = json.loads(stream.getvalue())
+    assert entry["message"] == "hello world"
+    assert entry["request_id"] == "abc123"
+    assert entry["user_id"] == 7
+    assert entry["level"] == "INFO"
+
+
+def test_full_queue_drops_instead_of_blocking():
+    logger = make_logger("test.log_config.full", NonBlockingQueueHandler(queue.Queue(maxsize=1)))
+    dropped = log_counters.snapshot()["dropped"]
+
+    for index in range(3):
+        logger.info("record %d", index)
+
+    assert log_counters.snapshot()["dropped"] == dropped + 2
+
+
+def test_sampling_keeps_warnings():
+    log_queue = queue.Queue()
+    handler = NonBlockingQueueHandler(log_queue)
+    handler.addFilter(SamplingFilter({"test.log_config": 0.0}))
+    logger = make_logger("test.log_config.sampled", handler)
+
+    logger.info("sampled out")
+    logger.warning("kept")
+
+    assert [record.msg for record in list(log_queue.queue)] == ["kept"]
+
+
+def test_response_echoes_request_id():
+    response = client.get("/healthy", headers={"X-Request-ID": "req-1"})
+    assert response.headers["X-Request-ID"] == "req-1"
+    assert client.get("/healthy").headers["X-Request-ID"]
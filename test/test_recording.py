@@ -0,0 +1,75 @@
+import json
+
+from .. import recording
+from ..benchmarks.replay import replay
+from ..recording import RecordingMiddleware, TrafficRecorder, pseudonym
+from ..routers.auth import ACCESS_TOKEN_EXPIRES, create_access_token
+from ..routers.todos import get_db, get_current_user
+from .utils import *
+
+
+app.dependency_overrides[get_db] = override_get_db
+app.dependency_overrides[get_current_user] = override_get_current_user
+
+
+def test_recorded_requests_are_anonymized(test_todo, tmp_path, monkeypatch):
+    monkeypatch.setattr(recording, "RECORD_PSEUDONYM_KEY", b"deployment secret")
+    recorder = TrafficRecorder(str(tmp_path / "traffic.ndjson"))
+    recording_client = TestClient(RecordingMiddleware(app, sample_rate=1.0, recorder=recorder))
+    token = create_access_token("john", 1, "admin", ACCESS_TOKEN_EXPIRES)
+
+    recording_client.post("/todo/create", json={"title": "Buy some milk", "description": "Two bottles of it",
+                                                "priority": 3, "complete": False})
+    recording_client.get(f"/todo/{test_todo.id}?fields=title&secret=abc",
+                         headers={"Authorization": f"Bearer {token}"})
+    recorder.flush()
+
+    created, read = [json.loads(line) for line in (tmp_path / "traffic.ndjson").read_text().splitlines()]
+
+    assert created["route"] == "/todo/create"
+    assert created["status"] == 201
+    assert created["body"] == {"title": "x" * 13, "description": "x" * 17, "priority": 3, "complete": False}
+
+    assert read["route"] == "/todo/{todo_id}"
+    assert read["query"] == {"fields": "title", "secret": "xxx"}
+    assert read["user"] == pseudonym(1)
+    assert read["role"] == "admin"
+    assert read["body"] is None
+
+
+def test_nothing_is_recorded_without_a_pseudonym_key(test_todo, tmp_path, monkeypatch):
+    monkeypatch.setattr(recording, "RECORD_PSEUDONYM_KEY", None)
+    recorder = TrafficRecorder(str(tmp_path / "traffic.ndjson"))
+    recording_client = TestClient(RecordingMiddleware(app, sample_rate=1.0, recorder=recorder))
+
+    assert recording_client.get("/").status_code == 200
+    assert not (tmp_path / "traffic.ndjson").exists()
+
+
+def test_replay_seeds_a_database_and_reports_latencies(tmp_path):
+    overrides = dict(app.dependency_overrides)
+    entries = [
+        {"t": 0.0, "method": "POST", "route": "/auth/token", "query": {}, "body": None, "user": "a", "role": None},
+        {"t": 0.01, "method": "GET", "route": "/", "query": {"fields": "title"}, "body": None,
+         "user": "b", "role": "user"},
+        {"t": 0.02, "method": "GET", "route": "/todo/{todo_id}", "query": {}, "body": None,
+         "user": "b", "role": "user"},
+        {"t": 0.03, "method": "GET", "route": "/admin/todo", "query": {}, "body": None, "user": "c", "role": "admin"},
+    ]
+
+    # The real authentication runs: the test overrides are put aside during the replay
+    app.dependency_overrides.clear()
+    try:
+        result = replay(entries, f"sqlite:///{tmp_path / 'replay.db'}", speed=0, todos_per_user=5)
+    finally:
+        app.dependency_overrides.update(overrides)
+
+    assert result["requests"] == 4
+    assert result["statuses"] == {
+        "GET /": {"200": 1},
+        "GET /admin/todo": {"200": 1},
+        "GET /todo/{todo_id}": {"200": 1},
+        "POST /auth/token": {"200": 1},
+    }
+    assert result["routes"]["GET /"]["count"] == 1
+    assert app.dependency_overrides == overrides
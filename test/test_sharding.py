@@ -0,0 +1,122 @@
+import pytest
+from fastapi import status
+from sqlalchemy import create_engine, text
+
+from ..database import Base, ShardRouter, SHARD_ID_SPACING, shard_router
+from ..routers import admin, auth, todos
+from .utils import *
+
+
+SHARDS = 3
+OWNERS = range(1, 7)
+
+
+def test_shard_for_is_stable_and_spread():
+    engines = [create_engine("sqlite://") for _ in range(SHARDS)]
+    router = ShardRouter(engines)
+
+    shards = [router.shard_for(owner_id) for owner_id in range(3000)]
+    # Every shard gets a fair share of the owners
+    assert all(shards.count(shard) > 600 for shard in range(SHARDS))
+    # Same mapping in another process or after a restart
+    assert shards == [ShardRouter(engines).shard_for(owner_id) for owner_id in range(3000)]
+
+    pinned = ShardRouter(engines, directory={42: 2})
+    assert pinned.shard_for(42) == 2
+
+
+def test_adding_a_shard_moves_few_owners():
+    engines = [create_engine("sqlite://") for _ in range(SHARDS + 1)]
+    before = ShardRouter(engines[:SHARDS])
+    after = ShardRouter(engines)
+
+    moved = sum(before.shard_for(owner_id) != after.shard_for(owner_id) for owner_id in range(3000))
+    assert moved < 3000 / 2
+
+
+@pytest.fixture
+def sqlite_shards(tmp_path):
+    """
+        Points the app at three SQLite files, with the real shard-aware `get_db` dependencies.
+    """
+    original = (shard_router.engines, shard_router.directory, shard_router.session_factories)
+    overrides = dict(app.dependency_overrides)
+
+    engines = [create_engine(f"sqlite:///{tmp_path / f'shard{index}.db'}") for index in range(SHARDS)]
+    shard_router.set_shards(engines)
+    shard_router.create_all(Base.metadata)
+
+    current_user = {"username": "john", "id": 1, "role": "admin"}
+    app.dependency_overrides.pop(todos.get_db, None)
+    app.dependency_overrides.pop(admin.get_shard_dbs, None)
+    app.dependency_overrides[auth.get_current_user] = lambda: dict(current_user)
+    app.dependency_overrides[todos.get_current_user] = lambda: dict(current_user)
+
+    yield engines, current_user
+
+    app.dependency_overrides.clear()
+    app.dependency_overrides.update(overrides)
+    shard_router.set_shards(*original)
+
+    for engine in engines:
+        engine.dispose()
+
+
+def owners_on(engine) -> set[int]:
+    with engine.connect() as connection:
+        return {owner_id for owner_id, in connection.execute(text("SELECT owner_id FROM todos"))}
+
+
+def test_todos_are_written_to_the_owner_shard(sqlite_shards):
+    engines, current_user = sqlite_shards
+
+    for owner_id in OWNERS:
+        current_user["id"] = owner_id
+        response = client.post("/todo/create", json={
+            "title": f"Todo of {owner_id}",
+            "description": "Sharded todo",
+            "priority": 3,
+            "complete": False,
+        })
+        assert response.status_code == status.HTTP_201_CREATED
+
+    for index, engine in enumerate(engines):
+        assert owners_on(engine) == {owner_id for owner_id in OWNERS if shard_router.shard_for(owner_id) == index}
+
+    # A user only sees their own todos
+    current_user["id"] = 4
+    assert [todo["title"] for todo in client.get("/").json()] == ["Todo of 4"]
+
+
+def test_admin_reads_gather_every_shard(sqlite_shards):
+    engines, current_user = sqlite_shards
+
+    for owner_id in OWNERS:
+        current_user["id"] = owner_id
+        client.post("/todo/create", json={
+            "title": f"Todo of {owner_id}",
+            "description": "Sharded todo",
+            "priority": 3,
+            "complete": False,
+        })
+
+    current_user["id"] = 1
+    first_page = client.get("/admin/todo", params={"limit": 4, "count": "exact"})
+    assert first_page.headers["X-Total-Count"] == str(len(OWNERS))
+
+    second_page = client.get("/admin/todo", params={"limit": 4, "after_id": first_page.headers["X-Next-Cursor"]})
+    found = first_page.json() + second_page.json()
+    ids = [todo["id"] for todo in found]
+
+    # Merged in id order, and ids never collide across shards
+    assert ids == sorted(ids)
+    assert len(set(ids)) == len(OWNERS)
+    for todo in found:
+        assert todo["id"] > shard_router.shard_for(todo["owner_id"]) * SHARD_ID_SPACING
+
+    assert client.get("/admin/stats").json()["total"] == len(OWNERS)
+
+    # The admin delete finds the shard holding the id
+    victim = next(todo for todo in first_page.json() if shard_router.shard_for(todo["owner_id"]) != 0)
+    assert client.delete(f"/admin/todo/{victim['id']}").status_code == status.HTTP_204_NO_CONTENT
+    assert victim["owner_id"] not in owners_on(engines[shard_router.shard_for(victim["owner_id"])])
@@ -0,0 +1,72 @@
+import multiprocessing
+import time
+
+from ..shared_cache import SharedCache
+
+
+def test_shared_cache_get_set_and_invalidate(tmp_path):
+    cache = SharedCache("users", ttl=60, slots=64, directory=str(tmp_path))
+    cache.set(1, {"username": "john"})
+
+    assert cache.get(1) == {"username": "john"}
+    assert cache.get(2) is None
+
+    cache.invalidate(1)
+    assert cache.get(1) is None
+
+
+def test_shared_cache_expires(tmp_path):
+    cache = SharedCache("users", ttl=0.01, slots=64, directory=str(tmp_path))
+    cache.set(1, "john")
+    time.sleep(0.02)
+
+    assert cache.get(1) is None
+    assert len(cache) == 0
+
+
+def test_shared_cache_skips_values_larger_than_a_slot(tmp_path):
+    cache = SharedCache("users", ttl=60, slots=64, slot_size=64, directory=str(tmp_path))
+    cache.set(1, "x" * 100)
+
+    assert cache.get(1) is None
+
+
+def _set_and_invalidate(directory: str):
+    cache = SharedCache("users", ttl=60, slots=64, directory=directory)
+    cache.set(1, {"username": "john"})
+    cache.invalidate(2)
+
+
+def test_shared_cache_is_shared_across_processes(tmp_path):
+    cache = SharedCache("users", ttl=60, slots=64, directory=str(tmp_path))
+    cache.set(2, {"username": "jane"})
+
+    # Another worker fills one entry and invalidates another
+    process = multiprocessing.get_context("fork").Process(target=_set_and_invalidate, args=(str(tmp_path),))
+    process.start()
+    process.join()
+
+    assert cache.get(1) == {"username": "john"}
+    assert cache.get(2) is None
+
+
+def test_shared_cache_counts_values_larger_than_a_slot(tmp_path):
+    cache = SharedCache("users", ttl=60, slots=64, slot_size=64, directory=str(tmp_path))
+    cache.set(1, "x" * 100)
+    cache.set(2, "x" * 100)
+
+    assert cache.oversized == 2
+
+
+def test_shared_cache_drops_a_set_started_before_an_invalidation(tmp_path):
+    cache = SharedCache("users", ttl=60, slots=64, directory=str(tmp_path))
+
+    # A reader misses and loads the profile; a writer invalidates it meanwhile
+    generation = cache.generation(1)
+    cache.invalidate(1)
+    cache.set(1, {"username": "stale"}, generation)
+    assert cache.get(1) is None
+
+    generation = cache.generation(1)
+    cache.set(1, {"username": "fresh"}, generation)
+    assert cache.get(1) == {"username": "fresh"}
@@ -0,0 +1,165 @@
+import threading
+import time
+
+import pytest
+
+from ..single_flight import SingleFlight, SingleFlightBusy, SingleFlightError, SingleFlightTimeout
+
+
+def test_concurrent_calls_share_one_execution():
+    flights = SingleFlight()
+    calls = []
+    started = threading.Event()
+    release = threading.Event()
+
+    def read():
+        calls.append(1)
+        started.set()
+        release.wait()
+        return b"[]"
+
+    results = []
+    leader = threading.Thread(target=lambda: results.append(flights.do(("find_all", 1), read)))
+    leader.start()
+    started.wait()
+
+    followers = [
+        threading.Thread(target=lambda: results.append(flights.do(("find_all", 1), read)))
+        for _ in range(5)
+    ]
+    for follower in followers:
+        follower.start()
+
+    time.sleep(0.05)
+    release.set()
+    for thread in [leader, *followers]:
+        thread.join()
+
+    assert len(calls) == 1
+    assert results == [b"[]"] * 6
+    assert len(flights) == 0
+
+
+def test_waiter_times_out_without_running_the_read():
+    flights = SingleFlight(timeout=0.05)
+    release = threading.Event()
+    started = threading.Event()
+
+    def slow_read():
+        started.set()
+        release.wait()
+        return b"[]"
+
+    leader = threading.Thread(target=flights.do, args=(("me", 1), slow_read))
+    leader.start()
+    started.wait()
+
+    with pytest.raises(SingleFlightTimeout):
+        flights.do(("me", 1), lambda: pytest.fail("the waiter must not query"))
+
+    release.set()
+    leader.join()
+
+
+def test_forget_starts_a_new_read_after_a_write():
+    flights = SingleFlight()
+    release = threading.Event()
+    started = threading.Event()
+
+    def stale_read():
+        started.set()
+        release.wait()
+        return b"stale"
+
+    leader = threading.Thread(target=flights.do, args=(("find_all", 1), stale_read))
+    leader.start()
+    started.wait()
+
+    flights.forget(1)
+    assert flights.do(("find_all", 1), lambda: b"fresh") == b"fresh"
+
+    release.set()
+    leader.join()
+
+
+def test_full_table_runs_uncoalesced():
+    flights = SingleFlight(max_keys=0)
+    assert flights.do(("me", 1), lambda: b"{}") == b"{}"
+
+
+def test_waiters_beyond_the_cap_get_busy():
+    flights = SingleFlight(max_waiters=1)
+    release = threading.Event()
+    started = threading.Event()
+
+    def slow_read():
+        started.set()
+        release.wait()
+        return b"[]"
+
+    leader = threading.Thread(target=flights.do, args=(("me", 1), slow_read))
+    leader.start()
+    started.wait()
+
+    waiter = threading.Thread(target=flights.do, args=(("me", 1), slow_read))
+    waiter.start()
+    time.sleep(0.05)
+
+    with pytest.raises(SingleFlightBusy):
+        flights.do(("me", 1), lambda: pytest.fail("the caller must not query"))
+
+    release.set()
+    for thread in (leader, waiter):
+        thread.join()
+
+
+def test_waiters_get_their_own_error():
+    flights = SingleFlight()
+    release = threading.Event()
+    started = threading.Event()
+
+    def failing_read():
+        started.set()
+        release.wait()
+        raise ValueError("connection lost")
+
+    leader_errors = []
+
+    def lead():
+        try:
+            flights.do(("find_all", 1), failing_read)
+        except ValueError as error:
+            leader_errors.append(error)
+
+    leader = threading.Thread(target=lead)
+    leader.start()
+    started.wait()
+
+    errors = []
+
+    def wait():
+        try:
+            flights.do(("find_all", 1), failing_read)
+        except SingleFlightError as error:
+            errors.append(error)
+
+    waiters = [threading.Thread(target=wait) for _ in range(3)]
+    for waiter in waiters:
+        waiter.start()
+    time.sleep(0.05)
+
+    release.set()
+    for thread in [leader, *waiters]:
+        thread.join()
+
+    assert len({id(error) for error in errors}) == 3
+    assert all(error.__cause__ is leader_errors[0] for error in errors)
+
+
+def test_waiter_cap_leaves_most_of_the_threadpool():
+    flights = SingleFlight()
+    flights.size_to_threadpool(40)
+    assert 1 <= flights.max_waiters < 40
+
+    flights.size_to_threadpool(2)
+    assert flights.max_waiters == 1
@@ -1,10 +1,20 @@
+import json
+import threading
+from datetime import timedelta
+
 from fastapi import status
 
 # Because `app` is imported in utils so we do not need to import it
 from ..main import app
 from ..routers.todos import get_db, get_current_user
 # Because `Todos` is imported in utils so we do not need to import it
-from ..models import Todos
+from ..models import Todos, TodoChangeSequence, TodoStats
+from ..archive import archive_completed_todos
+from ..todo_changes import compact_tombstones, next_change_seq
+from ..events import todo_events
+from ..single_flight import read_flights
+from ..todo_stats import rebuild_todo_stats, summarize_todo_stats
+from .. import todo_writes
 from .utils import *
 
 
@@ -69,7 +79,8 @@ def test_find_all_authenticated(test_todo):
         'complete': False,
         'owner_id': 1,
         'title': 'Learn the python',
-        'id': 1
+        'id': 1,
+        'version': 1,
     }]
 
 
@@ -83,10 +94,24 @@ def test_find_one_authenticated(test_todo):
         'complete': False,
         'owner_id': 1,
         'title': 'Learn the python',
-        'id': 1
+        'id': 1,
+        'version': 1,
     }
 
 
+def test_find_sparse_fields(test_todo):
+    response = client.get("/", params={"fields": "title, complete"})
+    assert response.json() == [{"title": "Learn the python", "complete": False}]
+
+    response = client.get("/todo/1", params={"fields": "title"})
+    assert response.json() == {"title": "Learn the python"}
+    # The version is still read for the ETag
+    assert response.headers["ETag"] == '"1"'
+
+    response = client.get("/", params={"fields": "title,owner"})
+    assert response.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+
+
 def test_find_one_authenticated_not_found(test_todo):
     # Need to param `/2`
     response = client.get("/todo/2")
@@ -166,4 +191,357 @@ def test_delete_todo(test_todo):
 def test_delete_todo_not_found(test_todo):
     response = client.delete("/todo/2")
     assert response.status_code == status.HTTP_404_NOT_FOUND
-    assert response.json() == { "detail": "Todo not found" }
\ No newline at end of file
+    assert response.json() == { "detail": "Todo not found" }
+
+
+def test_find_stats(test_todo):
+    response = client.post("/todo/create", json={
+        "title": "new todo",
+        "description": "already done",
+        "priority": 2,
+        "complete": True,
+    })
+    assert response.status_code == status.HTTP_201_CREATED
+
+    response = client.get("/todo/stats")
+    assert response.status_code == status.HTTP_200_OK
+    assert response.json() == {
+        "total": 2,
+        "complete": 1,
+        "incomplete": 1,
+        "by_priority": {"2": 1, "4": 1},
+    }
+
+
+def test_export_todos_csv(test_todo):
+    response = client.get("/todo/export", params={"format": "csv"})
+    assert response.status_code == status.HTTP_200_OK
+    assert response.headers["content-type"].startswith("text/csv")
+    assert response.text.splitlines() == [
+        "id,title,description,priority,complete",
+        "1,Learn the python,Need to watch and practice codes everyday,4,false",
+    ]
+
+
+def test_export_todos_ndjson(test_todo):
+    response = client.get("/todo/export", params={"format": "ndjson"})
+    assert response.status_code == status.HTTP_200_OK
+    assert [json.loads(line) for line in response.text.splitlines()] == [{
+        "id": 1,
+        "title": "Learn the python",
+        "description": "Need to watch and practice codes everyday",
+        "priority": 4,
+        "complete": False,
+    }]
+
+
+def test_import_todos_round_trip(test_todo):
+    exported = client.get("/todo/export", params={"format": "csv"}).content
+
+    response = client.post("/todo/import", params={"format": "csv"}, content=exported)
+    assert response.status_code == status.HTTP_201_CREATED
+    assert response.json() == {"imported": 1}
+
+    db = TestingSessionLocal()
+    titles = [todo.title for todo in db.query(Todos).order_by(Todos.id)]
+    assert titles == ["Learn the python", "Learn the python"]
+
+
+def test_import_todos_round_trip_multiline_description(test_todo):
+    db = TestingSessionLocal()
+    db.query(Todos).filter(Todos.id == 1).update({"description": "line one\nline two, \"quoted\""})
+    db.commit()
+
+    exported = client.get("/todo/export", params={"format": "csv"}).content
+
+    response = client.post("/todo/import", params={"format": "csv"}, content=exported)
+    assert response.status_code == status.HTTP_201_CREATED
+    assert response.json() == {"imported": 1}
+
+    db = TestingSessionLocal()
+    descriptions = [todo.description for todo in db.query(Todos).order_by(Todos.id)]
+    assert descriptions == ["line one\nline two, \"quoted\""] * 2
+
+
+def test_import_todos_csv_stray_quote_in_unquoted_field(test_todo):
+    # A quote inside an unquoted field is an ordinary character, not the start of a multi-line field
+    body = (
+        "title,description,priority,complete\n"
+        't1 todo,a"b desc,1,false\n'
+        "t2 todo,second,2,false\n"
+        "t3 todo,third,3,false\n"
+        "t4 todo,fourth,4,false\n"
+    )
+
+    response = client.post("/todo/import", params={"format": "csv"}, content=body)
+    assert response.status_code == status.HTTP_201_CREATED
+    assert response.json() == {"imported": 4}
+
+    db = TestingSessionLocal()
+    descriptions = [todo.description for todo in db.query(Todos).filter(Todos.id > 1).order_by(Todos.id)]
+    assert descriptions == ['a"b desc', "second", "third", "fourth"]
+
+
+def test_import_todos_rejects_whole_file_on_invalid_row(test_todo):
+    body = "\n".join([
+        json.dumps({"title": "new todo", "description": "valid row", "priority": 3, "complete": False}),
+        json.dumps({"title": "x", "description": "title too short", "priority": 3, "complete": False}),
+    ])
+
+    response = client.post("/todo/import", params={"format": "ndjson"}, content=body)
+    assert response.status_code == 422
+    assert [error["row"] for error in response.json()["detail"]] == [2]
+
+    db = TestingSessionLocal()
+    assert db.query(Todos).count() == 1
+
+
+def test_find_all_etag_and_not_modified(test_todo):
+    response = client.get("/")
+    etag = response.headers["ETag"]
+
+    response = client.get("/", headers={"If-None-Match": etag})
+    assert response.status_code == status.HTTP_304_NOT_MODIFIED
+    assert response.content == b""
+
+    # The compressed form of the response carries the weak validator
+    response = client.get("/", headers={"If-None-Match": f"W/{etag}"})
+    assert response.status_code == status.HTTP_304_NOT_MODIFIED
+
+    client.patch("/todo/1", json={"complete": True})
+    response = client.get("/", headers={"If-None-Match": etag})
+    assert response.status_code == status.HTTP_200_OK
+    assert response.headers["ETag"] != etag
+
+
+def test_find_one_returns_etag(test_todo):
+    response = client.get("/todo/1")
+    assert response.headers["ETag"] == '"1"'
+
+
+def test_patch_todo(test_todo):
+    response = client.patch("/todo/1", json={"complete": True}, headers={"If-Match": '"1"'})
+    assert response.status_code == status.HTTP_204_NO_CONTENT
+    assert response.headers["ETag"] == '"2"'
+
+    db = TestingSessionLocal()
+    model = db.query(Todos).filter(Todos.id == 1).first()
+    # Only `complete` changed
+    assert model.complete is True
+    assert model.title == "Learn the python"
+    assert model.priority == 4
+    assert model.version == 2
+
+
+def test_patch_todo_stale_version(test_todo):
+    client.patch("/todo/1", json={"title": "First writer wins"}, headers={"If-Match": '"1"'})
+
+    response = client.patch("/todo/1", json={"title": "Second writer"}, headers={"If-Match": '"1"'})
+    assert response.status_code == status.HTTP_412_PRECONDITION_FAILED
+
+    db = TestingSessionLocal()
+    model = db.query(Todos).filter(Todos.id == 1).first()
+    assert model.title == "First writer wins"
+
+
+def test_patch_todo_not_found(test_todo):
+    response = client.patch("/todo/2", json={"title": "Nobody home"})
+    assert response.status_code == status.HTTP_404_NOT_FOUND
+    assert response.json() == { "detail": "Todo not found" }
+
+
+def test_patch_todo_empty_body_writes_nothing(test_todo):
+    response = client.patch("/todo/1", json={})
+    assert response.status_code == status.HTTP_204_NO_CONTENT
+    assert response.headers["ETag"] == '"1"'
+
+    db = TestingSessionLocal()
+    assert db.query(Todos.version).filter(Todos.id == 1).scalar() == 1
+
+
+def test_patch_todo_without_if_match_retries_a_lost_race(test_todo, monkeypatch):
+    db = TestingSessionLocal()
+    rebuild_todo_stats(db)
+    db.commit()
+    # A connection of its own: the test session shares a single one
+    separate = create_engine(SQLALCHEMY_DATABASE_URL)
+    move_todo_stats = todo_writes.move_todo_stats
+
+    def move_after_a_concurrent_write(*args):
+        # Another request commits between our read and our conditional UPDATE, the first time only
+        monkeypatch.setattr(todo_writes, "move_todo_stats", move_todo_stats)
+        with separate.begin() as connection:
+            connection.execute(text("UPDATE todos SET title = 'Concurrent', version = version + 1 WHERE id = 1"))
+        move_todo_stats(*args)
+
+    monkeypatch.setattr(todo_writes, "move_todo_stats", move_after_a_concurrent_write)
+
+    try:
+        response = client.patch("/todo/1", json={"complete": True})
+    finally:
+        separate.dispose()
+
+    # No If-Match, so no precondition to fail
+    assert response.status_code == status.HTTP_204_NO_CONTENT
+    assert response.headers["ETag"] == '"3"'
+
+    db = TestingSessionLocal()
+    model = db.query(Todos).filter(Todos.id == 1).first()
+    assert (model.title, model.complete) == ("Concurrent", True)
+    # The stats moved for the stale read were rolled back with its savepoint
+    stats = summarize_todo_stats(db.query(TodoStats.complete, TodoStats.priority, TodoStats.count))
+    assert (stats["total"], stats["complete"]) == (1, 1)
+
+
+def test_update_todo_stale_version(test_todo):
+    request_data = {
+        "title": "Change the current todo 1",
+        "description": "Want to change todo item with id 1",
+        "priority": 2,
+        "complete": False,
+    }
+
+    response = client.put("/todo/1", json=request_data, headers={"If-Match": '"1"'})
+    assert response.status_code == status.HTTP_204_NO_CONTENT
+    assert response.headers["ETag"] == '"2"'
+
+    response = client.put("/todo/1", json=request_data, headers={"If-Match": '"1"'})
+    assert response.status_code == status.HTTP_412_PRECONDITION_FAILED
+
+
+def test_find_changes_full_then_delta(test_todo):
+    # First sync: everything, plus a cursor
+    response = client.get("/todo/changes")
+    assert response.status_code == status.HTTP_200_OK
+    assert [todo["id"] for todo in response.json()["changed"]] == [1]
+    cursor = response.json()["cursor"]
+
+    # Nothing happened since
+    response = client.get("/todo/changes", params={"since": cursor})
+    assert response.json() == { "changed": [], "deleted": [], "cursor": cursor, "has_more": False }
+
+    client.patch("/todo/1", json={"complete": True})
+    client.post("/todo/create", json={
+        "title": "New todo",
+        "description": "New todo description",
+        "priority": 5,
+        "complete": False,
+    })
+    client.delete("/todo/1")
+
+    response = client.get("/todo/changes", params={"since": cursor})
+    body = response.json()
+    assert [todo["id"] for todo in body["changed"]] == [2]
+    assert body["deleted"] == [1]
+    assert body["cursor"] > cursor
+    assert body["has_more"] is False
+
+
+def test_find_changes_pages_without_splitting_a_batch(test_todo):
+    cursor = client.get("/todo/changes").json()["cursor"]
+
+    for title in ("First", "Second", "Third"):
+        client.post("/todo/create", json={
+            "title": title,
+            "description": "Paged todo",
+            "priority": 1,
+            "complete": False,
+        })
+
+    # An import shares one sequence number across its rows
+    client.post("/todo/import", params={"format": "ndjson"}, content="\n".join(
+        json.dumps({"title": f"Imported {i}", "description": "Batch", "priority": 2, "complete": False})
+        for i in range(3)
+    ))
+
+    seen = []
+    has_more = True
+    while has_more:
+        body = client.get("/todo/changes", params={"since": cursor, "limit": 2}).json()
+        seen += [todo["title"] for todo in body["changed"]]
+        cursor, has_more = body["cursor"], body["has_more"]
+
+    assert seen == ["First", "Second", "Third", "Imported 0", "Imported 1", "Imported 2"]
+
+
+def test_find_changes_after_compaction(test_todo):
+    cursor = client.get("/todo/changes").json()["cursor"]
+    client.delete("/todo/1")
+
+    db = TestingSessionLocal()
+    assert compact_tombstones(db, retention=timedelta(0)) == 1
+
+    response = client.get("/todo/changes", params={"since": cursor})
+    assert response.status_code == status.HTTP_410_GONE
+
+
+def test_change_seq_is_per_owner_above_the_floor(test_todo):
+    db = TestingSessionLocal()
+    # The shard-wide counter of before per-owner counters, with old cursors up to 40 handed out
+    db.add(TodoChangeSequence(owner_id=0, value=40, compacted_seq=7))
+    db.commit()
+
+    assert client.get("/todo/changes").json()["cursor"] == 40
+    # Deletes older than the floor's compaction were never recorded for this owner either
+    assert client.get("/todo/changes", params={"since": 5}).status_code == status.HTTP_410_GONE
+
+    client.patch("/todo/1", json={"complete": True})
+    assert next_change_seq(db, 2) == 41
+    db.rollback()
+
+    body = client.get("/todo/changes", params={"since": 40}).json()
+    assert [todo["id"] for todo in body["changed"]] == [1]
+    assert body["cursor"] == 41
+
+
+def test_archive_completed_todos(test_todo):
+    cursor = client.get("/todo/changes").json()["cursor"]
+    client.patch("/todo/1", json={"complete": True})
+
+    db = TestingSessionLocal()
+    # Only todos completed long ago are archived
+    assert archive_completed_todos(db) == 0
+
+    with engine.connect() as connection:
+        connection.execute(text("UPDATE todos SET updated_at = updated_at - INTERVAL '31 days'"))
+        connection.commit()
+
+    assert archive_completed_todos(db) == 1
+
+    assert client.get("/").json() == []
+
+    response = client.get("/", params={"include_archived": True})
+    assert [(todo["id"], todo["complete"]) for todo in response.json()] == [(1, True)]
+
+    # Delta-sync clients drop it like a delete
+    assert client.get("/todo/changes", params={"since": cursor}).json()["deleted"] == [1]
+
+
+class UndeliveredEvents:
+    # A cross-worker backend whose listener has not delivered the event yet
+    def publish(self, event):
+        pass
+
+
+def test_write_forgets_reads_in_flight_before_answering(test_todo, monkeypatch):
+    monkeypatch.setattr(todo_events, "backend", UndeliveredEvents())
+    started = threading.Event()
+    release = threading.Event()
+
+    def slow_read():
+        started.set()
+        release.wait()
+        return b"[]"
+
+    reader = threading.Thread(target=read_flights.do, args=(("find_all", 1, False, None), slow_read))
+    reader.start()
+    started.wait()
+
+    try:
+        response = client.patch("/todo/1", json={"complete": True})
+        assert response.status_code == status.HTTP_204_NO_CONTENT
+        # A listing started now runs its own read instead of joining the one that predates the write
+        assert len(read_flights) == 0
+    finally:
+        release.set()
+        reader.join()
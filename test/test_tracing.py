@@ -0,0 +1,70 @@
+import json
+
+from ..routers.todos import get_db, get_current_user
+from .. import tracing
+from ..tracing import Trace, TraceExporter, trace_exporter
+from .utils import *
+
+
+app.dependency_overrides[get_db] = override_get_db
+app.dependency_overrides[get_current_user] = override_get_current_user
+
+
+def test_forced_trace_is_exported_as_chrome_events(test_todo, tmp_path, monkeypatch):
+    monkeypatch.setattr(tracing, "TRACE_FORCE_HEADER", True)
+    monkeypatch.setattr(trace_exporter, "path", str(tmp_path / "traces.json"))
+    monkeypatch.setattr(trace_exporter, "trace_format", "chrome")
+
+    response = client.get("/", headers={"X-Trace": "1"})
+    trace_id = response.headers["X-Trace-Id"]
+    trace_exporter.flush()
+
+    # The file is an unterminated JSON array, as the trace viewers accept it
+    events = json.loads((tmp_path / "traces.json").read_text().rstrip().rstrip(",") + "]")
+    names = [event["name"] for event in events if event["args"]["trace_id"] == trace_id]
+
+    assert names[0] == "GET /"
+    assert "db.statement" in names
+    assert "render.json" in names
+    assert "response.send" in names
+
+    root = events[0]["args"]["span_id"]
+    assert all(event["args"]["parent_id"] == root for event in events[1:] if event["name"] == "db.statement")
+
+
+def test_unsampled_request_is_not_traced(test_todo):
+    assert "X-Trace-Id" not in client.get("/").headers
+
+
+def test_trace_exported_as_otlp_json(test_todo, tmp_path, monkeypatch):
+    monkeypatch.setattr(tracing, "TRACE_FORCE_HEADER", True)
+    monkeypatch.setattr(trace_exporter, "path", str(tmp_path / "traces.jsonl"))
+    monkeypatch.setattr(trace_exporter, "trace_format", "otlp")
+
+    client.get("/todo/1", headers={"X-Trace": "1"})
+    trace_exporter.flush()
+
+    request = json.loads((tmp_path / "traces.jsonl").read_text().splitlines()[0])
+    spans = request["resourceSpans"][0]["scopeSpans"][0]["spans"]
+    assert spans[0]["name"] == "GET /todo/1"
+    assert "parentSpanId" not in spans[0]
+    assert {item["parentSpanId"] for item in spans[1:]} == {spans[0]["spanId"]}
+
+
+def test_trace_header_ignored_unless_enabled(test_todo):
+    assert "X-Trace-Id" not in client.get("/", headers={"X-Trace": "1"}).headers
+
+
+def test_trace_file_is_rotated(tmp_path):
+    path = tmp_path / "traces.json"
+    exporter = TraceExporter(str(path), "chrome", max_bytes=1)
+
+    for _ in range(3):
+        trace = Trace()
+        trace.start_span("GET /", {}).end()
+        exporter.export(trace)
+        exporter.flush()
+
+    # Each write found the file over the cap: one trace in the current file, one in the previous
+    assert path.read_text().count('"GET /"') == 1
+    assert (tmp_path / "traces.json.1").read_text().count('"GET /"') == 1
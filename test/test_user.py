@@ -60,3 +60,39 @@ def test_phone_update_user(test_user):
     model = db.query(Users).filter(Users.id == 1).first()
     assert model.phone_number == request_data.get("phone_number")
 
+
+
+def test_me_hides_hashed_password(test_user):
+    response = client.get("/user")
+    assert response.status_code == status.HTTP_200_OK
+    assert "hashed_password" not in response.json()
+    assert response.json().get("phone_number") == "1-111-111-1111"
+
+
+def test_me_is_invalidated_after_update_user(test_user):
+    # Warm up the cache first
+    client.get("/user")
+
+    request_data = {
+        "email": "john@example.com",
+        "username": "john",
+        "first_name": "Test",
+        "last_name": "User",
+        "password": "hashpassword",
+        "role": "admin",
+        "phone_number": "3-333-333-3333",
+    }
+
+    response = client.put("/user/user_update", json=request_data)
+    assert response.status_code == status.HTTP_204_NO_CONTENT
+
+    response = client.get("/user")
+    assert response.json().get("phone_number") == request_data.get("phone_number")
+
+
+def test_me_sparse_fields(test_user):
+    response = client.get("/user", params={"fields": "username,email"})
+    assert response.json() == {"email": "john@example.com", "username": "john"}
+
+    response = client.get("/user", params={"fields": "hashed_password"})
+    assert response.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
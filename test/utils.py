@@ -12,6 +12,9 @@ from ..main import app
 from ..database import Base
 from ..models import Todos, Users
 from ..routers.user import bcrypt_context
+from ..cache import user_cache
+from ..todo_stats import todo_count_cache
+from .. import tracing
 
 
 # Set up test database for the endpoint testing
@@ -33,6 +36,11 @@ engine = create_engine(
 # be able to create a fully separate testing session that is isolated frm our production database
 TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# A private profile cache: the shared one of the host may belong to a running server
+user_cache.configure("local")
+# No sampled traces: tests that trace force it, into a file of their own
+tracing.TRACE_SAMPLE_RATE = 0
+
 
 # Easy way to update, delete and recreate the `unit_test`
 # Since it moves to fixture function below for testing
@@ -71,6 +79,10 @@ client = TestClient(app)
 def test_todo():
     db = TestingSessionLocal()
 
+    # Cached profiles and counts would outlive the rows they were loaded from
+    user_cache.clear()
+    todo_count_cache.clear()
+
     # Dropping current database
     Base.metadata.drop_all(bind=engine)
     # For easy connection to database
@@ -131,6 +143,10 @@ def test_todo():
     with engine.connect() as connection:
         # delete all rows
         connection.execute(text("DELETE FROM todos;"))
+        connection.execute(text("DELETE FROM todo_stats;"))
+        connection.execute(text("DELETE FROM todo_tombstones;"))
+        connection.execute(text("DELETE FROM todos_archive;"))
+        connection.execute(text("DELETE FROM refresh_tokens;"))
         connection.execute(text("DELETE FROM users;"))
         connection.commit()
 
@@ -153,6 +169,9 @@ def test_user():
         If tests are running in parallel or fixtures are shared across multiple tests,
         the database might have multiple users created simultaneously, leading to unexpected id values.
     """
+    # Cached profiles would outlive the rows they were loaded from
+    user_cache.clear()
+
     # Dropping current database
     Base.metadata.drop_all(bind=engine)
     # For easy connection to database
@@ -176,5 +195,6 @@ def test_user():
     yield user
 
     with engine.connect() as connection:
+        connection.execute(text("DELETE FROM refresh_tokens;"))
         connection.execute(text("DELETE FROM users;"))
         connection.commit()
\ No newline at end of file
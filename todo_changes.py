@@ -0,0 +1,296 @@
+import logging
+import threading
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import Connection, select, update, insert, delete, func
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session, sessionmaker
+
+from .database import shard_router
+from .models import Todos, TodoTombstones, TodoChangeSequence
+
+
+logger = logging.getLogger(__name__)
+
+# Changes returned per `/todo/changes` page
+CHANGES_PAGE_SIZE = 500
+# Tombstones older than this are compacted; clients that have not synced for that long must resync
+TOMBSTONE_RETENTION = timedelta(days=30)
+TOMBSTONE_COMPACT_INTERVAL_SECONDS = 3600
+# `updated_seq` of rows inserted by an import until the import stamps them right before commit
+PENDING_CHANGE_SEQ = -1
+# `todo_change_seq` row that owners without a counter of their own read as (see `TodoChangeSequence`)
+FLOOR_OWNER_ID = 0
+
+CHANGE_COLUMNS = (Todos.id, Todos.title, Todos.description, Todos.priority, Todos.complete,
+                  Todos.owner_id, Todos.version, Todos.updated_seq)
+
+
+class ResyncRequired(Exception):
+    """
+        The cursor is older than the compacted tombstones: some deletes can no longer be reported.
+    """
+
+
+def _floor(column):
+    # Value of the floor row, or 0 in a database created with per-owner counters
+    return (select(func.coalesce(func.max(column), 0))
+            .where(TodoChangeSequence.owner_id == FLOOR_OWNER_ID)
+            .scalar_subquery())
+
+
+def _insert_counter(db: Session, owner_id: int, value_offset: int = 0):
+    """
+        INSERT of an owner's counter row, picking up where the floor row is. The dialect's own INSERT
+        where it supports `ON CONFLICT`, so the caller can add it.
+    """
+    dialect = db.get_bind().dialect.name
+    dialect_insert = {"postgresql": postgresql.insert, "sqlite": sqlite.insert}.get(dialect, insert)
+
+    return dialect_insert(TodoChangeSequence).values(
+        owner_id=owner_id,
+        value=_floor(TodoChangeSequence.value) + value_offset,
+        compacted_seq=_floor(TodoChangeSequence.compacted_seq),
+    )
+
+
+def _next_seq(db: Session, owner_id: int) -> int:
+    statement = _insert_counter(db, owner_id, value_offset=1)
+
+    if db.get_bind().dialect.name in ("postgresql", "sqlite"):
+        return db.execute(
+            statement.on_conflict_do_update(
+                index_elements=[TodoChangeSequence.owner_id],
+                set_={"value": TodoChangeSequence.value + 1},
+            )
+            .returning(TodoChangeSequence.value)
+        ).scalar_one()
+
+    seq = db.execute(
+        update(TodoChangeSequence)
+        .where(TodoChangeSequence.owner_id == owner_id)
+        .values(value=TodoChangeSequence.value + 1)
+        .returning(TodoChangeSequence.value)
+    ).scalar()
+
+    if seq is None:
+        seq = db.execute(statement.returning(TodoChangeSequence.value)).scalar_one()
+
+    return seq
+
+
+def next_change_seqs(db: Session, owner_ids) -> dict[int, int]:
+    """
+        Allocates the next change sequence number of every owner in `owner_ids`, locking their counter
+        rows in `owner_id` order, so two writers over several owners never deadlock.
+
+        A counter row stays locked until the transaction ends, so an owner's writers commit in sequence
+        order and a reader never sees seq N+1 of an owner before N. Writers of different owners never wait
+        on each other. Call it as late as possible before `db.commit()`.
+    """
+    return {owner_id: _next_seq(db, owner_id) for owner_id in sorted(set(owner_ids))}
+
+
+def next_change_seq(db: Session, owner_id: int) -> int:
+    return _next_seq(db, owner_id)
+
+
+def record_tombstone(db: Session, todo_id: int, owner_id: int, deleted_seq: int | None = None):
+    db.add(TodoTombstones(
+        todo_id=todo_id,
+        owner_id=owner_id,
+        deleted_seq=next_change_seq(db, owner_id) if deleted_seq is None else deleted_seq,
+        deleted_at=datetime.now(timezone.utc),
+    ))
+
+
+def stamp_pending_changes(db: Session, owner_id: int):
+    """
+        Gives every row inserted with `PENDING_CHANGE_SEQ` by this transaction one shared sequence number.
+        Imports insert first and stamp last, so the counter row is not locked for the whole upload.
+    """
+    seq = next_change_seq(db, owner_id)
+
+    db.execute(
+        update(Todos)
+        .where(Todos.owner_id == owner_id, Todos.updated_seq == PENDING_CHANGE_SEQ)
+        .values(updated_seq=seq)
+        .execution_options(synchronize_session=False)
+    )
+
+
+def _read_changed(connection: Connection, owner_id: int, since: int | None, head: int, limit: int | None,
+                  seq: int | None = None):
+    query = (select(*CHANGE_COLUMNS)
+             .where(Todos.owner_id == owner_id, Todos.updated_seq <= head)
+             .order_by(Todos.updated_seq, Todos.id))
+
+    if since is not None:
+        query = query.where(Todos.updated_seq > since)
+    if seq is not None:
+        query = query.where(Todos.updated_seq == seq)
+    if limit is not None:
+        query = query.limit(limit)
+
+    return [(row.updated_seq, "changed", row._asdict()) for row in connection.execute(query)]
+
+
+def _read_deleted(connection: Connection, owner_id: int, since: int, head: int, limit: int | None,
+                  seq: int | None = None):
+    query = (select(TodoTombstones.todo_id, TodoTombstones.deleted_seq)
+             .where(TodoTombstones.owner_id == owner_id,
+                    TodoTombstones.deleted_seq > since,
+                    TodoTombstones.deleted_seq <= head)
+             .order_by(TodoTombstones.deleted_seq))
+
+    if seq is not None:
+        query = query.where(TodoTombstones.deleted_seq == seq)
+    if limit is not None:
+        query = query.limit(limit)
+
+    return [(row.deleted_seq, "deleted", row.todo_id) for row in connection.execute(query)]
+
+
+def _page(items: list) -> dict:
+    return {
+        "changed": [payload for _, kind, payload in items if kind == "changed"],
+        "deleted": [payload for _, kind, payload in items if kind == "deleted"],
+    }
+
+
+def read_changes(db: Session, owner_id: int, since: int | None, limit: int = CHANGES_PAGE_SIZE) -> dict:
+    """
+        Todos of `owner_id` changed and deleted after the cursor `since`, oldest first.
+        Without `since` it is a full sync: every live todo and no tombstones.
+
+        The returned `cursor` is what the client sends next time. When `has_more` is set, call again right away.
+    """
+    # One connection for every statement: with replicas, each `db.execute` may otherwise land on a
+    # different replica, and a head read from one that is ahead would skip rows missing on the other.
+    connection = db.connection(bind_arguments={"mapper": Todos})
+
+    # Read the head first: everything up to it is committed, anything newer is left for the next call
+    counters = {
+        row.owner_id: (row.value, row.compacted_seq)
+        for row in connection.execute(
+            select(TodoChangeSequence.owner_id, TodoChangeSequence.value, TodoChangeSequence.compacted_seq)
+            .where(TodoChangeSequence.owner_id.in_([owner_id, FLOOR_OWNER_ID]))
+        )
+    }
+    head, compacted_seq = counters.get(owner_id) or counters.get(FLOOR_OWNER_ID) or (0, 0)
+
+    if since is None:
+        items = _read_changed(connection, owner_id, None, head, None)
+        return {**_page(items), "cursor": head, "has_more": False}
+
+    if since < compacted_seq:
+        raise ResyncRequired()
+
+    items = sorted(
+        _read_changed(connection, owner_id, since, head, limit + 1)
+        + _read_deleted(connection, owner_id, since, head, limit + 1),
+        key=lambda item: item[0],
+    )
+
+    if len(items) <= limit:
+        return {**_page(items), "cursor": max(since, head), "has_more": False}
+
+    # Rows written by one batch share a seq and must not be split across pages
+    boundary = items[limit - 1][0]
+
+    if items[limit][0] != boundary:
+        items = items[:limit]
+    elif items[0][0] != boundary:
+        items = [item for item in items[:limit] if item[0] != boundary]
+    else:
+        items = (_read_changed(connection, owner_id, since, head, None, seq=boundary)
+                 + _read_deleted(connection, owner_id, since, head, None, seq=boundary))
+
+    return {**_page(items), "cursor": items[-1][0], "has_more": True}
+
+
+def compact_tombstones(db: Session, retention: timedelta = TOMBSTONE_RETENTION) -> int:
+    """
+        Deletes tombstones older than `retention` and raises each owner's `compacted_seq` past them.
+        Returns the number removed.
+    """
+    cutoff = datetime.now(timezone.utc) - retention
+
+    horizons = db.execute(
+        select(TodoTombstones.owner_id, func.max(TodoTombstones.deleted_seq))
+        .where(TodoTombstones.deleted_at < cutoff)
+        .group_by(TodoTombstones.owner_id)
+        .order_by(TodoTombstones.owner_id)
+    ).all()
+
+    if not horizons:
+        return 0
+
+    # Counter rows first, in owner order like the writers. An owner whose tombstones predate their
+    # own counter row gets one, or their old cursors would not be told to resync.
+    postgres_or_sqlite = db.get_bind().dialect.name in ("postgresql", "sqlite")
+
+    for owner_id, horizon in horizons:
+        statement = _insert_counter(db, owner_id)
+
+        if postgres_or_sqlite:
+            db.execute(statement.on_conflict_do_nothing(index_elements=[TodoChangeSequence.owner_id]))
+        elif db.get(TodoChangeSequence, owner_id) is None:
+            db.execute(statement)
+
+        db.execute(
+            update(TodoChangeSequence)
+            .where(TodoChangeSequence.owner_id == owner_id, TodoChangeSequence.compacted_seq < horizon)
+            .values(compacted_seq=horizon)
+        )
+
+    removed = db.execute(delete(TodoTombstones).where(TodoTombstones.deleted_at < cutoff)).rowcount
+    db.commit()
+
+    return removed
+
+
+class TombstoneCompactor:
+    """
+        Background thread running `compact_tombstones` every `interval` seconds, on every shard
+        unless a `session_factory` is given. Safe to run in every worker: compaction is idempotent.
+    """
+
+    def __init__(self, session_factory: sessionmaker | None = None,
+                 interval: float = TOMBSTONE_COMPACT_INTERVAL_SECONDS,
+                 retention: timedelta = TOMBSTONE_RETENTION):
+        self.session_factory = session_factory
+        self.interval = interval
+        self.retention = retention
+        self._stopped = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    def start(self):
+        self._stopped.clear()
+        self._thread = threading.Thread(target=self._run, name="todo-tombstone-compactor", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        if self._thread is None:
+            return
+
+        self._stopped.set()
+        self._thread.join()
+        self._thread = None
+
+    def _run(self):
+        while not self._stopped.wait(self.interval):
+            session_factories = [self.session_factory] if self.session_factory else shard_router.session_factories
+
+            for session_factory in session_factories:
+                try:
+                    with session_factory() as db:
+                        removed = compact_tombstones(db, self.retention)
+
+                    if removed:
+                        logger.info("Compacted %d todo tombstones", removed)
+                except Exception:
+                    logger.warning("Tombstone compaction failed", exc_info=True)
+
+
+tombstone_compactor = TombstoneCompactor()
@@ -0,0 +1,156 @@
+from sqlalchemy import func, update, delete, insert, text
+from sqlalchemy.orm import Session, Query
+from sqlalchemy.dialects import postgresql, sqlite
+
+from .models import Todos, TodoStats
+from .cache import TTLCache
+
+
+# Exact counts behind the `cached` count mode of `/admin/todo`
+TODO_COUNT_CACHE_TTL_SECONDS = 30
+todo_count_cache = TTLCache(ttl=TODO_COUNT_CACHE_TTL_SECONDS, maxsize=1024)
+
+
+def bump_todo_stats(db: Session, complete: bool, priority: int, delta: int):
+    """
+        Adds `delta` to the (complete, priority) counter. Call it before `db.commit()` of the todo write
+        so the counter and the row change land in the same transaction.
+    """
+    complete = bool(complete)
+    dialect = db.get_bind().dialect.name
+
+    if dialect in ("postgresql", "sqlite"):
+        dialect_insert = postgresql.insert if dialect == "postgresql" else sqlite.insert
+        statement = dialect_insert(TodoStats).values(complete=complete, priority=priority, count=delta)
+        db.execute(statement.on_conflict_do_update(
+            index_elements=[TodoStats.complete, TodoStats.priority],
+            set_={"count": TodoStats.count + delta},
+        ))
+        return
+
+    updated = db.execute(
+        update(TodoStats)
+        .where(TodoStats.complete == complete, TodoStats.priority == priority)
+        .values(count=TodoStats.count + delta)
+    )
+
+    if updated.rowcount == 0:
+        db.execute(insert(TodoStats).values(complete=complete, priority=priority, count=delta))
+
+
+def bump_todo_stats_many(db: Session, deltas: dict[tuple[bool, int], int]):
+    """
+        Adds each delta of `deltas` ((complete, priority) -> delta) to its counter.
+
+        Counter rows are locked in `(complete, priority)` order, whatever the order of `deltas`. Two
+        transactions bumping the same two counters in opposite orders would otherwise deadlock, e.g. one
+        request completing a todo while another reopens one of the same priority.
+    """
+    merged = {}
+    for (complete, priority), delta in deltas.items():
+        merged[(bool(complete), priority)] = merged.get((bool(complete), priority), 0) + delta
+
+    for (complete, priority), delta in sorted(merged.items()):
+        if delta:
+            bump_todo_stats(db, complete, priority, delta)
+
+
+def move_todo_stats(db: Session, old_complete: bool, old_priority: int, new_complete: bool, new_priority: int):
+    if bool(old_complete) == bool(new_complete) and old_priority == new_priority:
+        return
+
+    bump_todo_stats_many(db, {(old_complete, old_priority): -1, (new_complete, new_priority): 1})
+
+
+def rebuild_todo_stats(db: Session):
+    """
+        Recomputes the summary table from `todos` with one `GROUP BY`. For backfills and repairs only.
+    """
+    db.execute(delete(TodoStats))
+    db.execute(insert(TodoStats).from_select(
+        ["complete", "priority", "count"],
+        db.query(Todos.complete, Todos.priority, func.count(Todos.id))
+        .filter(Todos.complete.isnot(None), Todos.priority.isnot(None))
+        .group_by(Todos.complete, Todos.priority)
+        .statement,
+    ))
+
+
+def summarize_todo_stats(rows) -> dict:
+    """
+        Turns (complete, priority, count) rows into the response of the stats endpoints.
+    """
+    summary = {
+        "total": 0,
+        "complete": 0,
+        "incomplete": 0,
+        "by_priority": {},
+    }
+
+    for complete, priority, count in rows:
+        if not count:
+            continue
+
+        summary["total"] += count
+        summary["complete" if complete else "incomplete"] += count
+        summary["by_priority"][priority] = summary["by_priority"].get(priority, 0) + count
+
+    return summary
+
+
+def stats_todo_count(db: Session, complete: bool | None = None, priority: int | None = None) -> int:
+    """
+        Exact number of todos of the shard from the summary table, without reading `todos`.
+    """
+    stats_query = db.query(func.coalesce(func.sum(TodoStats.count), 0))
+    if complete is not None:
+        stats_query = stats_query.filter(TodoStats.complete == complete)
+    if priority is not None:
+        stats_query = stats_query.filter(TodoStats.priority == priority)
+
+    return int(stats_query.scalar())
+
+
+def estimate_todo_count(db: Session, query: Query) -> int | None:
+    """
+        PostgreSQL's planner estimate (the row estimate of `EXPLAIN`) for a todo query,
+        or None on other databases.
+    """
+    if db.get_bind().dialect.name != "postgresql":
+        return None
+
+    statement = query.order_by(None).limit(None).statement.compile(
+        dialect=db.get_bind().dialect,
+        compile_kwargs={"literal_binds": True},
+    )
+    plan = db.execute(text(f"EXPLAIN (FORMAT JSON) {statement}")).scalar()
+
+    return int(plan[0]["Plan"]["Plan Rows"])
+
+
+def count_todos(db: Session, query: Query, mode: str, owner_id: int | None = None,
+                complete: bool | None = None, priority: int | None = None, shard: int = 0) -> tuple[int, str]:
+    """
+        Returns (total, mode actually used) for the shard of `db`.
+
+        `estimate` without an owner filter is answered by the summary table, exactly and as cheaply, so it
+        reports `exact`. With one it falls back to `cached` when no estimate exists.
+    """
+    if mode == "estimate":
+        if owner_id is None:
+            return stats_todo_count(db, complete, priority), "exact"
+
+        total = estimate_todo_count(db, query)
+        if total is not None:
+            return total, "estimate"
+        mode = "cached"
+
+    if mode == "cached":
+        key = (shard, owner_id, complete, priority)
+        total = todo_count_cache.get(key)
+        if total is None:
+            total = query.order_by(None).limit(None).with_entities(func.count(Todos.id)).scalar()
+            todo_count_cache.set(key, total)
+        return total, "cached"
+
+    return query.order_by(None).limit(None).with_entities(func.count(Todos.id)).scalar(), "exact"
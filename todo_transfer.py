@@ -0,0 +1,212 @@
+import csv
+import io
+import json
+import queue
+import threading
+from collections import Counter
+from typing import Iterator
+
+from pydantic import ValidationError
+from sqlalchemy import select, insert
+from sqlalchemy.orm import Session
+
+from .dtos.todo import TodoDto
+from .models import Todos
+from .todo_stats import bump_todo_stats_many
+from .todo_changes import PENDING_CHANGE_SEQ, stamp_pending_changes
+from .streaming import format_validation_error
+
+
+EXPORT_COLUMNS = ("id", "title", "description", "priority", "complete")
+# Rows fetched from the cursor, and rows inserted, per round trip
+TRANSFER_BATCH_SIZE = 1000
+# Per-row errors kept for the response of a rejected import
+MAX_REPORTED_ERRORS = 1000
+# Chunks of COPY output waiting for the client; bounds memory when the client reads slowly
+COPY_QUEUE_SIZE = 16
+COPY_CHUNK_BYTES = 64 * 1024
+
+
+def _format_rows(rows, file_format: str) -> bytes:
+    if file_format == "ndjson":
+        return "".join(
+            json.dumps(dict(zip(EXPORT_COLUMNS, row))) + "\n" for row in rows
+        ).encode()
+
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator="\n")
+    for row in rows:
+        *values, complete = row
+        writer.writerow([*values, "true" if complete else "false"])
+
+    return buffer.getvalue().encode()
+
+
+def _csv_header() -> bytes:
+    return (",".join(EXPORT_COLUMNS) + "\n").encode()
+
+
+class _QueueWriter:
+    """
+        File-like target for psycopg2's `copy_expert` that hands the output to the streaming generator.
+        COPY writes one row per call, so rows are grouped into `COPY_CHUNK_BYTES` chunks first.
+    """
+
+    def __init__(self):
+        self.chunks: queue.Queue = queue.Queue(maxsize=COPY_QUEUE_SIZE)
+        self.cancelled = threading.Event()
+        self._buffer: list[bytes] = []
+        self._buffered = 0
+
+    def write(self, data):
+        if isinstance(data, str):
+            data = data.encode()
+
+        self._buffer.append(data)
+        self._buffered += len(data)
+
+        if self._buffered >= COPY_CHUNK_BYTES:
+            self.flush()
+
+        return len(data)
+
+    def flush(self):
+        if not self._buffer:
+            return
+
+        self.put(b"".join(self._buffer))
+        self._buffer = []
+        self._buffered = 0
+
+    def put(self, item):
+        while True:
+            try:
+                self.chunks.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                # The client went away: abort the COPY instead of blocking forever
+                if self.cancelled.is_set():
+                    raise IOError("Export cancelled")
+
+
+def _iter_copy_export(db: Session, owner_id: int) -> Iterator[bytes]:
+    writer = _QueueWriter()
+    done = object()
+    errors = []
+
+    sql = (
+        "COPY (SELECT id, title, description, priority, complete::text FROM todos "
+        f"WHERE owner_id = {int(owner_id)} ORDER BY id) TO STDOUT WITH (FORMAT csv, HEADER)"
+    )
+    cursor = db.connection().connection.cursor()
+
+    def run_copy():
+        try:
+            cursor.copy_expert(sql, writer)
+            writer.flush()
+        except Exception as error:
+            errors.append(error)
+        finally:
+            try:
+                writer.put(done)
+            except IOError:
+                pass
+
+    thread = threading.Thread(target=run_copy, name="todo-export-copy", daemon=True)
+    thread.start()
+
+    try:
+        while True:
+            chunk = writer.chunks.get()
+            if chunk is done:
+                break
+            yield chunk
+    finally:
+        writer.cancelled.set()
+        thread.join()
+
+    if errors:
+        raise errors[0]
+
+
+def iter_export(db: Session, owner_id: int, file_format: str) -> Iterator[bytes]:
+    """
+        Streams the todos of `owner_id` as CSV or NDJSON straight from a DB cursor.
+
+        CSV on PostgreSQL uses `COPY ... TO STDOUT`; everything else walks a server-side cursor
+        `TRANSFER_BATCH_SIZE` rows at a time. The session is closed once the stream ends.
+    """
+    try:
+        if file_format == "csv" and db.get_bind().dialect.name == "postgresql":
+            yield from _iter_copy_export(db, owner_id)
+            return
+
+        if file_format == "csv":
+            yield _csv_header()
+
+        result = db.execute(
+            select(*(getattr(Todos, column) for column in EXPORT_COLUMNS))
+            .where(Todos.owner_id == owner_id)
+            .order_by(Todos.id)
+            .execution_options(yield_per=TRANSFER_BATCH_SIZE)
+        )
+
+        for rows in result.partitions():
+            yield _format_rows(rows, file_format)
+    finally:
+        db.close()
+
+
+class TodoImport:
+    """
+        Collects validated rows of an upload and inserts them in fixed-size batches.
+        Nothing is committed here: the caller commits once, so an import is all-or-nothing.
+    """
+
+    def __init__(self, owner_id: int):
+        self.owner_id = owner_id
+        self.pending: list[dict] = []
+        self.imported = 0
+        self.failed = 0
+        self.stats = Counter()
+        self.errors: list[dict] = []
+
+    def add(self, row_number: int, record: dict | None, error: str | None = None):
+        if error is None:
+            record = {key: value for key, value in record.items() if key in TodoDto.model_fields}
+            try:
+                todo = TodoDto(**record)
+            except ValidationError as validation_error:
+                error = format_validation_error(validation_error)
+
+        if error is not None:
+            self.failed += 1
+            if len(self.errors) < MAX_REPORTED_ERRORS:
+                self.errors.append({"row": row_number, "error": error})
+            return
+
+        self.pending.append({**todo.model_dump(), "owner_id": self.owner_id, "updated_seq": PENDING_CHANGE_SEQ})
+
+    @property
+    def batch_ready(self) -> bool:
+        return len(self.pending) >= TRANSFER_BATCH_SIZE
+
+    def flush(self, db: Session):
+        if not self.pending or self.failed:
+            self.pending = []
+            return
+
+        # executemany
+        db.execute(insert(Todos), self.pending)
+
+        self.imported += len(self.pending)
+        self.stats.update((row["complete"], row["priority"]) for row in self.pending)
+        self.pending = []
+
+    def finish(self, db: Session):
+        self.flush(db)
+
+        bump_todo_stats_many(db, self.stats)
+
+        # Last, so the change sequence counter is locked only until the caller commits
+        stamp_pending_changes(db, self.owner_id)
@@ -0,0 +1,227 @@
+"""
+    Todo writes shared by `routers/todos.py` and `routers/batch.py`.
+
+    Nothing here commits or publishes: the caller decides whether one write is a transaction of its own
+    or part of a batch, commits, and only then publishes the change event.
+    Each helper keeps the lock order of every todo write: stats, change counter, todo row.
+
+    An atomic batch passes `change_seq`: it has already bumped the stats of all its writes and allocated
+    one change sequence number of the owner for them (see `routers/batch.py`), so the helper only touches
+    the todo row.
+"""
+from fastapi import HTTPException
+from sqlalchemy import update
+from sqlalchemy.orm import Session
+from sqlalchemy.orm.exc import StaleDataError
+
+from .dtos.todo import TodoDto
+from .models import Todos
+from .todo_changes import next_change_seq, record_tombstone
+from .todo_stats import bump_todo_stats, move_todo_stats
+
+
+# Attempts of a PATCH without If-Match that keeps losing its conditional UPDATE to other writers
+PATCH_RETRY_ATTEMPTS = 5
+
+
+class _LostRace(Exception):
+    pass
+
+
+def insert_todo(db: Session, owner_id: int, new_todo: TodoDto, change_seq: int | None = None) -> int:
+    """
+        Returns the new todo id.
+    """
+    todo_model = Todos(**new_todo.model_dump(), owner_id=owner_id)
+    db.add(todo_model)
+
+    if change_seq is None:
+        bump_todo_stats(db, todo_model.complete, todo_model.priority, 1)
+        change_seq = next_change_seq(db, owner_id)
+
+    todo_model.updated_seq = change_seq
+    db.flush()
+
+    return todo_model.id
+
+
+def replace_todo(db: Session, owner_id: int, todo_id: int, new_todo: TodoDto,
+                 expected_version: int | None = None, change_seq: int | None = None) -> int:
+    """
+        Overwrites every field. Returns the new version.
+    """
+    # `populate_existing`: an earlier write of the same batch may have changed the row with Core
+    existing_model = (db.query(Todos)
+                      .filter(Todos.id == todo_id)
+                      .filter(Todos.owner_id == owner_id)
+                      .populate_existing()
+                      .first())
+
+    if existing_model is None:
+        raise HTTPException(status_code=404, detail="Todo not found")
+
+    if expected_version is not None and existing_model.version != expected_version:
+        raise HTTPException(status_code=412, detail="Todo was modified by another request")
+
+    if change_seq is None:
+        move_todo_stats(db, existing_model.complete, existing_model.priority, new_todo.complete, new_todo.priority)
+        change_seq = next_change_seq(db, owner_id)
+
+    existing_model.title = new_todo.title
+    existing_model.description = new_todo.description
+    existing_model.priority = new_todo.priority
+    existing_model.complete = new_todo.complete
+    existing_model.updated_seq = change_seq
+
+    db.add(existing_model)
+
+    try:
+        db.flush()
+    except StaleDataError:
+        # Somebody else updated the row between our read and our write
+        raise HTTPException(status_code=412, detail="Todo was modified by another request")
+
+    return existing_model.version
+
+
+def patch_todo_values(db: Session, owner_id: int, todo_id: int, values: dict,
+                      expected_version: int | None = None, change_seq: int | None = None) -> int:
+    """
+        Updates only the fields in `values` with one conditional
+        `UPDATE ... WHERE id = ? AND owner_id = ? AND version = ?`. No row lock is taken.
+        Returns the new version, or the current one when `values` is empty: nothing is written then.
+
+        Moving the stats needs the old `complete` and `priority`, read without a lock; the UPDATE only
+        applies if the version is still the one read. Without `expected_version` (no If-Match) losing
+        that race is no precondition of the client's, so the read and the UPDATE are retried in a
+        savepoint, whose rollback also undoes the stats moved for the stale read.
+    """
+    if not values:
+        return current_version(db, owner_id, todo_id, expected_version)
+
+    if change_seq is not None or ("complete" not in values and "priority" not in values):
+        if change_seq is None:
+            change_seq = next_change_seq(db, owner_id)
+
+        new_version = _update_values(db, owner_id, todo_id, values, expected_version, change_seq)
+        if new_version is None:
+            raise HTTPException(status_code=412, detail="Todo was modified by another request")
+        return new_version
+
+    if expected_version is not None:
+        return _move_stats_and_update(db, owner_id, todo_id, values, expected_version)
+
+    for _ in range(PATCH_RETRY_ATTEMPTS):
+        try:
+            with db.begin_nested():
+                return _move_stats_and_update(db, owner_id, todo_id, values, None)
+        except _LostRace:
+            continue
+
+    raise HTTPException(status_code=503, detail="Todo is being modified by other requests, try again",
+                        headers={"Retry-After": "1"})
+
+
+def current_version(db: Session, owner_id: int, todo_id: int, expected_version: int | None = None) -> int:
+    version = (db.query(Todos.version)
+               .filter(Todos.id == todo_id)
+               .filter(Todos.owner_id == owner_id)
+               .scalar())
+
+    if version is None:
+        raise HTTPException(status_code=404, detail="Todo not found")
+
+    if expected_version is not None and version != expected_version:
+        raise HTTPException(status_code=412, detail="Todo was modified by another request")
+
+    return version
+
+
+def _move_stats_and_update(db: Session, owner_id: int, todo_id: int, values: dict,
+                           expected_version: int | None) -> int:
+    current = (db.query(Todos.complete, Todos.priority, Todos.version)
+               .filter(Todos.id == todo_id)
+               .filter(Todos.owner_id == owner_id)
+               .first())
+
+    if current is None:
+        raise HTTPException(status_code=404, detail="Todo not found")
+
+    if expected_version is not None and current.version != expected_version:
+        raise HTTPException(status_code=412, detail="Todo was modified by another request")
+
+    move_todo_stats(db, current.complete, current.priority,
+                    values.get("complete", current.complete), values.get("priority", current.priority))
+
+    new_version = _update_values(db, owner_id, todo_id, values, current.version, next_change_seq(db, owner_id))
+
+    if new_version is None:
+        # The stats moved above are rolled back with the savepoint, or with the rest by the caller
+        if expected_version is None:
+            raise _LostRace()
+        raise HTTPException(status_code=412, detail="Todo was modified by another request")
+
+    return new_version
+
+
+def _update_values(db: Session, owner_id: int, todo_id: int, values: dict,
+                   expected_version: int | None, change_seq: int) -> int | None:
+    """
+        Returns the new version, or None when the row is there but no longer at `expected_version`.
+    """
+    statement = (update(Todos)
+                 .where(Todos.id == todo_id)
+                 .where(Todos.owner_id == owner_id))
+
+    if expected_version is not None:
+        statement = statement.where(Todos.version == expected_version)
+
+    new_version = db.execute(
+        statement
+        .values(**values, version=Todos.version + 1, updated_seq=change_seq)
+        .returning(Todos.version)
+        .execution_options(synchronize_session=False)
+    ).scalar()
+
+    if new_version is None:
+        exists = (db.query(Todos.id)
+                  .filter(Todos.id == todo_id)
+                  .filter(Todos.owner_id == owner_id)
+                  .first())
+
+        if exists is None:
+            raise HTTPException(status_code=404, detail="Todo not found")
+
+    return new_version
+
+
+def remove_todo(db: Session, owner_id: int, todo_id: int,
+                expected_version: int | None = None, change_seq: int | None = None):
+    existing_model = (db.query(Todos)
+                      .filter(Todos.id == todo_id)
+                      .filter(Todos.owner_id == owner_id)
+                      .populate_existing()
+                      .first())
+
+    if existing_model is None:
+        raise HTTPException(status_code=404, detail="Todo not found")
+
+    if expected_version is not None and existing_model.version != expected_version:
+        raise HTTPException(status_code=412, detail="Todo was modified by another request")
+
+    if change_seq is None:
+        bump_todo_stats(db, existing_model.complete, existing_model.priority, -1)
+        change_seq = next_change_seq(db, owner_id)
+
+    record_tombstone(db, todo_id, owner_id, change_seq)
+
+    statement = (db.query(Todos)
+                 .filter(Todos.id == todo_id)
+                 .filter(Todos.owner_id == owner_id))
+
+    if expected_version is None:
+        statement.delete()
+        return
+
+    if statement.filter(Todos.version == expected_version).delete() == 0:
+        raise HTTPException(status_code=412, detail="Todo was modified by another request")
@@ -0,0 +1,281 @@
+"""
+    Lightweight per-request tracing: a tree of timed spans written to a local file.
+
+    A request is traced with probability `TRACE_SAMPLE_RATE` (head sampling: decided once, when it arrives),
+    or always when it sends `X-Trace: 1` and `TRACE_FORCE_HEADER` is on. Outside a traced request `span()`
+    returns at once, so instrumented code costs one context variable lookup.
+
+    Spans recorded: the request, user authentication (JWT decode), DB connection checkout, every SQL statement,
+    bcrypt hashing and verification, JSON rendering and the response send.
+    Dependency resolution as a whole is not a span: FastAPI resolves dependencies and calls the endpoint in
+    one step. Its costly parts, authentication and the DB checkout, are.
+    `TRACE_FORMAT` "chrome" writes trace events for chrome://tracing or https://ui.perfetto.dev;
+    "otlp" writes one OTLP/JSON `ExportTraceServiceRequest` per line.
+
+    Off unless enabled: `TODOS_TRACE_SAMPLE_RATE` sets the rate and `TODOS_TRACE_FILE` the file, which otherwise
+    lives in the temp directory.
+"""
+import contextvars
+import json
+import logging
+import os
+import queue
+import random
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+
+from .log_config import request_id
+
+
+logger = logging.getLogger(__name__)
+
+# Fraction of requests traced, none unless the deployment asks for it
+TRACE_SAMPLE_RATE = float(os.environ.get("TODOS_TRACE_SAMPLE_RATE", "0"))
+# Honour `X-Trace: 1` from any client. Keep it off where clients are not trusted: every forced request is written.
+TRACE_FORCE_HEADER = False
+# Outside the working directory by default, so a test run or a dev server leaves nothing in the checkout
+TRACE_FILE = os.environ.get("TODOS_TRACE_FILE") or os.path.join(tempfile.gettempdir(), "todos-traces.json")
+# Past this size the file is renamed to `<TRACE_FILE>.1`, replacing the previous one, and a new file starts
+TRACE_FILE_MAX_BYTES = 64 * 1024 * 1024
+# "chrome" or "otlp"
+TRACE_FORMAT = "chrome"
+# Finished traces waiting for the writer thread; more are dropped
+TRACE_QUEUE_SIZE = 1000
+
+current_trace = contextvars.ContextVar("current_trace", default=None)
+current_span = contextvars.ContextVar("current_span", default=None)
+
+
+class Span:
+    __slots__ = ("span_id", "parent_id", "name", "start_ns", "end_ns", "thread_id", "attributes")
+
+    def __init__(self, name: str, parent_id: str | None, attributes: dict, start_ns: int | None = None):
+        self.span_id = os.urandom(8).hex()
+        self.parent_id = parent_id
+        self.name = name
+        self.start_ns = time.time_ns() if start_ns is None else start_ns
+        self.end_ns = None
+        self.thread_id = threading.get_ident()
+        self.attributes = attributes
+
+    def end(self):
+        self.end_ns = time.time_ns()
+
+
+class Trace:
+    def __init__(self):
+        self.trace_id = os.urandom(16).hex()
+        self.spans: list[Span] = []
+        # SQL of scatter-gather queries runs on other threads
+        self._lock = threading.Lock()
+
+    def start_span(self, name: str, attributes: dict, start_ns: int | None = None) -> Span:
+        parent = current_span.get()
+        span = Span(name, parent.span_id if parent is not None else None, attributes, start_ns)
+
+        with self._lock:
+            self.spans.append(span)
+
+        return span
+
+
+@contextmanager
+def span(name: str, **attributes):
+    trace = current_trace.get()
+
+    if trace is None:
+        yield None
+        return
+
+    current = trace.start_span(name, attributes)
+    token = current_span.set(current)
+    try:
+        yield current
+    finally:
+        current_span.reset(token)
+        current.end()
+
+
+def start_span(name: str, **attributes) -> Span | None:
+    """
+        For callbacks that cannot wrap the work in `with span(...)`, such as SQLAlchemy events.
+        The span is not made current; call `.end()` on it.
+    """
+    trace = current_trace.get()
+    return trace.start_span(name, attributes) if trace is not None else None
+
+
+def record_span(name: str, start_ns: int, **attributes):
+    """
+        Adds an already finished span that started at `start_ns` (`time.time_ns()`) and ends now.
+    """
+    trace = current_trace.get()
+
+    if trace is not None:
+        trace.start_span(name, attributes, start_ns).end()
+
+
+def chrome_events(trace: Trace) -> list[dict]:
+    pid = os.getpid()
+
+    return [
+        {
+            "name": item.name,
+            "ph": "X",
+            "ts": item.start_ns / 1000,
+            "dur": ((item.end_ns or item.start_ns) - item.start_ns) / 1000,
+            "pid": pid,
+            "tid": item.thread_id,
+            "args": {"trace_id": trace.trace_id, "span_id": item.span_id, "parent_id": item.parent_id,
+                     **item.attributes},
+        }
+        for item in trace.spans
+    ]
+
+
+def otlp_request(trace: Trace) -> dict:
+    def value(attribute):
+        if isinstance(attribute, bool):
+            return {"boolValue": attribute}
+        if isinstance(attribute, int):
+            return {"intValue": str(attribute)}
+        return {"stringValue": str(attribute)}
+
+    return {"resourceSpans": [{
+        "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": "todos"}}]},
+        "scopeSpans": [{
+            "scope": {"name": __name__},
+            "spans": [
+                {
+                    "traceId": trace.trace_id,
+                    "spanId": item.span_id,
+                    **({"parentSpanId": item.parent_id} if item.parent_id else {}),
+                    "name": item.name,
+                    "kind": 2 if item.parent_id is None else 1,
+                    "startTimeUnixNano": str(item.start_ns),
+                    "endTimeUnixNano": str(item.end_ns or item.start_ns),
+                    "attributes": [{"key": key, "value": value(attribute)}
+                                   for key, attribute in item.attributes.items() if attribute is not None],
+                }
+                for item in trace.spans
+            ],
+        }],
+    }]}
+
+
+class TraceExporter:
+    """
+        Writes finished traces from a background thread, so a request never waits on the disk.
+
+        The Chrome file is a JSON array that is never closed, which the trace viewers accept;
+        a new file starts with `[`. Files are rotated at `max_bytes`, keeping one previous file.
+    """
+
+    def __init__(self, path: str = TRACE_FILE, trace_format: str = TRACE_FORMAT, maxsize: int = TRACE_QUEUE_SIZE,
+                 max_bytes: int = TRACE_FILE_MAX_BYTES):
+        self.path = path
+        self.trace_format = trace_format
+        self.max_bytes = max_bytes
+        self.dropped = 0
+        self._queue: queue.Queue = queue.Queue(maxsize=maxsize)
+        self._thread: threading.Thread | None = None
+        self._start_lock = threading.Lock()
+
+    def export(self, trace: Trace):
+        if self._thread is None or not self._thread.is_alive():
+            # Two first exports at once must not start two writers appending to the same file
+            with self._start_lock:
+                if self._thread is None or not self._thread.is_alive():
+                    self._thread = threading.Thread(target=self._run, name="trace-exporter", daemon=True)
+                    self._thread.start()
+
+        try:
+            self._queue.put_nowait(trace)
+        except queue.Full:
+            self.dropped += 1
+
+    def flush(self):
+        self._queue.join()
+
+    def _run(self):
+        while True:
+            trace = self._queue.get()
+            try:
+                self._write(trace)
+            except Exception:
+                logger.warning("Failed to write trace %s", trace.trace_id, exc_info=True)
+            finally:
+                self._queue.task_done()
+
+    def _write(self, trace: Trace):
+        if self.trace_format == "otlp":
+            lines = [json.dumps(otlp_request(trace))]
+        else:
+            lines = [json.dumps(event) + "," for event in chrome_events(trace)]
+
+        try:
+            if os.path.getsize(self.path) >= self.max_bytes:
+                os.replace(self.path, self.path + ".1")
+        except FileNotFoundError:
+            pass
+
+        with open(self.path, "a") as file:
+            if self.trace_format != "otlp" and file.tell() == 0:
+                file.write("[\n")
+            file.write("\n".join(lines) + "\n")
+
+
+trace_exporter = TraceExporter()
+
+
+class TracingMiddleware:
+    """
+        ASGI middleware deciding whether a request is traced and exporting its spans when it is done.
+        Traced responses carry an `X-Trace-Id` header.
+    """
+
+    def __init__(self, app, sample_rate: float | None = None, exporter: TraceExporter | None = None):
+        # None: `TRACE_SAMPLE_RATE`, read per request like `TRACE_FORCE_HEADER`
+        self.app = app
+        self.sample_rate = sample_rate
+        self.exporter = exporter or trace_exporter
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        forced = TRACE_FORCE_HEADER and (b"x-trace", b"1") in scope["headers"]
+        sample_rate = TRACE_SAMPLE_RATE if self.sample_rate is None else self.sample_rate
+        if not forced and (sample_rate <= 0 or random.random() >= sample_rate):
+            await self.app(scope, receive, send)
+            return
+
+        trace = Trace()
+        trace_token = current_trace.set(trace)
+        status_code = None
+        send_span = None
+
+        async def traced_send(message):
+            nonlocal status_code, send_span
+
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                message = {**message, "headers": [*message.get("headers", []), (b"x-trace-id", trace.trace_id.encode())]}
+                send_span = start_span("response.send")
+
+            await send(message)
+
+            if message["type"] == "http.response.body" and not message.get("more_body", False) and send_span:
+                send_span.end()
+
+        try:
+            with span(f"{scope['method']} {scope['path']}", method=scope["method"], path=scope["path"],
+                      request_id=request_id.get()) as root:
+                await self.app(scope, receive, traced_send)
+                root.attributes["status"] = status_code
+        finally:
+            current_trace.reset(trace_token)
+            self.exporter.export(trace)
@@ -0,0 +1,176 @@
+import csv
+import io
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+from pydantic import ValidationError
+from sqlalchemy import insert, or_
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from .cache import TTLCache
+from .dtos.user import UserDto
+from .models import Users
+from .streaming import format_validation_error
+
+
+IMPORT_BATCH_SIZE = 1000
+# Per-row errors kept for the response; anything beyond is only counted
+MAX_REPORTED_ERRORS = 1000
+# Finished imports stay visible to the progress endpoint for an hour
+import_progress = TTLCache(ttl=3600, maxsize=256)
+
+USER_COLUMNS = ("username", "email", "first_name", "last_name", "role", "hashed_password", "is_active", "phone_number")
+
+_hash_pool: ProcessPoolExecutor | None = None
+_hash_pool_lock = threading.Lock()
+
+
+def hash_password(password: str) -> str:
+    # Runs inside the pool workers
+    from .routers.auth import bcrypt_context
+
+    return bcrypt_context.hash(password)
+
+
+def get_hash_pool() -> ProcessPoolExecutor:
+    global _hash_pool
+
+    with _hash_pool_lock:
+        if _hash_pool is None:
+            # `spawn`: forking a process that holds DB connections and threads is not safe
+            _hash_pool = ProcessPoolExecutor(
+                max_workers=os.cpu_count() or 1,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+
+        return _hash_pool
+
+
+def hash_passwords(passwords: list[str]) -> list[str]:
+    if not passwords:
+        return []
+
+    workers = get_hash_pool()._max_workers
+    chunksize = max(1, len(passwords) // (workers * 4))
+
+    return list(get_hash_pool().map(hash_password, passwords, chunksize=chunksize))
+
+
+def validate_record(record: dict) -> tuple[UserDto | None, str | None]:
+    try:
+        return UserDto(**record), None
+    except ValidationError as error:
+        return None, format_validation_error(error)
+
+
+class UserImport:
+    """
+        State of one bulk import: validated rows waiting for a batch insert, counters and per-row errors.
+    """
+
+    def __init__(self, import_id: str):
+        self.import_id = import_id
+        self.pending: list[tuple[int, UserDto]] = []
+        self.progress = {
+            "import_id": import_id,
+            "processed": 0,
+            "inserted": 0,
+            "failed": 0,
+            "done": False,
+            "errors": [],
+        }
+        import_progress.set(import_id, self.progress)
+
+    def fail(self, row_number: int, error: str):
+        self.progress["processed"] += 1
+        self.progress["failed"] += 1
+
+        if len(self.progress["errors"]) < MAX_REPORTED_ERRORS:
+            self.progress["errors"].append({"row": row_number, "error": error})
+
+    def flush(self, db: Session, hashed_passwords: list[str]):
+        """
+            Inserts the pending batch. Runs in a worker thread; hashing already happened in the process pool.
+        """
+        rows = []
+        for (row_number, dto), hashed_password in zip(self.pending, hashed_passwords):
+            rows.append((row_number, {
+                "username": dto.username,
+                "email": dto.email,
+                "first_name": dto.first_name,
+                "last_name": dto.last_name,
+                "role": dto.role,
+                "hashed_password": hashed_password,
+                "is_active": True,
+                "phone_number": dto.phone_number,
+            }))
+        self.pending = []
+
+        rows = self._drop_duplicates(db, rows)
+
+        try:
+            insert_users(db, [values for _, values in rows])
+            db.commit()
+            self.progress["inserted"] += len(rows)
+            self.progress["processed"] += len(rows)
+        except (IntegrityError, db.get_bind().dialect.loaded_dbapi.IntegrityError):
+            # Lost a race against a concurrent signup: retry row by row so only the offenders fail
+            db.rollback()
+            self._insert_one_by_one(db, rows)
+
+    def _drop_duplicates(self, db: Session, rows: list[tuple[int, dict]]) -> list[tuple[int, dict]]:
+        usernames = [values["username"] for _, values in rows]
+        emails = [values["email"] for _, values in rows]
+
+        existing = (db.query(Users.username, Users.email)
+                    .filter(or_(Users.username.in_(usernames), Users.email.in_(emails)))
+                    .all())
+        taken_usernames = {username for username, _ in existing}
+        taken_emails = {email for _, email in existing}
+
+        unique_rows = []
+        for row_number, values in rows:
+            if values["username"] in taken_usernames:
+                self.fail(row_number, f"Username '{values['username']}' already exists")
+            elif values["email"] in taken_emails:
+                self.fail(row_number, f"Email '{values['email']}' already exists")
+            else:
+                taken_usernames.add(values["username"])
+                taken_emails.add(values["email"])
+                unique_rows.append((row_number, values))
+
+        return unique_rows
+
+    def _insert_one_by_one(self, db: Session, rows: list[tuple[int, dict]]):
+        for row_number, values in rows:
+            try:
+                with db.begin_nested():
+                    db.execute(insert(Users), [values])
+                self.progress["inserted"] += 1
+                self.progress["processed"] += 1
+            except IntegrityError as error:
+                self.fail(row_number, f"Rejected by the database: {error.orig}")
+
+        db.commit()
+
+
+def insert_users(db: Session, rows: list[dict]):
+    if not rows:
+        return
+
+    if db.get_bind().dialect.name == "postgresql":
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        for values in rows:
+            writer.writerow(values[column] for column in USER_COLUMNS)
+        buffer.seek(0)
+
+        cursor = db.connection().connection.cursor()
+        cursor.copy_expert(f"COPY users ({', '.join(USER_COLUMNS)}) FROM STDIN WITH (FORMAT csv)", buffer)
+        return
+
+    # executemany
+    db.execute(insert(Users), rows)